@@ -1,14 +1,24 @@
 from fastapi import FastAPI, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Dict, Any, List, Optional
-import google.generativeai as genai
+from typing import Dict, Any, List, Optional, Iterator, AsyncIterator, Tuple
 import os
 import json
 import time
+import asyncio
+import anyio
 from datetime import datetime
 import uvicorn
 
+from cache import LRUCache
+from conversation_store import create_conversation_store
+from concurrency import run_blocking, iterate_blocking
+from llm_client import configure_llm, get_model
+from semantic_cache import SemanticCache
+from metrics import install_metrics, register_cache, time_stage, estimate_tokens
+from document_index import embed_texts
+
 # --- Configuration ---
 # Set up Google API Key securely
 try:
@@ -17,16 +27,21 @@ try:
     GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
     if not GOOGLE_API_KEY:
         raise ValueError("GOOGLE_API_KEY not found in .env file. Please create one.")
-    genai.configure(api_key=GOOGLE_API_KEY)
 except ImportError:
     raise ImportError("python-dotenv is not installed. Please run `pip install python-dotenv`")
 
+if not configure_llm(GOOGLE_API_KEY):
+    raise ImportError("google-generativeai is not installed. Please run `pip install google-generativeai`")
+
+CHAT_MODEL_NAME = 'gemini-2.0-flash-exp'
+
 # --- FastAPI App Setup ---
 app = FastAPI(
     title="NyAI - Intelligent Legal Chatbot",
     description="AI-powered legal assistant for Indian law",
     version="1.0.0"
 )
+install_metrics(app)
 
 # CORS middleware
 app.add_middleware(
@@ -48,6 +63,8 @@ class Conversation(BaseModel):
     messages: List[Message]
     created_at: float
     updated_at: float
+    summary: str = ""  # Rolling summary of turns folded out of the context window
+    summarized_count: int = 0  # Number of leading messages covered by the summary
 
 class ChatRequest(BaseModel):
     message: str
@@ -63,27 +80,197 @@ class ConversationHistory(BaseModel):
     conversations: Dict[str, Conversation]
     active_conversation: Optional[str] = None
 
-# --- Global Storage (In production, use a proper database) ---
-conversation_storage: Dict[str, ConversationHistory] = {}
+# --- Conversation Storage ---
+# Persistent backend (SQLite/WAL by default) with an LRU of hot users in memory
+HOT_USER_CACHE_SIZE = int(os.getenv("CHAT_HOT_USER_CACHE_SIZE", "256"))
+conversation_store = create_conversation_store()
+history_cache = LRUCache(max_items=HOT_USER_CACHE_SIZE)
 
 # --- Helper Functions ---
-def get_user_history(user_id: str) -> ConversationHistory:
-    """Gets or creates conversation history for a user."""
-    if user_id not in conversation_storage:
-        conversation_storage[user_id] = ConversationHistory(
-            conversations={},
-            active_conversation=None
+def message_to_dict(message: Message) -> Dict[str, Any]:
+    return {"role": message.role, "content": message.content, "timestamp": message.timestamp}
+
+def conversation_to_dict(conversation: Conversation) -> Dict[str, Any]:
+    return {
+        "title": conversation.title,
+        "messages": [message_to_dict(m) for m in conversation.messages],
+        "created_at": conversation.created_at,
+        "updated_at": conversation.updated_at,
+        "summary": conversation.summary,
+        "summarized_count": conversation.summarized_count
+    }
+
+async def get_user_history(user_id: str) -> ConversationHistory:
+    """Gets or creates conversation history for a user, loading it off the event loop on a miss."""
+    history = history_cache.get(user_id)
+    if history is None:
+        data = await run_blocking(conversation_store.load_user, user_id)
+        # A concurrent request may have loaded (and since modified) it meanwhile
+        history = history_cache.get(user_id)
+        if history is not None:
+            return history
+        history = ConversationHistory(
+            conversations={
+                conv_id: Conversation(**conversation)
+                for conv_id, conversation in data["conversations"].items()
+            },
+            active_conversation=data["active_conversation"]
         )
-    return conversation_storage[user_id]
+        history_cache.set(user_id, history)
+    return history
+
+async def add_conversation(user_id: str, conversation_id: str, conversation: Conversation):
+    """Adds a conversation to a user's history and makes it the active one."""
+    history = await get_user_history(user_id)
+    await run_blocking(
+        conversation_store.create_conversation, user_id, conversation_id, conversation_to_dict(conversation)
+    )
+    await run_blocking(conversation_store.set_active_conversation, user_id, conversation_id)
+    history.conversations[conversation_id] = conversation
+    history.active_conversation = conversation_id
+
+async def append_message(user_id: str, conversation_id: str, message: Message):
+    """Appends one message to a conversation, persisting only that message."""
+    history = await get_user_history(user_id)
+    conversation = history.conversations[conversation_id]
+    await run_blocking(conversation_store.append_message, user_id, conversation_id, message_to_dict(message))
+    conversation.messages.append(message)
+    conversation.updated_at = message.timestamp
+
+# --- Context Window ---
+# Recent turns go into the prompt verbatim up to a token budget; older turns are
+# folded into a rolling summary stored on the conversation. The window may grow to
+# CONTEXT_MAX_MESSAGES (and the full budget) before it is folded back down to
+# CONTEXT_RECENT_MESSAGES (and half the budget), so the summarizer runs every few
+# turns, in the background, instead of before every answer.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CHAT_CONTEXT_TOKEN_BUDGET", "2000"))
+CONTEXT_RECENT_MESSAGES = int(os.getenv("CHAT_CONTEXT_RECENT_MESSAGES", "6"))
+CONTEXT_MAX_MESSAGES = int(os.getenv("CHAT_CONTEXT_MAX_MESSAGES", str(2 * CONTEXT_RECENT_MESSAGES)))
+SUMMARY_MAX_CHARS = int(os.getenv("CHAT_SUMMARY_MAX_CHARS", "2000"))
+CONTEXT_WINDOW_BUDGET = max(1, CONTEXT_TOKEN_BUDGET - SUMMARY_MAX_CHARS // 4)
+# Turns waiting to be folded share the summary's room, but each keeps at least this much
+PENDING_MESSAGE_MIN_CHARS = 200
+
+def format_context_message(message: Message) -> str:
+    role = "User" if message.role == "user" else "AI"
+    return f'{role}: {message.content}'
+
+def select_context_window(messages: List[Message], summarized_count: int,
+                          max_messages: int = CONTEXT_MAX_MESSAGES, budget: int = CONTEXT_WINDOW_BUDGET) -> int:
+    """Returns the index of the first message kept verbatim in the prompt.
+
+    Walks back from the newest message while it fits the token budget (the total
+    budget minus room reserved for the summary) and the message cap. Never reaches
+    back past messages already folded into the summary.
+    """
+    used = 0
+    start = len(messages)
+    while start > summarized_count and len(messages) - start < max_messages:
+        cost = estimate_tokens(format_context_message(messages[start - 1]))
+        if used + cost > budget and start < len(messages):
+            break
+        used += cost
+        start -= 1
+    return start
+
+def summarize_messages(summary: str, messages: List[Message]) -> str:
+    """Folds messages that left the context window into the rolling summary."""
+    transcript = "\n\n".join(format_context_message(m) for m in messages)
+    try:
+        model = get_model(CHAT_MODEL_NAME)
+        prompt = f"""
+        You maintain a running summary of a legal conversation between a user and NyAI, an Indian legal AI assistant.
+        Update the summary with the new messages below. Keep facts, names, dates, amounts and legal points the user may refer back to.
+        Respond with the updated summary only, in at most 150 words.
+
+        Current summary:
+        {summary or "(empty)"}
+
+        New messages:
+        {transcript}
+        """
+        response = model.generate_content(prompt)
+        return response.text.strip()[:SUMMARY_MAX_CHARS]
+    except Exception as e:
+        print(f"Error summarizing conversation: {e}")
+        # Keep the opening of each folded message so the context is not lost outright
+        fallback = "\n".join([summary] + [format_context_message(m)[:200] for m in messages]).strip()
+        return fallback[-SUMMARY_MAX_CHARS:]
 
-def save_user_history(user_id: str, history: ConversationHistory):
-    """Saves conversation history for a user."""
-    conversation_storage[user_id] = history
+async def update_conversation_summary(user_id: str, conversation_id: str, summary: str, summarized_count: int):
+    """Persists the rolling summary and how many messages it covers."""
+    await run_blocking(
+        conversation_store.update_conversation,
+        user_id, conversation_id, summary=summary, summarized_count=summarized_count
+    )
+    conversation = (await get_user_history(user_id)).conversations.get(conversation_id)
+    if conversation is not None:
+        conversation.summary = summary
+        conversation.summarized_count = summarized_count
+
+# Background summary updates, at most one per conversation at a time
+summary_tasks: Dict[Tuple[str, str], asyncio.Task] = {}
+
+async def fold_into_summary(user_id: str, conversation_id: str, summary: str,
+                            folded: List[Message], summarized_count: int):
+    """Folds messages into the rolling summary off the request path."""
+    with time_stage("summarize"):
+        summary = await run_blocking(summarize_messages, summary, folded)
+    await update_conversation_summary(user_id, conversation_id, summary, summarized_count)
+
+def start_summary_update(user_id: str, conversation_id: str, conversation: Conversation,
+                         prior_messages: List[Message]):
+    """Starts folding all but the newest turns into the summary, unless an update is already running."""
+    key = (user_id, conversation_id)
+    if key in summary_tasks:
+        return
+    fold_end = select_context_window(
+        prior_messages, conversation.summarized_count, CONTEXT_RECENT_MESSAGES, CONTEXT_WINDOW_BUDGET // 2
+    )
+    if fold_end <= conversation.summarized_count:
+        return
+    folded = prior_messages[conversation.summarized_count:fold_end]
+    task = asyncio.create_task(fold_into_summary(user_id, conversation_id, conversation.summary, folded, fold_end))
+    summary_tasks[key] = task
+    task.add_done_callback(lambda _: summary_tasks.pop(key, None))
+
+async def build_conversation_context(user_id: str, conversation_id: str) -> str:
+    """Builds the bounded prompt context: rolling summary plus the most recent turns.
+
+    Never waits for the summarizer: once the window is full (or turns have
+    fallen out of it) the summary is updated in the background and this turn
+    is answered with the current one. Turns that left the window but are not
+    yet covered by the summary stay in the prompt, shortened, until it lands.
+    """
+    conversation = (await get_user_history(user_id)).conversations[conversation_id]
+    prior_messages = conversation.messages[:-1]  # Exclude the current message
+    window_start = select_context_window(prior_messages, conversation.summarized_count)
+    summary = conversation.summary
+    
+    window_full = len(prior_messages) - window_start >= CONTEXT_MAX_MESSAGES
+    if window_full or window_start > conversation.summarized_count:
+        start_summary_update(user_id, conversation_id, conversation, prior_messages)
+    
+    budget_chars = CONTEXT_WINDOW_BUDGET * 4
+    parts = []
+    if summary:
+        parts.append(f'Summary of earlier conversation: {summary}')
+    # A single oversized message is truncated so the prompt stays within budget
+    pending = prior_messages[conversation.summarized_count:window_start]
+    if pending:
+        pending_chars = max(PENDING_MESSAGE_MIN_CHARS, SUMMARY_MAX_CHARS // len(pending))
+        parts.extend(format_context_message(m)[:pending_chars] for m in pending)
+    parts.extend(format_context_message(m)[:budget_chars] for m in prior_messages[window_start:])
+    return "\n\n".join(parts)
+
+def placeholder_title(first_user_prompt: str) -> str:
+    """Cheap local title used until the generated one is ready."""
+    return first_user_prompt[:30] + "..." if len(first_user_prompt) > 30 else first_user_prompt
 
 def generate_conversation_title(first_user_prompt: str) -> str:
     """Uses Gemini to generate a single, short, relevant title for the conversation."""
     try:
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
+        model = get_model(CHAT_MODEL_NAME)
         prompt = f'Generate one single, very short, concise title (4 words maximum) for a legal conversation that starts with: "{first_user_prompt}". Do not provide options. Respond with the title only.'
         response = model.generate_content(prompt)
         # Take the first line of the response to ensure only one title is used.
@@ -91,14 +278,28 @@ def generate_conversation_title(first_user_prompt: str) -> str:
         return title
     except Exception as e:
         print(f"Error generating title: {e}")
-        return first_user_prompt[:30] + "..." if len(first_user_prompt) > 30 else first_user_prompt
+        return placeholder_title(first_user_prompt)
 
-def get_ai_response(user_message: str, conversation_context: str = "") -> str:
-    """Gets AI response from Gemini."""
-    try:
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        
-        prompt = f"""
+# Background title generation tasks (kept referenced until they finish)
+title_tasks = set()
+
+async def set_conversation_title(user_id: str, conversation_id: str, title: str):
+    """Persists a conversation title; a no-op if the conversation was deleted meanwhile."""
+    await run_blocking(conversation_store.update_conversation, user_id, conversation_id, title=title)
+    conversation = (await get_user_history(user_id)).conversations.get(conversation_id)
+    if conversation is not None:
+        conversation.title = title
+
+async def generate_title_in_background(user_id: str, conversation_id: str, first_user_prompt: str):
+    """Generates the real title concurrently with the answer and replaces the placeholder."""
+    with time_stage("title"):
+        title = await run_blocking(generate_conversation_title, first_user_prompt)
+    if title:
+        await set_conversation_title(user_id, conversation_id, title)
+
+def build_chat_prompt(user_message: str, conversation_context: str = "") -> str:
+    """Builds the NyAI answer prompt for a user question and prior context."""
+    return f"""
         You are an expert Indian Legal AI Assistant named NyAI. Your knowledge is up-to-date as of your last training.
         Answer the user's question based on your general understanding of Indian law.
         Provide clear, concise, and accurate answers. Always include a disclaimer that you are an AI and not a legal professional.
@@ -110,12 +311,120 @@ def get_ai_response(user_message: str, conversation_context: str = "") -> str:
         
         AI Answer:
         """
-        
-        response = model.generate_content(prompt)
+
+# --- Response Cache ---
+# Answers to context-free turns (first questions) are reused for questions with
+# the same meaning; turns with conversation context always go to the model.
+RESPONSE_CACHE_ENABLED = os.getenv("CHAT_RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+response_cache = SemanticCache(
+    embed=embed_texts,
+    threshold=float(os.getenv("CHAT_RESPONSE_CACHE_THRESHOLD", "0.92")),
+    ttl=float(os.getenv("CHAT_RESPONSE_CACHE_TTL", str(24 * 60 * 60))),
+    max_items=int(os.getenv("CHAT_RESPONSE_CACHE_MAX_ITEMS", "1024"))
+)
+register_cache("response", response_cache)
+
+def cached_response(user_message: str, conversation_context: str) -> Optional[str]:
+    """Returns a cached answer for a context-free turn, if one is close enough."""
+    if not RESPONSE_CACHE_ENABLED or conversation_context:
+        return None
+    return response_cache.lookup(user_message)
+
+def cache_response(user_message: str, conversation_context: str, answer: str):
+    """Stores the answer to a context-free turn for similar future questions."""
+    if RESPONSE_CACHE_ENABLED and not conversation_context:
+        response_cache.store(user_message, answer)
+
+def get_ai_response(user_message: str, conversation_context: str = "") -> str:
+    """Gets AI response from the response cache or Gemini."""
+    try:
+        cached = cached_response(user_message, conversation_context)
+        if cached is not None:
+            return cached
+        with time_stage("prompt_build"):
+            prompt = build_chat_prompt(user_message, conversation_context)
+        response = get_model(CHAT_MODEL_NAME).generate_content(prompt)
+        cache_response(user_message, conversation_context, response.text)
         return response.text
     except Exception as e:
         return f"Sorry, an error occurred while processing your request: {str(e)}"
 
+def stream_ai_response(user_message: str, conversation_context: str = "") -> Iterator[str]:
+    """Yields the Gemini answer text piece by piece as the model produces it."""
+    cached = cached_response(user_message, conversation_context)
+    if cached is not None:
+        yield cached
+        return
+    with time_stage("prompt_build"):
+        prompt = build_chat_prompt(user_message, conversation_context)
+    response = get_model(CHAT_MODEL_NAME).generate_content(prompt, stream=True)
+    parts = []
+    try:
+        for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunks without text parts (e.g. safety metadata only)
+                continue
+            if text:
+                parts.append(text)
+                yield text
+    finally:
+        # Frees the model call slot when the client stops reading mid-stream
+        response.close()
+    # Only complete answers are cached
+    cache_response(user_message, conversation_context, "".join(parts))
+
+def format_sse(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    """Formats one server-sent event."""
+    payload = f"data: {json.dumps(data)}\n\n"
+    return f"event: {event}\n{payload}" if event else payload
+
+async def start_chat_turn(request: ChatRequest) -> Tuple[str, str, str]:
+    """Resolves or creates the conversation, stores the user message and builds the prompt context.
+
+    Returns (user_id, conversation_id, conversation_context).
+    """
+    user_id = request.user_id or "anonymous"
+    history = await get_user_history(user_id)
+    
+    # If no conversation_id provided, create a new conversation
+    if not request.conversation_id:
+        conversation_id = f"{user_id}_{int(time.time())}"
+        
+        # Create new conversation with a placeholder title; the real one is
+        # generated alongside the answer instead of before it
+        new_conversation = Conversation(
+            title=placeholder_title(request.message),
+            messages=[],
+            created_at=time.time(),
+            updated_at=time.time()
+        )
+        
+        await add_conversation(user_id, conversation_id, new_conversation)
+        task = asyncio.create_task(generate_title_in_background(user_id, conversation_id, request.message))
+        title_tasks.add(task)
+        task.add_done_callback(title_tasks.discard)
+    else:
+        conversation_id = request.conversation_id
+        if conversation_id not in history.conversations:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+    
+    # Add user message
+    user_message = Message(
+        role="user",
+        content=request.message,
+        timestamp=time.time()
+    )
+    
+    await append_message(user_id, conversation_id, user_message)
+    
+    # Build conversation context for AI
+    with time_stage("context_build"):
+        conversation_context = await build_conversation_context(user_id, conversation_id)
+    
+    return user_id, conversation_id, conversation_context
+
 # --- API Endpoints ---
 @app.get("/")
 async def root():
@@ -123,53 +432,16 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "timestamp": time.time()}
+    return {"status": "healthy", "timestamp": time.time(), "response_cache": response_cache.stats()}
 
 @app.post("/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     """Main chat endpoint for sending messages and getting AI responses."""
     try:
-        user_id = request.user_id or "anonymous"
-        history = get_user_history(user_id)
-        
-        # If no conversation_id provided, create a new conversation
-        if not request.conversation_id:
-            conversation_title = generate_conversation_title(request.message)
-            conversation_id = f"{user_id}_{int(time.time())}"
-            
-            # Create new conversation
-            new_conversation = Conversation(
-                title=conversation_title,
-                messages=[],
-                created_at=time.time(),
-                updated_at=time.time()
-            )
-            
-            history.conversations[conversation_id] = new_conversation
-            history.active_conversation = conversation_id
-        else:
-            conversation_id = request.conversation_id
-            if conversation_id not in history.conversations:
-                raise HTTPException(status_code=404, detail="Conversation not found")
-        
-        # Add user message
-        user_message = Message(
-            role="user",
-            content=request.message,
-            timestamp=time.time()
-        )
-        
-        history.conversations[conversation_id].messages.append(user_message)
-        
-        # Build conversation context for AI
-        conversation_context = ""
-        messages_for_context = history.conversations[conversation_id].messages[:-1]  # Exclude the current message
-        for message in messages_for_context:
-            role = "User" if message.role == "user" else "AI"
-            conversation_context += f'{role}: {message.content}\n\n'
+        user_id, conversation_id, conversation_context = await start_chat_turn(request)
         
         # Get AI response
-        ai_response_text = get_ai_response(request.message, conversation_context)
+        ai_response_text = await run_blocking(get_ai_response, request.message, conversation_context)
         
         # Add AI response
         ai_message = Message(
@@ -178,26 +450,76 @@ async def chat(request: ChatRequest):
             timestamp=time.time()
         )
         
-        history.conversations[conversation_id].messages.append(ai_message)
-        history.conversations[conversation_id].updated_at = time.time()
-        
-        # Save updated history
-        save_user_history(user_id, history)
+        await append_message(user_id, conversation_id, ai_message)
         
         return ChatResponse(
             response=ai_response_text,
             conversation_id=conversation_id,
-            conversation_title=history.conversations[conversation_id].title
+            conversation_title=(await get_user_history(user_id)).conversations[conversation_id].title
         )
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing chat request: {str(e)}")
 
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """Streaming chat endpoint: forwards answer tokens as server-sent events.
+
+    Emits a "meta" event with the conversation id and title (a placeholder for
+    new conversations), one unnamed event per text chunk ({"token": ...}), and a
+    final "done" event carrying the full response, once it has been saved to the
+    conversation, and the latest title.
+    """
+    try:
+        user_id, conversation_id, conversation_context = await start_chat_turn(request)
+        conversation_title = (await get_user_history(user_id)).conversations[conversation_id].title
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing chat request: {str(e)}")
+
+    async def event_stream() -> AsyncIterator[str]:
+        yield format_sse({"conversation_id": conversation_id, "conversation_title": conversation_title}, event="meta")
+        
+        parts: List[str] = []
+        try:
+            async for token in iterate_blocking(stream_ai_response(request.message, conversation_context)):
+                parts.append(token)
+                yield format_sse({"token": token})
+        except Exception as e:
+            error_text = f"Sorry, an error occurred while processing your request: {str(e)}"
+            parts.append(error_text)
+            yield format_sse({"detail": error_text}, event="error")
+        finally:
+            # Save whatever was produced, even if the client disconnected mid-stream;
+            # shielded so the cancelled request cannot stop between store and cache
+            if parts:
+                with anyio.CancelScope(shield=True):
+                    await append_message(user_id, conversation_id, Message(
+                        role="assistant",
+                        content="".join(parts),
+                        timestamp=time.time()
+                    ))
+        
+        # The generated title has usually landed by now
+        conversation = (await get_user_history(user_id)).conversations.get(conversation_id)
+        yield format_sse({
+            "response": "".join(parts),
+            "conversation_id": conversation_id,
+            "conversation_title": conversation.title if conversation else conversation_title
+        }, event="done")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/conversations/{user_id}")
 async def get_conversations(user_id: str):
     """Get all conversations for a user."""
     try:
-        history = get_user_history(user_id)
+        history = await get_user_history(user_id)
         
         # Return conversations sorted by updated_at (most recent first)
         sorted_conversations = sorted(
@@ -228,7 +550,7 @@ async def get_conversations(user_id: str):
 async def get_conversation(user_id: str, conversation_id: str):
     """Get a specific conversation with all messages."""
     try:
-        history = get_user_history(user_id)
+        history = await get_user_history(user_id)
         
         if conversation_id not in history.conversations:
             raise HTTPException(status_code=404, detail="Conversation not found")
@@ -250,7 +572,6 @@ async def get_conversation(user_id: str, conversation_id: str):
 async def create_new_conversation(user_id: str):
     """Create a new conversation for a user."""
     try:
-        history = get_user_history(user_id)
         conversation_id = f"{user_id}_{int(time.time())}"
         
         new_conversation = Conversation(
@@ -260,10 +581,7 @@ async def create_new_conversation(user_id: str):
             updated_at=time.time()
         )
         
-        history.conversations[conversation_id] = new_conversation
-        history.active_conversation = conversation_id
-        
-        save_user_history(user_id, history)
+        await add_conversation(user_id, conversation_id, new_conversation)
         
         return {
             "conversation_id": conversation_id,
@@ -277,19 +595,18 @@ async def create_new_conversation(user_id: str):
 async def delete_conversation(user_id: str, conversation_id: str):
     """Delete a specific conversation."""
     try:
-        history = get_user_history(user_id)
+        history = await get_user_history(user_id)
         
         if conversation_id not in history.conversations:
             raise HTTPException(status_code=404, detail="Conversation not found")
         
+        await run_blocking(conversation_store.delete_conversation, user_id, conversation_id)
         del history.conversations[conversation_id]
         
         # If this was the active conversation, clear it
         if history.active_conversation == conversation_id:
             history.active_conversation = None
         
-        save_user_history(user_id, history)
-        
         return {"message": "Conversation deleted successfully"}
         
     except Exception as e:
@@ -299,13 +616,13 @@ async def delete_conversation(user_id: str, conversation_id: str):
 async def set_active_conversation(user_id: str, conversation_id: str):
     """Set the active conversation for a user."""
     try:
-        history = get_user_history(user_id)
+        history = await get_user_history(user_id)
         
         if conversation_id not in history.conversations:
             raise HTTPException(status_code=404, detail="Conversation not found")
         
+        await run_blocking(conversation_store.set_active_conversation, user_id, conversation_id)
         history.active_conversation = conversation_id
-        save_user_history(user_id, history)
         
         return {"message": "Active conversation updated"}
         
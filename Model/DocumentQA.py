@@ -1,28 +1,25 @@
 import os
 import json
+import asyncio
 import base64
+import hashlib
 import logging
 import threading
+import time
 from datetime import datetime
-from typing import Optional, Dict, Any, List
-from io import BytesIO
+from typing import Optional, Dict, Any, List, Tuple
 import tempfile
 
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, Request, Query, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 
-# External libs
-import requests
-from bs4 import BeautifulSoup
-
 # For document processing
 
 import PyPDF2
 import docx
-from PIL import Image
-import pytesseract
 # except ImportError:
 #     print("Warning: Some document processing libraries not installed")
     # PyPDF2 = None
@@ -30,10 +27,17 @@ import pytesseract
     # Image = None
     # pytesseract = None
 
-try:
-    import google.generativeai as genai
-except Exception:
-    genai = None
+from document_index import DocumentIndex, build_context, TOP_K
+from corpus_index import CorpusIndex, build_corpus_context, highlight_passage
+from concurrency import run_blocking, iterate_blocking
+from cache import TTLCache, LRUCache
+from document_store import DocumentStore
+from llm_client import configure_llm, get_model
+from metrics import install_metrics, register_cache, time_stage, timed_iter
+from image_ocr import ocr_image, image_ocr_available
+from pdf_extraction import (
+    extract_pdf_pages, iter_pdf_pages, count_pdf_pages, join_pages, page_spans, ocr_available, PAGE_SEPARATOR
+)
 
 # Load environment
 load_dotenv()
@@ -45,6 +49,28 @@ logger = logging.getLogger(__name__)
 
 app = FastAPI(title="DocumentQA API", version="1.0.0")
 
+
+@app.middleware("http")
+async def limit_multipart_upload_size(request: Request, call_next):
+    """Reject oversized /upload/file requests from Content-Length, before the body is read.
+
+    Registered before install_metrics so the metrics middleware wraps it and counts rejections.
+    """
+    if request.method == "POST" and request.url.path == "/upload/file":
+        content_length = request.headers.get("content-length", "")
+        if not content_length.isdigit():
+            # Without a length the whole body would be spooled before the size check
+            return JSONResponse(status_code=411, content={"detail": "Content-Length header is required"})
+        if int(content_length) > MAX_UPLOAD_SIZE + MULTIPART_OVERHEAD:
+            return JSONResponse(
+                status_code=413,
+                content={"detail": f"File too large. Maximum size is {MAX_UPLOAD_SIZE / (1024*1024)}MB"}
+            )
+    return await call_next(request)
+
+
+install_metrics(app)
+
 # FIXED: Proper CORS configuration for your frontend
 app.add_middleware(
     CORSMiddleware,
@@ -63,9 +89,8 @@ app.add_middleware(
 GENERATION_CONFIG = {"response_mime_type": "application/json"}
 MODEL_NAME = "gemini-2.5-pro"
 
-if GOOGLE_API_KEY and genai:
-    genai.configure(api_key=GOOGLE_API_KEY)
-    gemini_model = genai.GenerativeModel(model_name=MODEL_NAME, generation_config=GENERATION_CONFIG)
+if configure_llm(GOOGLE_API_KEY):
+    gemini_model = get_model(MODEL_NAME, GENERATION_CONFIG)
     logger.info("Gemini AI model configured successfully")
 else:
     gemini_model = None
@@ -76,12 +101,26 @@ class DocumentUploadRequest(BaseModel):
     content: str = Field(..., description="Base64 encoded document content")
     filename: str = Field(..., description="Original filename")
     content_type: str = Field(..., description="MIME type of the document")
+    background: bool = Field(default=False, description="Return immediately and ingest the document in the background")
+    user_id: Optional[str] = Field(None, description="Owner of the document; ids are namespaced per user")
 
 
 class QuestionRequest(BaseModel):
     question: str = Field(..., description="Question about the document")
-    document_id: str = Field(..., description="Document identifier")
+    document_id: Optional[str] = Field(None, description="Document identifier")
+    document_ids: Optional[List[str]] = Field(None, description="Ask across several documents instead of one")
+    scope: Optional[str] = Field(None, description='"all" to ask across all of the user\'s ready documents')
     context: Optional[str] = Field(None, description="Additional context")
+    top_k: int = Field(default=TOP_K, ge=1, le=10, description="Number of document chunks to retrieve")
+    user_id: Optional[str] = Field(None, description="Owner of the document")
+
+
+class SearchRequest(BaseModel):
+    query: str = Field(..., description="Words or a phrase to find")
+    document_ids: Optional[List[str]] = Field(None, description="Documents to search; all ready documents if omitted")
+    mode: str = Field(default="hybrid", description="Ranking: hybrid, keyword (BM25) or vector")
+    top_k: int = Field(default=10, ge=1, le=50, description="Number of passages to return")
+    user_id: Optional[str] = Field(None, description="Owner of the documents")
 
 
 class DocumentAnalysisRequest(BaseModel):
@@ -91,29 +130,56 @@ class DocumentAnalysisRequest(BaseModel):
     analysis_type: str = Field(default="summary", description="Type of analysis: summary, key_points, legal_issues")
 
 
-# FIXED: Thread-safe document storage with locking
-class ThreadSafeDocumentStore:
-    def __init__(self):
-        self._store = {}
-        self._lock = threading.RLock()
-
-    def store_document(self, doc_id: str, doc_data: dict):
-        with self._lock:
-            self._store[doc_id] = doc_data
-
-    def get_document(self, doc_id: str):
-        with self._lock:
-            return self._store.get(doc_id)
-
-    def delete_document(self, doc_id: str):
-        with self._lock:
-            return self._store.pop(doc_id, None)
-
-    def list_documents(self):
-        with self._lock:
-            return dict(self._store)
+class StoredDocumentAnalysisRequest(BaseModel):
+    analysis_type: str = Field(default="summary", description="Type of analysis: summary, key_points, legal_issues")
+    user_id: Optional[str] = Field(None, description="Owner of the document")
+
+
+# Persistent store: metadata in SQLite, compressed text on disk, hot documents in memory
+document_store = DocumentStore()
+DEFAULT_USER_ID = "anonymous"
+
+
+@app.on_event("startup")
+async def recover_interrupted_ingestion():
+    """Fail documents whose ingestion was cut short by a restart (not run in worker processes)"""
+    await run_blocking(document_store.fail_interrupted)
+
+# Retrieval indexes keyed by content hash, shared by every copy of the same file
+index_cache = LRUCache(max_items=int(os.getenv("DOCQA_INDEX_CACHE_SIZE", "64")))
+
+# Per-user retrieval index across documents for multi-document questions, bounded by
+# count and by estimated memory; evicted ones are reloaded from the stored indexes
+corpus_indexes = LRUCache(max_items=int(os.getenv("DOCQA_CORPUS_CACHE_SIZE", "16")))
+corpus_indexes_lock = threading.Lock()
+DOCQA_CORPUS_MAX_BYTES = int(os.getenv("DOCQA_CORPUS_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# Upload size limit (15MB)
+MAX_UPLOAD_SIZE = 15 * 1024 * 1024
+# Allowance for multipart boundaries and part headers when pre-checking Content-Length
+MULTIPART_OVERHEAD = 64 * 1024
+# Read size when streaming multipart uploads to disk
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Extracted text keyed by SHA-256 of the file bytes, shared by /upload and /analyze
+EXTRACTION_CACHE_MAX_BYTES = int(os.getenv("DOCQA_EXTRACTION_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+EXTRACTION_CACHE_DIR = os.getenv("DOCQA_EXTRACTION_CACHE_DIR") or None  # optional on-disk spill
+extraction_cache = TTLCache(
+    max_items=int(os.getenv("DOCQA_EXTRACTION_CACHE_MAX_ITEMS", "512")),
+    max_bytes=EXTRACTION_CACHE_MAX_BYTES,
+    spill_dir=EXTRACTION_CACHE_DIR,
+    max_disk_bytes=int(os.getenv("DOCQA_EXTRACTION_CACHE_DISK_BYTES", str(1024 * 1024 * 1024)))
+)
 
-document_store = ThreadSafeDocumentStore()
+# Detailed analysis results keyed by (content hash, analysis type, prompt version, model).
+# Bump ANALYSIS_PROMPT_VERSION whenever build_analysis_prompt changes.
+ANALYSIS_PROMPT_VERSION = "1"
+analysis_cache = TTLCache(
+    max_items=int(os.getenv("DOCQA_ANALYSIS_CACHE_MAX_ITEMS", "256")),
+    ttl=float(os.getenv("DOCQA_ANALYSIS_CACHE_TTL", str(24 * 60 * 60)))
+)
+register_cache("extraction", extraction_cache)
+register_cache("analysis", analysis_cache)
 
 
 def validate_file_input(filename: str, content_type: str, content_size: int = None):
@@ -125,7 +191,7 @@ def validate_file_input(filename: str, content_type: str, content_size: int = No
         raise HTTPException(status_code=400, detail="Content type is required")
 
     # Validate file extension
-    allowed_extensions = ['.pdf', '.doc', '.docx', '.txt', '.jpg', '.jpeg', '.png', '.gif']
+    allowed_extensions = ['.pdf', '.doc', '.docx', '.txt', '.jpg', '.jpeg', '.png', '.gif', '.tif', '.tiff']
     if not any(filename.lower().endswith(ext) for ext in allowed_extensions):
         raise HTTPException(status_code=400, detail=f"Unsupported file extension. Allowed: {allowed_extensions}")
 
@@ -138,7 +204,8 @@ def validate_file_input(filename: str, content_type: str, content_size: int = No
         'image/jpeg',
         'image/jpg',
         'image/png',
-        'image/gif'
+        'image/gif',
+        'image/tiff'
     ]
 
     if content_type not in allowed_types:
@@ -146,17 +213,14 @@ def validate_file_input(filename: str, content_type: str, content_size: int = No
 
 
 def extract_text_from_pdf(file_path: str) -> str:
-    """Extract text from PDF file"""
+    """Extract text from PDF file, with OCR fallback for scanned pages"""
     if not PyPDF2:
         raise HTTPException(status_code=500, detail="PDF processing not available. Install PyPDF2.")
 
     try:
-        with open(file_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-            return text.strip()
+        # Pages are extracted in parallel, scanned pages OCR-ed, and joined in order with PAGE_SEPARATOR
+        pages = extract_pdf_pages(file_path)
+        return join_pages(pages)
     except Exception as e:
         logger.error(f"PDF extraction error: {str(e)}")
         raise HTTPException(status_code=400, detail=f"Error reading PDF: {str(e)}")
@@ -179,37 +243,44 @@ def extract_text_from_docx(file_path: str) -> str:
 
 
 def extract_text_from_image(file_path: str) -> str:
-    """Extract text from image using OCR"""
-    if not pytesseract or not Image:
+    """Extract text from image using OCR; frames of multi-frame GIF/TIFF files become pages"""
+    if not image_ocr_available():
         raise HTTPException(status_code=500, detail="OCR processing not available. Install pytesseract and Pillow.")
 
     try:
-        image = Image.open(file_path)
-        text = pytesseract.image_to_string(image)
-        return text.strip()
+        # Preprocessed, tiled and OCR-ed in the process pool
+        return ocr_image(file_path)
     except Exception as e:
         logger.error(f"OCR extraction error: {str(e)}")
         raise HTTPException(status_code=400, detail=f"Error processing image: {str(e)}")
 
 
-def extract_text_from_document(content: str, filename: str, content_type: str) -> str:
-    """Extract text from various document types"""
-    # Validate inputs
-    validate_file_input(filename, content_type)
+def extract_text_from_file(file_path: str, content_type: str) -> str:
+    """Extract text from a document already on disk"""
+    with time_stage("extraction"):
+        return _extract_text_from_file(file_path, content_type)
+
+
+def _extract_text_from_file(file_path: str, content_type: str) -> str:
+    if content_type == "application/pdf":
+        return extract_text_from_pdf(file_path)
+    elif content_type in ["application/vnd.openxmlformats-officedocument.wordprocessingml.document", "application/msword"]:
+        return extract_text_from_docx(file_path)
+    elif content_type.startswith("image/"):
+        return extract_text_from_image(file_path)
+    else:
+        # Plain text, or try to decode as text
+        try:
+            with open(file_path, 'rb') as file:
+                return file.read().decode('utf-8', errors='replace')
+        except Exception:
+            raise HTTPException(status_code=400, detail=f"Unsupported file type: {content_type}")
 
-    # Decode base64 content
-    try:
-        file_data = base64.b64decode(content)
-        if len(file_data) == 0:
-            raise HTTPException(status_code=400, detail="Empty file content")
-    except Exception as e:
-        logger.error(f"Base64 decode error: {str(e)}")
-        raise HTTPException(status_code=400, detail="Invalid base64 content")
 
-    # Validate file size (15MB limit)
-    max_size = 15 * 1024 * 1024  # 15MB
-    if len(file_data) > max_size:
-        raise HTTPException(status_code=400, detail=f"File too large. Maximum size is {max_size / (1024*1024)}MB")
+def extract_text_from_bytes(file_data: bytes, filename: str, content_type: str) -> str:
+    """Extract text from raw document bytes via a temporary file"""
+    if content_type == "text/plain":
+        return file_data.decode('utf-8', errors='replace')
 
     # Create temporary file
     with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(filename)[1]) as temp_file:
@@ -217,20 +288,7 @@ def extract_text_from_document(content: str, filename: str, content_type: str) -
         temp_file_path = temp_file.name
 
     try:
-        if content_type == "application/pdf":
-            return extract_text_from_pdf(temp_file_path)
-        elif content_type in ["application/vnd.openxmlformats-officedocument.wordprocessingml.document", "application/msword"]:
-            return extract_text_from_docx(temp_file_path)
-        elif content_type.startswith("image/"):
-            return extract_text_from_image(temp_file_path)
-        elif content_type == "text/plain":
-            return file_data.decode('utf-8', errors='replace')
-        else:
-            # Try to decode as text
-            try:
-                return file_data.decode('utf-8', errors='replace')
-            except:
-                raise HTTPException(status_code=400, detail=f"Unsupported file type: {content_type}")
+        return extract_text_from_file(temp_file_path, content_type)
     finally:
         # Clean up temporary file
         try:
@@ -239,6 +297,186 @@ def extract_text_from_document(content: str, filename: str, content_type: str) -
             pass
 
 
+def hash_upload(source) -> str:
+    """Size-check and hash an already spooled upload in place; returns its SHA-256.
+
+    The size comes from seeking to the end, so oversized files are rejected
+    without being read. The file is rewound afterwards.
+    """
+    source.seek(0, os.SEEK_END)
+    size = source.tell()
+    if size > MAX_UPLOAD_SIZE:
+        raise HTTPException(status_code=413, detail=f"File too large. Maximum size is {MAX_UPLOAD_SIZE / (1024*1024)}MB")
+    if size == 0:
+        raise HTTPException(status_code=400, detail="Empty file content")
+
+    source.seek(0)
+    digest = hashlib.sha256()
+    for block in iter(lambda: source.read(UPLOAD_CHUNK_SIZE), b""):
+        digest.update(block)
+    source.seek(0)
+    return digest.hexdigest()
+
+
+def copy_upload_to_tempfile(source, filename: str) -> str:
+    """Copy a spooled upload to a named temp file in chunks, for extractors that need a path"""
+    source.seek(0)
+    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(filename)[1]) as temp_file:
+        for block in iter(lambda: source.read(UPLOAD_CHUNK_SIZE), b""):
+            temp_file.write(block)
+        return temp_file.name
+
+
+def decode_document_content(content: str) -> bytes:
+    """Decode base64 document content and enforce the upload size limit"""
+    try:
+        file_data = base64.b64decode(content)
+        if len(file_data) == 0:
+            raise HTTPException(status_code=400, detail="Empty file content")
+    except Exception as e:
+        logger.error(f"Base64 decode error: {str(e)}")
+        raise HTTPException(status_code=400, detail="Invalid base64 content")
+
+    if len(file_data) > MAX_UPLOAD_SIZE:
+        raise HTTPException(status_code=400, detail=f"File too large. Maximum size is {MAX_UPLOAD_SIZE / (1024*1024)}MB")
+
+    return file_data
+
+
+def extraction_cache_key(content_hash: str, content_type: str) -> str:
+    # The declared type picks the extractor, so it is part of the key
+    return f"{content_hash}:{content_type}"
+
+
+def extract_text_cached(file_data: bytes, content_hash: str, filename: str, content_type: str) -> Tuple[str, bool]:
+    """Extract text from decoded file bytes, reusing cached extractions; returns (text_content, cache_hit)"""
+    cache_key = extraction_cache_key(content_hash, content_type)
+
+    text_content = extraction_cache.get(cache_key)
+    if text_content is not None:
+        logger.info(f"Extraction cache hit for: {filename}")
+        return text_content, True
+
+    text_content = extract_text_from_bytes(file_data, filename, content_type)
+    extraction_cache.set(cache_key, text_content)
+    return text_content, False
+
+
+def extract_text_from_document(content: str, filename: str, content_type: str) -> Tuple[str, str, bool]:
+    """Extract text from various document types, reusing cached extractions.
+
+    Returns (text_content, content_hash, cache_hit) where content_hash is the
+    SHA-256 of the decoded file bytes.
+    """
+    # Validate inputs
+    validate_file_input(filename, content_type)
+
+    file_data = decode_document_content(content)
+    content_hash = hashlib.sha256(file_data).hexdigest()
+    text_content, cache_hit = extract_text_cached(file_data, content_hash, filename, content_type)
+    return text_content, content_hash, cache_hit
+
+
+def generate_initial_analysis(text_content: str, filename: str) -> Dict[str, Any]:
+    """Generate the short document overview returned by /upload"""
+    summary_prompt = f"""
+    You are a legal document analyst. Analyze the following document and provide a JSON response with these keys:
+    - "document_type": Type of document (contract, legal brief, agreement, etc.)
+    - "summary": Brief summary of the document (max 200 words)
+    - "key_topics": Array of main topics/subjects covered
+    - "entities": Array of important entities mentioned (people, companies, dates)
+    - "language_complexity": "simple", "moderate", or "complex"
+
+    Document content:
+    ---
+    {text_content[:3000]}
+    ---
+    """
+
+    try:
+        response = gemini_model.generate_content(summary_prompt)
+        with time_stage("json_parse"):
+            analysis = json.loads(response.text)
+        logger.info(f"Document analysis completed for: {filename}")
+        return analysis
+    except json.JSONDecodeError:
+        logger.warning("AI response was not valid JSON, using fallback")
+        return {
+            "document_type": "unknown",
+            "summary": "Document uploaded successfully. You can now ask questions about it.",
+            "key_topics": [],
+            "entities": [],
+            "language_complexity": "moderate"
+        }
+    except Exception as e:
+        logger.error(f"AI analysis failed: {str(e)}")
+        return {
+            "document_type": "unknown",
+            "summary": "Document uploaded but analysis failed. You can still ask questions about it.",
+            "key_topics": [],
+            "entities": [],
+            "language_complexity": "moderate"
+        }
+
+
+def build_analysis_prompt(text_content: str, analysis_type: str) -> str:
+    """Build the detailed analysis prompt for summary, key_points or legal_issues"""
+    if analysis_type == "summary":
+        return f"""
+        Provide a comprehensive summary of this document in JSON format:
+        - "executive_summary": Main points in 2-3 sentences
+        - "detailed_summary": Comprehensive summary (300-500 words)
+        - "key_sections": Array of important sections with titles and brief descriptions
+
+        Document: {text_content}
+        """
+    elif analysis_type == "key_points":
+        return f"""
+        Extract and organize key points from this document in JSON format:
+        - "main_points": Array of the most important points (max 10)
+        - "supporting_details": Object with main points as keys and supporting details as values
+        - "action_items": Array of any action items or next steps mentioned
+
+        Document: {text_content}
+        """
+    elif analysis_type == "legal_issues":
+        return f"""
+        Identify legal issues and concerns in this document in JSON format:
+        - "legal_issues": Array of potential legal issues or concerns
+        - "risk_assessment": Overall risk level ("low", "medium", "high") with explanation
+        - "recommendations": Array of recommended actions or considerations
+        - "clauses_of_concern": Array of specific clauses that need attention
+
+        Document: {text_content}
+        """
+    raise HTTPException(status_code=400, detail="Invalid analysis type. Use: summary, key_points, or legal_issues")
+
+
+async def run_document_analysis(text_content: str, analysis_type: str, content_hash: str) -> Tuple[Dict[str, Any], bool]:
+    """Run a detailed analysis with Gemini, memoized per document content.
+
+    Returns (result, cache_hit).
+    """
+    cache_key = (content_hash, analysis_type, ANALYSIS_PROMPT_VERSION, MODEL_NAME)
+    result = analysis_cache.get(cache_key)
+    if result is not None:
+        logger.info(f"Analysis cache hit: {analysis_type}")
+        return result, True
+
+    with time_stage("prompt_build"):
+        prompt = build_analysis_prompt(text_content, analysis_type)
+    try:
+        response = await run_blocking(gemini_model.generate_content, prompt)
+        with time_stage("json_parse"):
+            result = json.loads(response.text)
+    except json.JSONDecodeError:
+        logger.warning("AI response was not valid JSON")
+        raise HTTPException(status_code=500, detail="AI analysis returned invalid format")
+
+    analysis_cache.set(cache_key, result)
+    return result, False
+
+
 @app.get("/health")
 async def health():
     """Health check endpoint matching your existing pattern"""
@@ -248,11 +486,322 @@ async def health():
         "gemini": bool(gemini_model),
         "pdf_support": bool(PyPDF2),
         "docx_support": bool(docx),
-        "ocr_support": bool(pytesseract and Image),
+        "ocr_support": image_ocr_available(),
+        "pdf_ocr_support": ocr_available(),
         "timestamp": datetime.utcnow().isoformat()
     }
 
 
+def generate_document_id(content_hash: str, user_id: str) -> str:
+    """Content-addressed id: the same file bytes uploaded by the same user always get the same id"""
+    digest = hashlib.sha256(f"{user_id}\0{content_hash}".encode("utf-8")).hexdigest()
+    return f"doc_{digest[:32]}"
+
+
+def get_user_document(document_id: str, user_id: Optional[str]) -> Dict[str, Any]:
+    """Load a document owned by user_id, or raise 404 (other users' documents are not revealed).
+
+    May read SQLite; async code calls it through run_blocking.
+    """
+    document = document_store.get_document(document_id)
+    if not document or document.get("user_id", DEFAULT_USER_ID) != (user_id or DEFAULT_USER_ID):
+        raise HTTPException(status_code=404, detail="Document not found")
+    return document
+
+
+async def get_document_index(document_id: str, document: Dict[str, Any]) -> DocumentIndex:
+    """The document's retrieval index, shared by content hash and rebuilt from stored text if evicted"""
+    doc_index = document.get("index") or index_cache.get(document["content_hash"])
+    if doc_index is None:
+        doc_index = await run_blocking(document_store.load_index, document_id)
+    if doc_index is None:
+        text_content = await run_blocking(document_store.load_text, document_id)
+        with time_stage("indexing"):
+            doc_index = await run_blocking(DocumentIndex.build, text_content)
+        await run_blocking(document_store.save_index, document_id, doc_index)
+    index_cache.set(document["content_hash"], doc_index)
+    document["index"] = doc_index
+    return doc_index
+
+
+def trim_corpus_indexes():
+    """Evict least recently used corpora until their estimated memory fits DOCQA_CORPUS_MAX_BYTES"""
+    with corpus_indexes_lock:
+        corpora = corpus_indexes.items()
+        total = sum(corpus.memory_bytes for _, corpus in corpora)
+        # The most recently used corpus is kept even when it alone is over the limit
+        for user_id, corpus in corpora[:-1]:
+            if total <= DOCQA_CORPUS_MAX_BYTES:
+                break
+            corpus_indexes.pop(user_id)
+            total -= corpus.memory_bytes
+            logger.info(f"Evicted corpus index of {user_id} ({corpus.memory_bytes} bytes)")
+
+
+def get_corpus_index(user_id: str) -> CorpusIndex:
+    with corpus_indexes_lock:
+        corpus = corpus_indexes.get(user_id)
+        if corpus is None:
+            corpus = CorpusIndex()
+            corpus_indexes.set(user_id, corpus)
+        return corpus
+
+
+def resolve_documents(user_id: str, document_ids: Optional[List[str]],
+                      scope: Optional[str]) -> Tuple[Dict[str, str], List[str]]:
+    """Ready documents in scope as {document_id: filename}, plus ids skipped as not ready"""
+    if scope is not None:
+        if scope != "all":
+            raise HTTPException(status_code=400, detail='Unsupported scope; use "all"')
+        return dict(document_store.ready_documents(user_id)), []
+
+    documents = {}
+    skipped = []
+    for document_id in dict.fromkeys(document_ids):
+        document = get_user_document(document_id, user_id)
+        if document.get("status", "ready") == "ready":
+            documents[document_id] = document["filename"]
+        else:
+            skipped.append(document_id)
+    return documents, skipped
+
+
+async def add_to_corpus(corpus: CorpusIndex, document_id: str):
+    document = await run_blocking(document_store.get_document, document_id)
+    if document is None:
+        return
+    doc_index = await get_document_index(document_id, document)
+    await run_blocking(corpus.add_document, document_id, doc_index)
+
+
+async def load_corpus(user_id: str, document_ids: List[str]) -> CorpusIndex:
+    """The user's corpus index with every given document loaded (cold ones are indexed from stored text)"""
+    corpus = get_corpus_index(user_id)
+    missing = [document_id for document_id in document_ids if document_id not in corpus]
+    if missing:
+        await asyncio.gather(*(add_to_corpus(corpus, document_id) for document_id in missing))
+        trim_corpus_indexes()
+    return corpus
+
+
+def upload_response(document_id: str, doc_data: Dict[str, Any], extraction_cached: bool,
+                    deduplicated: bool = False) -> Dict[str, Any]:
+    return {
+        "success": True,
+        "document_id": document_id,
+        "filename": doc_data["filename"],
+        "word_count": doc_data.get("word_count", 0),
+        "char_count": doc_data.get("char_count", 0),
+        "page_count": len(doc_data.get("pages", [])),
+        "chunk_count": doc_data.get("chunk_count", 0),
+        "status": doc_data.get("status", "ready"),
+        "extraction_cached": extraction_cached,
+        "deduplicated": deduplicated,
+        "analysis": doc_data.get("analysis", {})
+    }
+
+
+async def reuse_processed_upload(content_hash: str, user_id: str, filename: str,
+                                 content_type: str) -> Optional[Dict[str, Any]]:
+    """Answer an upload from earlier work on identical bytes; None when the file still needs processing.
+
+    The user's own copy (ready or still processing) is returned as is. A ready
+    copy uploaded by another user lends its stored text, index and initial
+    analysis, so only the new user's record is written.
+    """
+    document_id = generate_document_id(content_hash, user_id)
+    own = await run_blocking(document_store.get_document, document_id)
+    if own and own.get("status") in ("ready", "processing"):
+        logger.info(f"Duplicate upload of {filename}, returning existing document {document_id}")
+        return upload_response(document_id, own, extraction_cached=True, deduplicated=True)
+
+    existing_id = await run_blocking(document_store.find_by_content_hash, content_hash)
+    if existing_id is None:
+        return None
+    text_content = await run_blocking(document_store.load_text, existing_id)
+    if not text_content.strip():
+        return None
+    extraction_cache.set(extraction_cache_key(content_hash, content_type), text_content)
+    return await store_uploaded_document(text_content, content_hash, True, filename, content_type, user_id)
+
+
+def write_temp_file(file_data: bytes, filename: str) -> str:
+    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(filename)[1]) as temp_file:
+        temp_file.write(file_data)
+        return temp_file.name
+
+
+# Background ingestion tasks, referenced so they are not garbage collected mid-run
+ingestion_tasks = set()
+
+
+async def start_background_ingestion(temp_file_path: str, content_hash: str, filename: str, content_type: str,
+                               user_id: str) -> Dict[str, Any]:
+    """Register a document as processing and ingest it page by page in the background.
+
+    The returned response is sent immediately; /documents/{id}/status reports
+    progress, and /question answers against the pages indexed so far.
+    """
+    timestamp = datetime.utcnow().isoformat()
+    document_id = generate_document_id(content_hash, user_id)
+
+    doc_data = {
+        "user_id": user_id,
+        "filename": filename,
+        "content_type": content_type,
+        "content_hash": content_hash,
+        "text_content": "",
+        "uploaded_at": timestamp,
+        "word_count": 0,
+        "char_count": 0,
+        "pages": [],
+        "index": DocumentIndex(),
+        "chunk_count": 0,
+        "status": "processing",
+        "pages_total": None,
+        "pages_processed": 0,
+        "error": None
+    }
+    await run_blocking(document_store.store_document, document_id, doc_data)
+
+    task = asyncio.create_task(ingest_document(document_id, doc_data, temp_file_path))
+    ingestion_tasks.add(task)
+    task.add_done_callback(ingestion_tasks.discard)
+
+    return {
+        "success": True,
+        "document_id": document_id,
+        "filename": filename,
+        "status": "processing"
+    }
+
+
+async def ingest_document(document_id: str, doc_data: Dict[str, Any], temp_file_path: str):
+    """Background pipeline: extract page by page, index each page as it lands, then analyze"""
+    filename = doc_data["filename"]
+    content_type = doc_data["content_type"]
+    cache_key = extraction_cache_key(doc_data["content_hash"], content_type)
+
+    try:
+        cached_text = extraction_cache.get(cache_key)
+        if cached_text is not None:
+            pages = [{"page": n, "text": text} for n, text in enumerate(cached_text.split(PAGE_SEPARATOR), start=1)]
+            doc_data["pages_total"] = len(pages)
+            page_iter = iter(pages)
+        elif content_type == "application/pdf":
+            doc_data["pages_total"] = await run_blocking(count_pdf_pages, temp_file_path)
+            page_iter = timed_iter(iter_pdf_pages(temp_file_path), "extraction")
+        else:
+            text = await run_blocking(extract_text_from_file, temp_file_path, content_type)
+            # Multi-frame images come back as several pages
+            pages = [{"page": n, "text": page} for n, page in enumerate(text.split(PAGE_SEPARATOR), start=1)]
+            doc_data["pages_total"] = len(pages)
+            page_iter = iter(pages)
+
+        doc_index = doc_data["index"]
+        page_texts = []
+        offset = 0
+        async for page in iterate_blocking(page_iter):
+            if page_texts:
+                offset += len(PAGE_SEPARATOR)
+            with time_stage("indexing"):
+                await run_blocking(doc_index.add_pages, [(page["text"], offset, page["page"])])
+            page_texts.append(page["text"])
+            offset += len(page["text"])
+            doc_data["pages_processed"] = len(page_texts)
+            doc_data["chunk_count"] = len(doc_index.chunks)
+
+        text_content = PAGE_SEPARATOR.join(page_texts)
+        if not text_content.strip():
+            raise HTTPException(status_code=400, detail="No text content found in document")
+        if cached_text is None:
+            extraction_cache.set(cache_key, text_content)
+
+        doc_data.update({
+            "text_content": text_content,
+            "word_count": len(text_content.split()),
+            "char_count": len(text_content),
+            "pages": page_spans(text_content)
+        })
+        doc_data["analysis"] = await run_blocking(generate_initial_analysis, text_content, filename)
+        doc_data["status"] = "ready"
+        index_cache.set(doc_data["content_hash"], doc_index)
+        logger.info(f"Background ingestion completed for: {filename} ({doc_data['pages_processed']} pages)")
+    except HTTPException as e:
+        doc_data["status"] = "failed"
+        doc_data["error"] = e.detail
+        logger.error(f"Background ingestion failed for {filename}: {e.detail}")
+    except Exception as e:
+        doc_data["status"] = "failed"
+        doc_data["error"] = str(e)
+        logger.error(f"Background ingestion failed for {filename}: {str(e)}")
+    finally:
+        # Persist the final state (moving the text to disk and unpinning the document),
+        # unless the document was deleted while it was being processed
+        if await run_blocking(document_store.get_document, document_id) is doc_data:
+            await run_blocking(document_store.store_document, document_id, doc_data)
+            if doc_data["status"] == "ready":
+                await run_blocking(get_corpus_index(doc_data["user_id"]).add_document, document_id, doc_data["index"])
+                trim_corpus_indexes()
+        try:
+            os.unlink(temp_file_path)
+        except OSError:
+            pass
+
+
+async def store_uploaded_document(text_content: str, content_hash: str, extraction_cached: bool,
+                                  filename: str, content_type: str, user_id: str) -> Dict[str, Any]:
+    """Index, analyze and store extracted document text; returns the /upload response"""
+    if not text_content.strip():
+        raise HTTPException(status_code=400, detail="No text content found in document")
+
+    timestamp = datetime.utcnow().isoformat()
+    document_id = generate_document_id(content_hash, user_id)
+
+    # Store document
+    doc_data = {
+        "user_id": user_id,
+        "filename": filename,
+        "content_type": content_type,
+        "content_hash": content_hash,
+        "text_content": text_content,
+        "uploaded_at": timestamp,
+        "word_count": len(text_content.split()),
+        "char_count": len(text_content),
+        "pages": page_spans(text_content),
+        "status": "ready"
+    }
+
+    # Identical bytes were already processed: reuse the index and initial analysis
+    existing_id = await run_blocking(document_store.find_by_content_hash, content_hash)
+    existing = await run_blocking(document_store.get_document, existing_id) if existing_id else None
+    # The index is only in memory while the content is hot; otherwise load the
+    # stored chunks and embeddings, and rebuild only if they are missing or stale
+    doc_index = (existing or {}).get("index") or index_cache.get(content_hash)
+    if doc_index is None and existing_id:
+        doc_index = await run_blocking(document_store.load_index, existing_id)
+    if doc_index is None:
+        # Chunk and embed once so /question only sends the relevant passages
+        with time_stage("indexing"):
+            doc_index = await run_blocking(DocumentIndex.build, text_content)
+        logger.info(f"Indexed {len(doc_index.chunks)} chunks ({doc_index.mode}) for: {filename}")
+    doc_data["index"] = doc_index
+    if existing and existing.get("analysis"):
+        doc_data["analysis"] = existing["analysis"]
+        logger.info(f"Reusing processed document for identical upload: {filename}")
+    else:
+        doc_data["analysis"] = await run_blocking(generate_initial_analysis, text_content, filename)
+    doc_data["chunk_count"] = len(doc_data["index"].chunks)
+    index_cache.set(content_hash, doc_data["index"])
+
+    # Store document and make it searchable
+    await run_blocking(document_store.store_document, document_id, doc_data)
+    await run_blocking(get_corpus_index(user_id).add_document, document_id, doc_data["index"])
+    trim_corpus_indexes()
+
+    return upload_response(document_id, doc_data, extraction_cached)
+
+
 @app.post("/upload")
 async def upload_document(request: DocumentUploadRequest):
     """Upload and process a document for Q&A"""
@@ -261,87 +810,99 @@ async def upload_document(request: DocumentUploadRequest):
 
     try:
         logger.info(f"Processing document upload: {request.filename}")
+        user_id = request.user_id or DEFAULT_USER_ID
+
+        validate_file_input(request.filename, request.content_type)
+        file_data = await run_blocking(decode_document_content, request.content)
+        content_hash = hashlib.sha256(file_data).hexdigest()
+
+        reused = await reuse_processed_upload(content_hash, user_id, request.filename, request.content_type)
+        if reused is not None:
+            return reused
+
+        if request.background:
+            temp_file_path = await run_blocking(write_temp_file, file_data, request.filename)
+            return await start_background_ingestion(
+                temp_file_path, content_hash, request.filename, request.content_type, user_id
+            )
 
         # Extract text from document
-        text_content = extract_text_from_document(
-            request.content, 
-            request.filename, 
-            request.content_type
+        text_content, extraction_cached = await run_blocking(
+            extract_text_cached, file_data, content_hash, request.filename, request.content_type
         )
 
-        if not text_content.strip():
-            raise HTTPException(status_code=400, detail="No text content found in document")
-
-        # Generate document ID (more robust)
-        timestamp = datetime.utcnow().isoformat()
-        document_id = f"doc_{hash(request.filename + timestamp) % 100000}"
+        return await store_uploaded_document(
+            text_content, content_hash, extraction_cached, request.filename, request.content_type, user_id
+        )
 
-        # Store document
-        doc_data = {
-            "filename": request.filename,
-            "content_type": request.content_type,
-            "text_content": text_content,
-            "uploaded_at": timestamp,
-            "word_count": len(text_content.split()),
-            "char_count": len(text_content)
-        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Upload processing error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error processing document: {str(e)}")
 
-        # Generate initial summary
-        summary_prompt = f"""
-        You are a legal document analyst. Analyze the following document and provide a JSON response with these keys:
-        - "document_type": Type of document (contract, legal brief, agreement, etc.)
-        - "summary": Brief summary of the document (max 200 words)
-        - "key_topics": Array of main topics/subjects covered
-        - "entities": Array of important entities mentioned (people, companies, dates)
-        - "language_complexity": "simple", "moderate", or "complex"
 
-        Document content:
-        ---
-        {text_content[:3000]}
-        ---
-        """
+@app.post("/upload/file")
+async def upload_document_file(file: UploadFile = File(...), user_id: Optional[str] = Form(None),
+                               background: bool = Query(False)):
+    """Upload a document as multipart/form-data (field "file") for Q&A.
 
-        try:
-            response = gemini_model.generate_content(summary_prompt)
-            analysis = json.loads(response.text)
-            doc_data["analysis"] = analysis
-            logger.info(f"Document analysis completed for: {request.filename}")
-        except json.JSONDecodeError:
-            logger.warning("AI response was not valid JSON, using fallback")
-            doc_data["analysis"] = {
-                "document_type": "unknown",
-                "summary": "Document uploaded successfully. You can now ask questions about it.",
-                "key_topics": [],
-                "entities": [],
-                "language_complexity": "moderate"
-            }
-        except Exception as e:
-            logger.error(f"AI analysis failed: {str(e)}")
-            doc_data["analysis"] = {
-                "document_type": "unknown",
-                "summary": "Document uploaded but analysis failed. You can still ask questions about it.",
-                "key_topics": [],
-                "entities": [],
-                "language_complexity": "moderate"
-            }
+    Pass ``?background=true`` to return immediately and ingest in the background,
+    and an optional "user_id" form field to namespace the document.
 
-        # Store document
-        document_store.store_document(document_id, doc_data)
+    Avoids the base64-in-JSON copies of /upload: oversized requests are rejected
+    from Content-Length before the body is read (requests without one, such as
+    chunked uploads, are refused with 411), and the file the multipart parser
+    spooled is size-checked and hashed in place. It is copied to a named temp
+    file only when its text still has to be extracted or ingested.
+    """
+    if not gemini_model:
+        raise HTTPException(status_code=500, detail="AI model not configured. Set GOOGLE_API_KEY.")
 
-        return {
-            "success": True,
-            "document_id": document_id,
-            "filename": request.filename,
-            "word_count": doc_data["word_count"],
-            "char_count": doc_data["char_count"],
-            "analysis": doc_data["analysis"]
-        }
+    temp_file_path = None
+    try:
+        filename = file.filename or ""
+        content_type = file.content_type or ""
+        user_id = user_id or DEFAULT_USER_ID
+        validate_file_input(filename, content_type)
+        logger.info(f"Processing multipart document upload: {filename}")
+
+        content_hash = await run_blocking(hash_upload, file.file)
+
+        reused = await reuse_processed_upload(content_hash, user_id, filename, content_type)
+        if reused is not None:
+            return reused
+
+        if background:
+            # The ingestion task owns the temp file from here on
+            temp_file_path = await run_blocking(copy_upload_to_tempfile, file.file, filename)
+            response = await start_background_ingestion(temp_file_path, content_hash, filename, content_type, user_id)
+            temp_file_path = None
+            return response
+
+        cache_key = extraction_cache_key(content_hash, content_type)
+        text_content = extraction_cache.get(cache_key)
+        extraction_cached = text_content is not None
+        if not extraction_cached:
+            temp_file_path = await run_blocking(copy_upload_to_tempfile, file.file, filename)
+            text_content = await run_blocking(extract_text_from_file, temp_file_path, content_type)
+            extraction_cache.set(cache_key, text_content)
+
+        return await store_uploaded_document(
+            text_content, content_hash, extraction_cached, filename, content_type, user_id
+        )
 
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Upload processing error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error processing document: {str(e)}")
+    finally:
+        if temp_file_path:
+            try:
+                os.unlink(temp_file_path)
+            except OSError:
+                pass
 
 
 @app.post("/question")
@@ -350,11 +911,6 @@ async def ask_question(request: QuestionRequest):
     if not gemini_model:
         raise HTTPException(status_code=500, detail="AI model not configured.")
 
-    document = document_store.get_document(request.document_id)
-    if not document:
-        raise HTTPException(status_code=404, detail="Document not found")
-
-    text_content = document["text_content"]
     question = request.question.strip()
 
     if not question:
@@ -363,36 +919,66 @@ async def ask_question(request: QuestionRequest):
     if len(question) > 500:
         raise HTTPException(status_code=400, detail="Question too long (max 500 characters)")
 
+    if request.document_ids is not None or request.scope is not None:
+        return await ask_across_documents(request, question)
+    if not request.document_id:
+        raise HTTPException(status_code=400, detail="Provide document_id, document_ids or scope")
+
+    document = await run_blocking(get_user_document, request.document_id, request.user_id)
+
+    status = document.get("status", "ready")
+    if status == "failed":
+        raise HTTPException(status_code=422, detail=f"Document processing failed: {document.get('error')}")
+    if status == "processing" and not document.get("chunk_count"):
+        raise HTTPException(status_code=409, detail="Document is still being processed. Try again shortly.")
+
     try:
         logger.info(f"Processing question for document: {document['filename']}")
 
-        prompt = f"""
-        You are an expert legal document analyst. Answer the user's question based on the provided document content.
+        if status == "ready":
+            # Hybrid BM25 + vector retrieval through the user's corpus index
+            corpus = await load_corpus(document["user_id"], [request.document_id])
+            with time_stage("retrieval"):
+                retrieved = await run_blocking(corpus.search, question, request.top_k, [request.document_id])
+        else:
+            # Still ingesting: search the pages indexed so far
+            doc_index = await get_document_index(request.document_id, document)
+            with time_stage("retrieval"):
+                retrieved = await run_blocking(doc_index.search, question, request.top_k)
+        chunk_ids = [chunk["chunk_id"] for chunk in retrieved]
+
+        with time_stage("prompt_build"):
+            document_context = build_context(retrieved)
+            prompt = f"""
+        You are an expert legal document analyst. Answer the user's question based on the provided document excerpts.
         Provide a JSON response with these keys:
         - "answer": Your detailed answer to the question
         - "confidence": "high", "medium", or "low" based on how certain you are
         - "relevant_sections": Array of relevant text snippets from the document (max 3)
         - "follow_up_questions": Array of 2-3 suggested follow-up questions
 
-        If the question cannot be answered from the document content, explain what information is missing.
+        If the question cannot be answered from the excerpts, explain what information is missing.
 
         Document: {document["filename"]}
         Question: {question}
 
-        Document Content:
+        Relevant Document Excerpts:
         ---
-        {text_content}
+        {document_context}
         ---
         """
 
-        response = gemini_model.generate_content(prompt)
-        result = json.loads(response.text)
+        response = await run_blocking(gemini_model.generate_content, prompt)
+        with time_stage("json_parse"):
+            result = json.loads(response.text)
 
         return {
             "success": True,
             "question": question,
             "document_id": request.document_id,
             "document_name": document["filename"],
+            "chunks_used": chunk_ids,
+            "document_status": status,
             **result
         }
 
@@ -403,6 +989,8 @@ async def ask_question(request: QuestionRequest):
             "question": question,
             "document_id": request.document_id,
             "document_name": document["filename"],
+            "chunks_used": chunk_ids,
+            "document_status": status,
             "answer": "I processed your question but had difficulty formatting the response. Please try rephrasing your question.",
             "confidence": "low",
             "relevant_sections": [],
@@ -413,6 +1001,137 @@ async def ask_question(request: QuestionRequest):
         raise HTTPException(status_code=500, detail=f"Error processing question: {str(e)}")
 
 
+async def ask_across_documents(request: QuestionRequest, question: str) -> Dict[str, Any]:
+    """Answer one question from the best passages across several documents, citing each source.
+
+    Passages come from the user's shared corpus index, at most half of them
+    from any one document while others have matches, and the prompt stays
+    within the same context budget as a single-document question.
+    """
+    user_id = request.user_id or DEFAULT_USER_ID
+    documents, skipped = await run_blocking(resolve_documents, user_id, request.document_ids, request.scope)
+    if not documents:
+        raise HTTPException(status_code=409, detail="None of the selected documents are ready")
+
+    try:
+        logger.info(f"Processing question across {len(documents)} documents")
+
+        corpus = await load_corpus(user_id, list(documents))
+        with time_stage("retrieval"):
+            retrieved = await run_blocking(
+                corpus.search, question, request.top_k, list(documents), max(1, request.top_k // 2)
+            )
+        citations = [
+            {
+                "source": source,
+                "document_id": chunk["document_id"],
+                "document_name": documents[chunk["document_id"]],
+                "chunk_id": chunk["chunk_id"],
+                "page": chunk.get("page", 1),
+                "start": chunk["start"],
+                "end": chunk["end"],
+                "score": chunk["score"]
+            }
+            for source, chunk in enumerate(retrieved, start=1)
+        ]
+
+        with time_stage("prompt_build"):
+            corpus_context = build_corpus_context(retrieved, documents)
+            prompt = f"""
+        You are an expert legal document analyst. Answer the user's question based on excerpts from several documents.
+        Provide a JSON response with these keys:
+        - "answer": Your detailed answer; cite excerpts inline as [Source N] and say which document each point comes from
+        - "confidence": "high", "medium", or "low" based on how certain you are
+        - "relevant_sections": Array of objects {{"source": N, "text": snippet}} (max 3)
+        - "follow_up_questions": Array of 2-3 suggested follow-up questions
+
+        When the documents differ on the question, compare them explicitly.
+        If the question cannot be answered from the excerpts, explain what information is missing.
+
+        Question: {question}
+
+        Document Excerpts:
+        ---
+        {corpus_context}
+        ---
+        """
+
+        response = await run_blocking(gemini_model.generate_content, prompt)
+        with time_stage("json_parse"):
+            result = json.loads(response.text)
+
+    except json.JSONDecodeError:
+        logger.warning("AI response was not valid JSON, using fallback")
+        result = {
+            "answer": "I processed your question but had difficulty formatting the response. Please try rephrasing your question.",
+            "confidence": "low",
+            "relevant_sections": [],
+            "follow_up_questions": []
+        }
+    except Exception as e:
+        logger.error(f"Multi-document question error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error processing question: {str(e)}")
+
+    return {
+        "success": True,
+        "question": question,
+        "document_ids": list(documents),
+        "skipped_document_ids": skipped,
+        "citations": citations,
+        **result
+    }
+
+
+@app.post("/search")
+async def search_documents(request: SearchRequest):
+    """Find passages in uploaded documents without a model call.
+
+    BM25 and embedding rankings are fused, and each passage comes back as a
+    highlighted snippet with document and page character offsets.
+    """
+    query = request.query.strip()
+    if not query:
+        raise HTTPException(status_code=400, detail="Query is required")
+    if len(query) > 500:
+        raise HTTPException(status_code=400, detail="Query too long (max 500 characters)")
+    mode = request.mode.lower()
+    if mode not in ("hybrid", "keyword", "vector"):
+        raise HTTPException(status_code=400, detail="mode must be hybrid, keyword or vector")
+
+    user_id = request.user_id or DEFAULT_USER_ID
+    scope = None if request.document_ids is not None else "all"
+    documents, skipped = await run_blocking(resolve_documents, user_id, request.document_ids, scope)
+
+    start = time.perf_counter()
+    corpus = await load_corpus(user_id, list(documents))
+    with time_stage("retrieval"):
+        retrieved = await run_blocking(corpus.search, query, request.top_k, list(documents), None, mode)
+    if retrieved and all(chunk["vector_score"] is None for chunk in retrieved):
+        mode = "keyword"  # embeddings unavailable for this selection
+    results = [
+        {
+            "document_id": chunk["document_id"],
+            "document_name": documents[chunk["document_id"]],
+            "chunk_id": chunk["chunk_id"],
+            "score": chunk["score"],
+            "keyword_score": chunk["keyword_score"],
+            "vector_score": chunk["vector_score"],
+            **highlight_passage(chunk, query)
+        }
+        for chunk in retrieved
+    ]
+
+    return {
+        "success": True,
+        "query": query,
+        "mode": mode,
+        "documents_searched": len(documents),
+        "skipped_document_ids": skipped,
+        "took_ms": round((time.perf_counter() - start) * 1000, 1),
+        "results": results
+    }
+
+
 @app.post("/analyze")
 async def analyze_document(request: DocumentAnalysisRequest):
     """Perform detailed analysis of a document"""
@@ -422,101 +1141,121 @@ async def analyze_document(request: DocumentAnalysisRequest):
     try:
         logger.info(f"Analyzing document: {request.filename}")
 
-        # Extract text from document
-        text_content = extract_text_from_document(
+        # Extract text from document (cached by content hash)
+        text_content, content_hash, _ = await run_blocking(
+            extract_text_from_document,
             request.content, 
             request.filename, 
             request.content_type
         )
 
         analysis_type = request.analysis_type.lower()
-
-        if analysis_type == "summary":
-            prompt = f"""
-            Provide a comprehensive summary of this document in JSON format:
-            - "executive_summary": Main points in 2-3 sentences
-            - "detailed_summary": Comprehensive summary (300-500 words)
-            - "key_sections": Array of important sections with titles and brief descriptions
-
-            Document: {text_content}
-            """
-        elif analysis_type == "key_points":
-            prompt = f"""
-            Extract and organize key points from this document in JSON format:
-            - "main_points": Array of the most important points (max 10)
-            - "supporting_details": Object with main points as keys and supporting details as values
-            - "action_items": Array of any action items or next steps mentioned
-
-            Document: {text_content}
-            """
-        elif analysis_type == "legal_issues":
-            prompt = f"""
-            Identify legal issues and concerns in this document in JSON format:
-            - "legal_issues": Array of potential legal issues or concerns
-            - "risk_assessment": Overall risk level ("low", "medium", "high") with explanation
-            - "recommendations": Array of recommended actions or considerations
-            - "clauses_of_concern": Array of specific clauses that need attention
-
-            Document: {text_content}
-            """
-        else:
-            raise HTTPException(status_code=400, detail="Invalid analysis type. Use: summary, key_points, or legal_issues")
-
-        response = gemini_model.generate_content(prompt)
-        result = json.loads(response.text)
+        result, cached = await run_document_analysis(text_content, analysis_type, content_hash)
 
         return {
             "success": True,
             "filename": request.filename,
             "analysis_type": analysis_type,
             "word_count": len(text_content.split()),
-            **result
+            **result,
+            "cached": cached
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Analysis error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Analysis error: {str(e)}")
+
+
+@app.post("/documents/{document_id}/analyze")
+async def analyze_stored_document(document_id: str, request: StoredDocumentAnalysisRequest):
+    """Perform detailed analysis of an already uploaded document"""
+    if not gemini_model:
+        raise HTTPException(status_code=500, detail="AI model not configured.")
+
+    document = await run_blocking(get_user_document, document_id, request.user_id)
+    if document.get("status", "ready") != "ready":
+        raise HTTPException(status_code=409, detail="Document is not ready for analysis")
+
+    try:
+        logger.info(f"Analyzing stored document: {document['filename']}")
+
+        analysis_type = request.analysis_type.lower()
+        text_content = await run_blocking(document_store.load_text, document_id)
+        result, cached = await run_document_analysis(text_content, analysis_type, document["content_hash"])
+
+        return {
+            "success": True,
+            "document_id": document_id,
+            "filename": document["filename"],
+            "analysis_type": analysis_type,
+            "word_count": document["word_count"],
+            **result,
+            "cached": cached
         }
 
     except HTTPException:
         raise
-    except json.JSONDecodeError:
-        logger.warning("AI response was not valid JSON")
-        raise HTTPException(status_code=500, detail="AI analysis returned invalid format")
     except Exception as e:
         logger.error(f"Analysis error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Analysis error: {str(e)}")
 
 
 @app.get("/documents")
-async def list_documents():
-    """List all uploaded documents"""
+async def list_documents(offset: int = Query(0, ge=0), limit: int = Query(50, ge=1, le=200),
+                         user_id: Optional[str] = None):
+    """List a user's uploaded documents, newest first, one page at a time"""
     try:
-        documents = []
-        for doc_id, doc_data in document_store.list_documents().items():
-            documents.append({
-                "document_id": doc_id,
-                "filename": doc_data["filename"],
-                "uploaded_at": doc_data["uploaded_at"],
-                "word_count": doc_data["word_count"],
-                "document_type": doc_data.get("analysis", {}).get("document_type", "unknown")
-            })
-
-        # Sort by upload time (newest first)
-        documents.sort(key=lambda x: x["uploaded_at"], reverse=True)
+        documents, total = await run_blocking(
+            document_store.list_documents, user_id or DEFAULT_USER_ID, offset, limit
+        )
 
         return {
             "success": True,
             "documents": documents,
-            "total": len(documents)
+            "total": total,
+            "offset": offset,
+            "limit": limit
         }
     except Exception as e:
         logger.error(f"List documents error: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to list documents")
 
 
+@app.get("/documents/{document_id}/status")
+async def document_status(document_id: str, user_id: Optional[str] = None):
+    """Report ingestion progress for a document"""
+    document = await run_blocking(get_user_document, document_id, user_id)
+
+    status = document.get("status", "ready")
+    pages_total = document.get("pages_total") or len(document.get("pages", [])) or None
+    pages_processed = document.get("pages_processed", pages_total or 0)
+
+    return {
+        "success": True,
+        "document_id": document_id,
+        "filename": document["filename"],
+        "status": status,
+        "pages_total": pages_total,
+        "pages_processed": pages_processed,
+        "progress": round(pages_processed / pages_total, 3) if pages_total else (1.0 if status == "ready" else 0.0),
+        "chunk_count": document.get("chunk_count", 0),
+        "error": document.get("error")
+    }
+
+
 @app.delete("/documents/{document_id}")
-async def delete_document(document_id: str):
+async def delete_document(document_id: str, user_id: Optional[str] = None):
     """Delete a document from storage"""
     try:
-        document = document_store.delete_document(document_id)
+        await run_blocking(get_user_document, document_id, user_id)
+        document = await run_blocking(document_store.delete_document, document_id)
         if not document:
             raise HTTPException(status_code=404, detail="Document not found")
+        corpus = corpus_indexes.get(user_id or DEFAULT_USER_ID)
+        if corpus is not None:
+            corpus.remove_document(document_id)
 
         filename = document.get("filename", "Unknown")
         logger.info(f"Document deleted: {filename}")
@@ -1,20 +1,22 @@
 import os
+import re
 import json
-from typing import Optional, Dict, Any
+import time
+import hashlib
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Tuple, AsyncIterator, Callable, Iterable, Iterator
 
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 
 # External libs
 import requests
-from bs4 import BeautifulSoup
-
-try:
-    import google.generativeai as genai
-except Exception:
-    genai = None
+from requests.adapters import HTTPAdapter
 
 try:
     # googlesearch-python
@@ -22,11 +24,18 @@ try:
 except Exception:
     google_search = None
 
+from concurrency import run_blocking
+from cache import TTLCache
+from llm_client import configure_llm, get_model
+from metrics import install_metrics, register_cache, time_stage, stage_duration_seconds
+from html_text import extract_main_text, iter_response_text
+
 # Load environment
 load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
 app = FastAPI(title="LawSimplify Model API", version="1.0.0")
+install_metrics(app)
 
 # Allow local dev origins
 app.add_middleware(
@@ -41,9 +50,8 @@ app.add_middleware(
 GENERATION_CONFIG = {"response_mime_type": "application/json"}
 MODEL_NAME = "gemini-2.5-pro"
 
-if GOOGLE_API_KEY and genai:
-    genai.configure(api_key=GOOGLE_API_KEY)
-    gemini_model = genai.GenerativeModel(model_name=MODEL_NAME, generation_config=GENERATION_CONFIG)
+if configure_llm(GOOGLE_API_KEY):
+    gemini_model = get_model(MODEL_NAME, GENERATION_CONFIG)
 else:
     gemini_model = None
 
@@ -52,6 +60,10 @@ class SimplifyRequest(BaseModel):
     text: str = Field(..., description="Legal clause to simplify")
 
 
+class BatchSimplifyRequest(BaseModel):
+    clauses: List[str] = Field(..., description="Legal clauses to simplify, e.g. every clause of a contract")
+
+
 class TranslateRequest(BaseModel):
     result: Dict[str, Any] = Field(..., description="JSON result object to translate")
     target_language: str = Field(..., description="Target language name (e.g., Hindi)")
@@ -64,46 +76,280 @@ LEGAL_KEYWORDS = {
     "hereby"
 }
 
+# Web context caches: normalized query -> URL and URL -> cleaned text.
+# Set LAWSIMPLIFY_CACHE_DIR to persist them across restarts.
+WEB_CACHE_DIR = os.getenv("LAWSIMPLIFY_CACHE_DIR") or None
+WEB_CACHE_TTL = float(os.getenv("LAWSIMPLIFY_WEB_CACHE_TTL", str(24 * 60 * 60)))
+url_cache = TTLCache(
+    max_items=int(os.getenv("LAWSIMPLIFY_URL_CACHE_MAX_ITEMS", "2048")),
+    ttl=WEB_CACHE_TTL,
+    spill_dir=os.path.join(WEB_CACHE_DIR, "urls") if WEB_CACHE_DIR else None,
+    write_through=True
+)
+page_text_cache = TTLCache(
+    max_items=int(os.getenv("LAWSIMPLIFY_PAGE_CACHE_MAX_ITEMS", "512")),
+    ttl=WEB_CACHE_TTL,
+    spill_dir=os.path.join(WEB_CACHE_DIR, "pages") if WEB_CACHE_DIR else None,
+    write_through=True
+)
+
+# Translations of individual result strings: (target language, string hash) -> translated string
+translation_cache = TTLCache(
+    max_items=int(os.getenv("LAWSIMPLIFY_TRANSLATION_CACHE_MAX_ITEMS", "8192")),
+    ttl=float(os.getenv("LAWSIMPLIFY_TRANSLATION_CACHE_TTL", str(7 * 24 * 60 * 60))),
+    spill_dir=os.path.join(WEB_CACHE_DIR, "translations") if WEB_CACHE_DIR else None,
+    write_through=True
+)
+
+register_cache("url", url_cache)
+register_cache("page_text", page_text_cache)
+register_cache("translation", translation_cache)
+
+# /simplify/batch: clauses per model call, prompt size budget, and concurrent model calls
+BATCH_MAX_CLAUSES = int(os.getenv("LAWSIMPLIFY_BATCH_MAX_CLAUSES", "10"))
+BATCH_MAX_PROMPT_CHARS = int(os.getenv("LAWSIMPLIFY_BATCH_MAX_PROMPT_CHARS", "30000"))
+BATCH_CONCURRENCY = int(os.getenv("LAWSIMPLIFY_BATCH_CONCURRENCY", "4"))
+BATCH_MAX_REQUEST_CLAUSES = int(os.getenv("LAWSIMPLIFY_BATCH_MAX_REQUEST_CLAUSES", "200"))
+# Web context kept per clause in a batch prompt
+BATCH_CONTEXT_CHARS = int(os.getenv("LAWSIMPLIFY_BATCH_CONTEXT_CHARS", "800"))
+
+# Web-context stage: overall latency budget and how many search results to race
+CONTEXT_DEADLINE = float(os.getenv("LAWSIMPLIFY_CONTEXT_DEADLINE", "4.0"))
+CONTEXT_SEARCH_RESULTS = int(os.getenv("LAWSIMPLIFY_CONTEXT_SEARCH_RESULTS", "3"))
+# Web-context fetches in flight across all requests; each runs one search plus up to
+# CONTEXT_SEARCH_RESULTS scrapes
+WEB_CONTEXT_CONCURRENCY = int(os.getenv("LAWSIMPLIFY_WEB_CONTEXT_CONCURRENCY", "4"))
+MAX_PAGE_TEXT_CHARS = 3500
+
+# Searches and scrapes run on their own pool, not the shared blocking one: a fetch
+# abandoned at the deadline keeps its thread until its own timeouts expire, and
+# those threads must not crowd out model calls. When abandoned fetches fill this
+# pool, new ones queue and fall back to no context at the deadline.
+WEB_FETCH_POOL_SIZE = int(os.getenv(
+    "LAWSIMPLIFY_WEB_FETCH_POOL_SIZE", str(WEB_CONTEXT_CONCURRENCY * (1 + CONTEXT_SEARCH_RESULTS))
+))
+web_fetch_pool = ThreadPoolExecutor(max_workers=WEB_FETCH_POOL_SIZE, thread_name_prefix="web-fetch")
+
+
+async def run_web_fetch(func: Callable[..., Any], *args) -> Any:
+    """Run a blocking search or scrape on the web-fetch pool and await its result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(web_fetch_pool, functools.partial(func, *args))
+
+
+# Pooled keep-alive session shared by all scrapes
+http_session = requests.Session()
+http_session.headers.update({
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
+                  'AppleWebKit/537.36 (KHTML, like Gecko) '
+                  'Chrome/91.0.4472.124 Safari/537.36'
+})
+_adapter = HTTPAdapter(pool_connections=32, pool_maxsize=WEB_FETCH_POOL_SIZE)
+http_session.mount("http://", _adapter)
+http_session.mount("https://", _adapter)
+
+
+async def fetch_web_context(query: str) -> Tuple[str, Optional[str]]:
+    """Search, then scrape the top results concurrently; return the first non-empty text and its URL"""
+    with time_stage("search"):
+        urls = await run_web_fetch(find_relevant_urls, query)
+    if not urls:
+        return "", None
+
+    async def scrape(url: str) -> Tuple[str, Optional[str]]:
+        with time_stage("scrape"):
+            return await run_web_fetch(scrape_text_from_url, url, CONTEXT_DEADLINE), url
+
+    tasks = [asyncio.ensure_future(scrape(url)) for url in urls]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            text, url = await next_done
+            if text:
+                return text, url
+        return "", None
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+_web_context_slots: Optional[asyncio.Semaphore] = None
+
+
+def web_context_slots() -> asyncio.Semaphore:
+    # Created on first use so it belongs to the running event loop
+    global _web_context_slots
+    if _web_context_slots is None:
+        _web_context_slots = asyncio.Semaphore(max(1, WEB_CONTEXT_CONCURRENCY))
+    return _web_context_slots
 
-def find_relevant_url(query: str) -> Optional[str]:
+
+async def fetch_web_context_in_slot(query: str) -> Tuple[str, Optional[str]]:
+    async with web_context_slots():
+        return await fetch_web_context(query)
+
+
+async def get_web_context(query: str, request_slots: Optional[asyncio.Semaphore] = None
+                          ) -> Tuple[str, Optional[str], float]:
+    """Run the web-context stage within CONTEXT_DEADLINE seconds.
+
+    At most WEB_CONTEXT_CONCURRENCY fetches are awaited at once across all
+    requests, and waiting for one of those slots counts against the deadline,
+    so a single /simplify is never held up by queued batch clauses. Batches
+    pass their own ``request_slots`` to queue their clauses per request first;
+    that wait is outside the deadline. Returns (context, source_url,
+    elapsed_ms), elapsed time including any queueing; context is empty if
+    nothing usable arrived before the deadline.
+    """
+    start = time.perf_counter()
+    if request_slots is not None:
+        await request_slots.acquire()
+    try:
+        context, url = await asyncio.wait_for(fetch_web_context_in_slot(query), timeout=CONTEXT_DEADLINE)
+    except asyncio.TimeoutError:
+        context, url = "", None
+    finally:
+        if request_slots is not None:
+            request_slots.release()
+    elapsed = time.perf_counter() - start
+    stage_duration_seconds.observe(elapsed, stage="web_context")
+    elapsed_ms = round(elapsed * 1000, 1)
+    return context, url, elapsed_ms
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase and strip punctuation/extra whitespace so equivalent clauses share a cache key"""
+    return " ".join(re.findall(r"\w+", query.lower()))
+
+
+def find_relevant_urls(query: str, num_results: int = CONTEXT_SEARCH_RESULTS) -> List[str]:
+    cache_key = normalize_query(query)
+    cached = url_cache.get(cache_key)
+    if cached:
+        return [cached] if isinstance(cached, str) else cached[:num_results]
     if not google_search:
-        return None
+        return []
     try:
         search_query = f"{query} India"
-        results = list(google_search(search_query, num_results=1, lang="en"))
+        results = list(google_search(search_query, num_results=num_results, lang="en"))
         if results:
-            return results[0]
+            url_cache.set(cache_key, results)
+        return results
     except Exception:
-        return None
-    return None
+        return []
+
+
+def until_deadline(chunks: Iterable[str], deadline: float) -> Iterator[str]:
+    """Stop a chunk stream once time.monotonic() passes deadline"""
+    for chunk in chunks:
+        yield chunk
+        if time.monotonic() >= deadline:
+            return
 
 
-def scrape_text_from_url(url: str) -> str:
+def scrape_text_from_url(url: str, timeout: float = 10) -> str:
+    """Main text of a page; timeout bounds each socket wait and, roughly, the whole body read"""
     if not url:
         return ""
+    cached = page_text_cache.get(url)
+    if cached is not None:
+        return cached
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
-                          'AppleWebKit/537.36 (KHTML, like Gecko) '
-                          'Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.content, 'html.parser')
-        for tag in soup(["script", "style"]):
-            tag.decompose()
-        text = soup.get_text(separator="\n")
-        lines = (line.strip() for line in text.splitlines())
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        cleaned_text = '\n'.join(chunk for chunk in chunks if chunk)
-        return cleaned_text[:3500]
+        deadline = time.monotonic() + timeout
+        # Stream the body and stop reading once enough main-content text is parsed
+        with http_session.get(url, timeout=timeout, stream=True) as response:
+            response.raise_for_status()
+            charset_declared = "charset" in response.headers.get("content-type", "").lower()
+            # Otherwise use the page's <meta> charset, falling back to UTF-8
+            encoding = response.encoding if charset_declared else None
+            chunks = until_deadline(iter_response_text(response, encoding), deadline)
+            cleaned_text = extract_main_text(chunks, MAX_PAGE_TEXT_CHARS)
+        # Text cut short by the deadline is used once but not cached
+        if cleaned_text and time.monotonic() < deadline:
+            page_text_cache.set(url, cleaned_text)
+        return cleaned_text
     except Exception:
         return ""
 
 
+def is_legal_statement(text: str) -> bool:
+    """Cheap local filter: long enough and mentions at least one legal keyword"""
+    lower = text.lower()
+    return len(text.split()) >= 8 and any(k in lower for k in LEGAL_KEYWORDS)
+
+
+def pack_clauses(clauses: List[str]) -> List[List[int]]:
+    """Group clause indices into as few model calls as BATCH_MAX_CLAUSES / BATCH_MAX_PROMPT_CHARS allow"""
+    per_clause_overhead = BATCH_CONTEXT_CHARS + 100
+    groups: List[List[int]] = []
+    current: List[int] = []
+    current_chars = 0
+    for index, clause in enumerate(clauses):
+        size = len(clause) + per_clause_overhead
+        if current and (len(current) >= BATCH_MAX_CLAUSES or current_chars + size > BATCH_MAX_PROMPT_CHARS):
+            groups.append(current)
+            current, current_chars = [], 0
+        current.append(index)
+        current_chars += size
+    if current:
+        groups.append(current)
+    return groups
+
+
+def build_batch_prompt(items: List[Dict[str, str]]) -> str:
+    clauses_json = json.dumps(items, ensure_ascii=False, indent=1)
+    return f"""
+    You are an expert at simplifying complex Indian legal clauses for a general audience.
+    Below is a JSON list of legal clauses from India. Each item has an "id", the "clause" text and
+    optional "context" found on the web which might be related.
+
+    Return a JSON object mapping every "id" to an object with two keys: "simplified_explanation" and "real_life_example".
+    1.  For "simplified_explanation": The statement should be simplified.
+    2.  For "real_life_example": A simple and easy to understand example should be given.
+    Treat each clause independently and do not skip any id.
+
+    Clauses:
+    {clauses_json}
+    """
+
+
+async def simplify_clause_group(clauses: List[str], context_slots: Optional[asyncio.Semaphore] = None
+                                ) -> List[Dict[str, Any]]:
+    """Simplify a packed group of clauses with one model call; returns one result or error per clause"""
+    contexts = await asyncio.gather(*(get_web_context(clause, context_slots) for clause in clauses))
+    items = [
+        {"id": str(i), "clause": clause, "context": context[:BATCH_CONTEXT_CHARS]}
+        for i, (clause, (context, _, _)) in enumerate(zip(clauses, contexts))
+    ]
+    try:
+        with time_stage("prompt_build"):
+            prompt = build_batch_prompt(items)
+        resp = await run_blocking(gemini_model.generate_content, prompt)
+        with time_stage("json_parse"):
+            data = json.loads(resp.text)
+        if not isinstance(data, dict):
+            raise ValueError("Invalid model JSON response")
+    except Exception as e:
+        return [{"error": f"Model error: {e}"} for _ in clauses]
+
+    results = []
+    for item, (context, _, context_ms) in zip(items, contexts):
+        result = data.get(item["id"])
+        if isinstance(result, dict) and result.get("simplified_explanation"):
+            results.append({"result": dict(result, context_found=bool(context), context_ms=context_ms)})
+        else:
+            results.append({"error": "Model returned no result for this clause"})
+    return results
+
+
 @app.get("/health")
 async def health():
-    return {"status": "ok", "gemini": bool(gemini_model)}
+    return {
+        "status": "ok",
+        "gemini": bool(gemini_model),
+        "url_cache": url_cache.stats(),
+        "page_text_cache": page_text_cache.stats(),
+        "translation_cache": translation_cache.stats()
+    }
 
 
 @app.post("/simplify")
@@ -115,15 +361,10 @@ async def simplify(req: SimplifyRequest):
     if not text:
         raise HTTPException(status_code=400, detail="Text is required")
 
-    tokens = text.split()
-    lower = text.lower()
-    if len(tokens) < 8 or not any(k in lower for k in LEGAL_KEYWORDS):
+    if not is_legal_statement(text):
         raise HTTPException(status_code=400, detail="This does not appear to be a valid legal statement.")
 
-    context = ""
-    url = find_relevant_url(text)
-    if url:
-        context = scrape_text_from_url(url)
+    context, _, context_ms = await get_web_context(text)
 
     prompt = f"""
     You are an expert at simplifying complex Indian legal clauses for a general audience.
@@ -145,37 +386,165 @@ async def simplify(req: SimplifyRequest):
     """
 
     try:
-        resp = gemini_model.generate_content(prompt)
-        data = json.loads(resp.text)
+        resp = await run_blocking(gemini_model.generate_content, prompt)
+        with time_stage("json_parse"):
+            data = json.loads(resp.text)
         if not isinstance(data, dict):
             raise ValueError("Invalid model JSON response")
+        data["context_found"] = bool(context)
+        data["context_ms"] = context_ms
         return data
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Model error: {e}")
 
 
-@app.post("/translate")
-async def translate(req: TranslateRequest):
+@app.post("/simplify/batch")
+async def simplify_batch(req: BatchSimplifyRequest):
+    """Simplify many clauses at once, streaming one NDJSON line per clause as results complete.
+
+    Identical clauses are simplified once and invalid ones are rejected
+    locally. Valid clauses are packed into as few model calls as the prompt
+    budget allows, at most BATCH_CONCURRENCY at a time. Lines are
+    ``{"index": i, "clause": str, "result": {...}}`` or ``{"index": i, "error": str}``,
+    followed by a final ``{"done": true, ...}`` summary line.
+    """
     if not gemini_model:
         raise HTTPException(status_code=500, detail="Gemini model not configured. Set GOOGLE_API_KEY.")
-
-    target = (req.target_language or '').strip()
-    if not target or target.lower() == 'english':
-        return req.result
-
-    json_str = json.dumps(req.result)
+    if not req.clauses:
+        raise HTTPException(status_code=400, detail="At least one clause is required")
+    if len(req.clauses) > BATCH_MAX_REQUEST_CLAUSES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many clauses (max {BATCH_MAX_REQUEST_CLAUSES} per request)"
+        )
+
+    # Unique clause text -> positions in the request
+    positions: Dict[str, List[int]] = {}
+    for index, clause in enumerate(req.clauses):
+        positions.setdefault((clause or "").strip(), []).append(index)
+
+    valid = [text for text in positions if text and is_legal_statement(text)]
+    invalid = [text for text in positions if text not in valid]
+    groups = [[valid[i] for i in group] for group in pack_clauses(valid)]
+    semaphore = asyncio.Semaphore(max(1, BATCH_CONCURRENCY))
+    # This request's clauses queue here, so only WEB_CONTEXT_CONCURRENCY of them
+    # wait for shared fetch slots (and their deadlines) at a time
+    context_slots = asyncio.Semaphore(max(1, WEB_CONTEXT_CONCURRENCY))
+
+    async def run_group(group: List[str]) -> Tuple[List[str], List[Dict[str, Any]]]:
+        async with semaphore:
+            return group, await simplify_clause_group(group, context_slots)
+
+    def lines_for(text: str, outcome: Dict[str, Any]) -> str:
+        return "".join(
+            json.dumps(dict(outcome, index=index, clause=text), ensure_ascii=False) + "\n"
+            for index in positions[text]
+        )
+
+    async def result_stream() -> AsyncIterator[str]:
+        for text in invalid:
+            error = "Text is required" if not text else "This does not appear to be a valid legal statement."
+            yield lines_for(text, {"error": error})
+
+        tasks = [asyncio.ensure_future(run_group(group)) for group in groups]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                group, outcomes = await next_done
+                yield "".join(lines_for(text, outcome) for text, outcome in zip(group, outcomes))
+        finally:
+            # Client went away: stop the remaining model calls
+            for task in tasks:
+                task.cancel()
+
+        yield json.dumps({
+            "done": True,
+            "total": len(req.clauses),
+            "unique": len(positions),
+            "model_calls": len(groups)
+        }) + "\n"
+
+    return StreamingResponse(result_stream(), media_type="application/x-ndjson")
+
+
+def collect_strings(value: Any, out: List[str]):
+    """Collect translatable leaf string values (not keys) of a JSON value in traversal order"""
+    if isinstance(value, dict):
+        for item in value.values():
+            collect_strings(item, out)
+    elif isinstance(value, list):
+        for item in value:
+            collect_strings(item, out)
+    elif isinstance(value, str) and re.search(r"[^\W\d_]", value):
+        out.append(value)
+
+
+def replace_strings(value: Any, translations: Dict[str, str]) -> Any:
+    """Rebuild a JSON value with leaf strings swapped for their translations"""
+    if isinstance(value, dict):
+        return {key: replace_strings(item, translations) for key, item in value.items()}
+    if isinstance(value, list):
+        return [replace_strings(item, translations) for item in value]
+    if isinstance(value, str):
+        return translations.get(value, value)
+    return value
+
+
+def translation_cache_key(text: str, target: str) -> Tuple[str, str]:
+    return target.lower(), hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def translate_strings(strings: List[str], target: str) -> Dict[str, str]:
+    """Translate strings in one model call; returns original -> translation for those the model returned"""
+    numbered = {str(i): text for i, text in enumerate(strings)}
     prompt = f"""
-    You are an expert translator. Your task is to translate all the string values in the following JSON object into {target}.
-    - Do NOT translate the JSON keys.
-    - Keep the exact same JSON structure.
+    You are an expert translator. Translate each string value in the following JSON object into {target}.
+    - Keep the same keys; return a JSON object mapping each key to its translated string.
+    - Do not add, merge or drop keys.
 
     JSON to translate:
-    {json_str}
+    {json.dumps(numbered, ensure_ascii=False)}
     """
-    try:
-        resp = gemini_model.generate_content(prompt)
+    resp = gemini_model.generate_content(prompt)
+    with time_stage("json_parse"):
         data = json.loads(resp.text)
-        return data
-    except Exception as e:
-        # Return original on failure
-        return req.result
\ No newline at end of file
+    if not isinstance(data, dict):
+        raise ValueError("Invalid model JSON response")
+    translated = {}
+    for key, text in numbered.items():
+        value = data.get(key)
+        if isinstance(value, str) and value.strip():
+            translated[text] = value
+    return translated
+
+
+@app.post("/translate")
+async def translate(req: TranslateRequest):
+    target = (req.target_language or '').strip()
+    if not target or target.lower() == 'english':
+        return req.result
+
+    # Only strings not translated before go to the model; the JSON shape is rebuilt locally
+    strings: List[str] = []
+    collect_strings(req.result, strings)
+    translations: Dict[str, str] = {}
+    missing: List[str] = []
+    for text in dict.fromkeys(strings):
+        cached = translation_cache.get(translation_cache_key(text, target))
+        if cached is not None:
+            translations[text] = cached
+        else:
+            missing.append(text)
+
+    if missing:
+        if not gemini_model:
+            raise HTTPException(status_code=500, detail="Gemini model not configured. Set GOOGLE_API_KEY.")
+        try:
+            translated = await run_blocking(translate_strings, missing, target)
+        except Exception:
+            # Return original on failure
+            return req.result
+        for text, value in translated.items():
+            translation_cache.set(translation_cache_key(text, target), value)
+        translations.update(translated)
+
+    return replace_strings(req.result, translations)
\ No newline at end of file
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the HTML-to-text cleaning used by LawSimplify's web context.
+
+Compares the previous BeautifulSoup full-document cleaning with the streaming
+extractor in html_text.py (stdlib html.parser, and lxml when installed) over a
+directory of saved legal HTML pages. Reports per-page latency and how much of
+each extracted window comes from the page's <main>/<article> content, and
+checks that entities and feed-chunk boundaries leave words intact.
+
+Without a corpus directory, synthetic statute-like pages wrapped in navigation
+and footer boilerplate are used.
+
+Usage: python bench_html_text.py --corpus saved_pages/ --rounds 5
+"""
+
+import os
+import time
+import random
+import argparse
+import statistics
+
+from html_text import html_to_text, lxml_etree, MAX_TEXT_CHARS, FEED_CHUNK_CHARS
+
+try:
+    from bs4 import BeautifulSoup
+except Exception:
+    BeautifulSoup = None
+
+
+def bs4_clean(html):
+    """The cleaning scrape_text_from_url used before html_text.py"""
+    soup = BeautifulSoup(html, 'html.parser')
+    for tag in soup(["script", "style"]):
+        tag.decompose()
+    text = soup.get_text(separator="\n")
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    return '\n'.join(chunk for chunk in chunks if chunk)[:MAX_TEXT_CHARS]
+
+
+def synthetic_page(rng, sections=120):
+    words = ["party", "agreement", "shall", "liability", "court", "provision", "hereby",
+             "section", "contract", "indemnify", "notice", "tenant", "landlord", "period"]
+    nav = "".join(f'<li><a href="/act/{i}">Act {i} navigation link</a></li>' for i in range(300))
+    body = "".join(
+        f"<h3>Section {i}</h3><p>{' '.join(rng.choice(words) for _ in range(60))}.</p>"
+        for i in range(sections)
+    )
+    footer = "".join(f"<p>Related judgement {i} &middot; disclaimer text</p>" for i in range(200))
+    return (
+        "<html><head><title>Act</title><style>body{margin:0}</style>"
+        "<script>var tracking = {a: 1};</script></head><body>"
+        f"<header><nav><ul>{nav}</ul></nav></header>"
+        f"<main><article><h1>The Sample Act</h1>{body}</article></main>"
+        f"<aside>{footer}</aside><footer>{footer}</footer></body></html>"
+    )
+
+
+def load_corpus(path, count):
+    if path:
+        pages = []
+        for name in sorted(os.listdir(path)):
+            if name.lower().endswith((".html", ".htm")):
+                with open(os.path.join(path, name), "r", encoding="utf-8", errors="replace") as f:
+                    pages.append(f.read())
+        return pages
+    rng = random.Random(7)
+    return [synthetic_page(rng) for _ in range(count)]
+
+
+def main_content_lines(html):
+    """Lines of the page's main/article element, as a reference for extraction quality"""
+    if BeautifulSoup is None:
+        return None
+    soup = BeautifulSoup(html, 'html.parser')
+    main = soup.find("main") or soup.find("article")
+    if main is None:
+        return None
+    return {" ".join(line.split()) for line in main.get_text(separator="\n").splitlines() if line.strip()}
+
+
+def text_cases():
+    """(name, html, expected text) pairs where parsers split a run of text into several data events"""
+    # A comment pads the page so the next word straddles the first FEED_CHUNK_CHARS boundary
+    padding = "<!--" + "x" * (FEED_CHUNK_CHARS - len("<html><body><!----><p>The tenant sha")) + "-->"
+    return [
+        ("named entities", "<p>The landlord&rsquo;s caf&eacute; &amp; shop</p>", "The landlord\u2019s caf\u00e9 & shop"),
+        ("numeric charrefs", "<p>Tenants don&#39;t pay &#8377;500</p>", "Tenants don't pay \u20b9500"),
+        ("escaped markup", "<p>Clauses A &amp; B &lt;tag&gt;</p>", "Clauses A & B <tag>"),
+        ("inline tags", "<p>Sec<b>tion</b> 4 <a href='#'>applies</a>.</p>", "Section 4 applies."),
+        ("chunk boundary", f"<html><body>{padding}<p>The tenant shall pay rent.</p></body></html>",
+         "The tenant shall pay rent."),
+    ]
+
+
+def check_text(name, extract):
+    failures = [(case, extract(html)) for case, html, expected in text_cases() if extract(html) != expected]
+    for case, text in failures:
+        print(f"{name:<22} {case}: got {text!r}")
+    return not failures
+
+
+def main_share(text, reference):
+    lines = [" ".join(line.split()) for line in text.splitlines() if line.strip()]
+    if not lines or reference is None:
+        return None
+    return sum(1 for line in lines if line in reference) / len(lines)
+
+
+def bench(name, extract, pages, references, rounds):
+    timings = []
+    shares = []
+    for _ in range(rounds):
+        for html in pages:
+            start = time.perf_counter()
+            extract(html)
+            timings.append((time.perf_counter() - start) * 1000)
+    for html, reference in zip(pages, references):
+        share = main_share(extract(html), reference)
+        if share is not None:
+            shares.append(share)
+    timings.sort()
+    p95 = timings[int(len(timings) * 0.95) - 1] if len(timings) > 1 else timings[0]
+    share_text = f"{statistics.mean(shares) * 100:5.1f}%" if shares else "  n/a"
+    print(f"{name:<22} mean {statistics.mean(timings):8.2f} ms   p95 {p95:8.2f} ms   main-content {share_text}")
+    return statistics.mean(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark HTML-to-text cleaning")
+    parser.add_argument("--corpus", help="Directory of saved .html pages (synthetic pages if omitted)")
+    parser.add_argument("--pages", type=int, default=20, help="Synthetic page count")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    pages = load_corpus(args.corpus, args.pages)
+    if not pages:
+        print("No HTML pages found")
+        return
+    size_kb = sum(len(p) for p in pages) / len(pages) / 1024
+    print(f"{len(pages)} pages, {size_kb:.0f} KB average, {args.rounds} rounds\n")
+
+    references = [main_content_lines(html) for html in pages]
+    extractors = {}
+    if BeautifulSoup is not None:
+        extractors["bs4 (previous)"] = bs4_clean
+    else:
+        print("bs4 not installed; skipping the previous implementation")
+    extractors["html.parser stream"] = lambda h: html_to_text(h, backend="html.parser")
+    if lxml_etree is not None:
+        extractors["lxml stream"] = lambda h: html_to_text(h, backend="lxml")
+
+    results = {name: bench(name, extract, pages, references, args.rounds) for name, extract in extractors.items()}
+
+    print()
+    for name, extract in extractors.items():
+        if check_text(name, extract):
+            print(f"{name:<22} entities and chunk boundaries: ok")
+
+    baseline = results.get("bs4 (previous)")
+    if baseline:
+        print()
+        for name, mean_ms in results.items():
+            if name != "bs4 (previous)":
+                print(f"{name}: {baseline / mean_ms:.1f}x faster than bs4")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Benchmark for OCR of image uploads in DocumentQA.
+
+Compares the previous approach (pytesseract.image_to_string on the raw,
+full-resolution first frame, inline) with the image_ocr.py pipeline
+(greyscale, resample to the target DPI, Otsu binarization, strip tiling and
+the process pool, all frames). Reports seconds per page and character
+accuracy against ground truth for every sample.
+
+Samples come from a directory of scans, each with a same-named .txt file
+holding the expected text (pages separated by form feeds for multi-frame
+files). Without a directory, synthetic legal scans are generated: phone-photo
+style JPEGs (large, 72 DPI metadata, grey paper, noise, blur) and a
+multi-page TIFF.
+
+Usage: python bench_ocr.py --corpus scans/ --rounds 2
+       python bench_ocr.py --samples 3 --keep synthetic_scans/
+"""
+
+import os
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+try:
+    from PIL import Image, ImageDraw, ImageFilter, ImageFont
+except Exception:
+    Image = None
+
+try:
+    import pytesseract
+except Exception:
+    pytesseract = None
+
+try:
+    import Levenshtein
+except Exception:
+    Levenshtein = None
+
+from image_ocr import ocr_image_pages, image_ocr_available
+from pdf_extraction import PAGE_SEPARATOR
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".tif", ".tiff")
+
+CLAUSE_WORDS = ["tenant", "landlord", "agreement", "shall", "rent", "deposit", "notice", "term",
+                "liability", "indemnify", "premises", "party", "terminate", "payment", "within",
+                "thirty", "days", "written", "consent", "hereby", "lessee", "lessor", "the", "of"]
+
+
+def edit_distance(a, b):
+    if Levenshtein is not None:
+        return Levenshtein.distance(a, b)
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, start=1):
+        current = [i]
+        for j, cb in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def character_accuracy(ocr_text, truth):
+    """1 - edit distance / reference length, on whitespace-normalized text (floored at 0)"""
+    ocr_text = " ".join(ocr_text.split())
+    truth = " ".join(truth.split())
+    if not truth:
+        return 1.0 if not ocr_text else 0.0
+    return max(0.0, 1 - edit_distance(ocr_text, truth) / len(truth))
+
+
+def page_accuracy(ocr_pages, truth_pages):
+    """Mean accuracy over the reference pages; pages the OCR did not return score 0"""
+    scores = [
+        character_accuracy(ocr_pages[i], truth) if i < len(ocr_pages) else 0.0
+        for i, truth in enumerate(truth_pages)
+    ]
+    return statistics.mean(scores) if scores else 0.0
+
+
+# --- Synthetic scans ---
+
+def load_font(size):
+    for name in ("DejaVuSerif.ttf", "DejaVuSans.ttf", "LiberationSerif-Regular.ttf", "Arial.ttf"):
+        try:
+            return ImageFont.truetype(name, size)
+        except Exception:
+            continue
+    try:
+        return ImageFont.load_default(size=size)  # Pillow >= 10.1
+    except TypeError:
+        return ImageFont.load_default()
+
+
+def legal_page_text(rng, number, lines=28):
+    text = [f"RENTAL AGREEMENT - PAGE {number}", ""]
+    for clause in range(1, lines - 1):
+        words = " ".join(rng.choice(CLAUSE_WORDS) for _ in range(9))
+        text.append(f"{clause}. The {words}.")
+    return "\n".join(text)
+
+
+def render_page(text, dpi=300):
+    """A4 page rendered at dpi, black text on white"""
+    width, height = int(8.27 * dpi), int(11.69 * dpi)
+    page = Image.new("L", (width, height), 255)
+    draw = ImageDraw.Draw(page)
+    font = load_font(int(dpi * 0.15))
+    draw.multiline_text((int(dpi * 0.8), int(dpi * 0.8)), text, fill=0, font=font, spacing=int(dpi * 0.12))
+    return page
+
+
+def phone_photo(page, rng):
+    """Make a clean page look like a phone photo: larger, grey paper, noise, slight blur and tilt"""
+    photo = page.resize((int(page.width * 1.35), int(page.height * 1.35)), Image.BICUBIC)
+    photo = photo.rotate(rng.uniform(-0.6, 0.6), resample=Image.BICUBIC, fillcolor=255)
+    paper = Image.effect_noise(photo.size, 18).point(lambda v: 160 + v // 4)
+    photo = Image.composite(photo, paper, photo.point(lambda v: 255 if v < 128 else 0))
+    photo = photo.filter(ImageFilter.GaussianBlur(0.8))
+    return photo.convert("RGB")
+
+
+def make_synthetic_samples(directory, count, seed=11):
+    rng = random.Random(seed)
+    samples = []
+    for index in range(count):
+        text = legal_page_text(rng, 1)
+        path = os.path.join(directory, f"photo_{index}.jpg")
+        phone_photo(render_page(text), rng).save(path, "JPEG", quality=85, dpi=(72, 72))
+        samples.append((path, [text]))
+
+    texts = [legal_page_text(rng, number) for number in range(1, 4)]
+    frames = [render_page(text, dpi=200) for text in texts]
+    path = os.path.join(directory, "scan_multipage.tiff")
+    frames[0].save(path, save_all=True, append_images=frames[1:], dpi=(200, 200), compression="tiff_deflate")
+    samples.append((path, texts))
+    return samples
+
+
+def load_corpus(directory):
+    samples = []
+    for name in sorted(os.listdir(directory)):
+        stem, extension = os.path.splitext(name)
+        truth_path = os.path.join(directory, stem + ".txt")
+        if extension.lower() in IMAGE_EXTENSIONS and os.path.exists(truth_path):
+            with open(truth_path, "r", encoding="utf-8") as f:
+                samples.append((os.path.join(directory, name), f.read().split(PAGE_SEPARATOR)))
+    return samples
+
+
+# --- Implementations ---
+
+def previous_ocr(path):
+    """What extract_text_from_image did before image_ocr.py: first frame, full resolution, inline"""
+    with Image.open(path) as image:
+        return [pytesseract.image_to_string(image).strip()]
+
+
+def pipeline_ocr(path, parallel):
+    return [page["text"] for page in ocr_image_pages(path, parallel=parallel)]
+
+
+def bench(name, ocr, samples, rounds):
+    per_page = []
+    accuracies = []
+    for path, truth_pages in samples:
+        timings = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            pages = ocr(path)
+            timings.append(time.perf_counter() - start)
+        seconds = statistics.mean(timings) / len(truth_pages)
+        accuracy = page_accuracy(pages, truth_pages)
+        per_page.append(seconds)
+        accuracies.append(accuracy)
+        print(f"  {name:<20} {os.path.basename(path):<24} {len(truth_pages):>3} pages "
+              f"{seconds:7.2f} s/page   accuracy {accuracy * 100:5.1f}%")
+    return statistics.mean(per_page), statistics.mean(accuracies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark OCR of image uploads")
+    parser.add_argument("--corpus", help="Directory of scans with same-named .txt ground truth (synthetic if omitted)")
+    parser.add_argument("--samples", type=int, default=3, help="Synthetic phone-photo pages")
+    parser.add_argument("--rounds", type=int, default=1)
+    parser.add_argument("--keep", help="Write the synthetic scans to this directory instead of a temp dir")
+    args = parser.parse_args()
+
+    if Image is None or not image_ocr_available():
+        print("Pillow, pytesseract and the tesseract binary are required")
+        return 1
+
+    with tempfile.TemporaryDirectory() as scratch:
+        if args.corpus:
+            samples = load_corpus(args.corpus)
+        else:
+            directory = args.keep or scratch
+            os.makedirs(directory, exist_ok=True)
+            samples = make_synthetic_samples(directory, args.samples)
+        if not samples:
+            print("No scans with ground truth found")
+            return 1
+        pages = sum(len(truth) for _, truth in samples)
+        print(f"{len(samples)} samples, {pages} pages, {args.rounds} rounds\n")
+
+        results = {
+            "previous (raw)": bench("previous (raw)", previous_ocr, samples, args.rounds),
+            "pipeline inline": bench("pipeline inline", lambda p: pipeline_ocr(p, False), samples, args.rounds),
+        }
+        # Start the worker processes outside the timed runs
+        pipeline_ocr(samples[0][0], True)
+        results["pipeline pool"] = bench("pipeline pool", lambda p: pipeline_ocr(p, True), samples, args.rounds)
+
+    print(f"\n{'implementation':<20}{'s/page':>10}{'accuracy':>12}")
+    for name, (seconds, accuracy) in results.items():
+        print(f"{name:<20}{seconds:>10.2f}{accuracy * 100:>11.1f}%")
+    baseline = results["previous (raw)"][0]
+    print(f"\npipeline pool: {baseline / results['pipeline pool'][0]:.1f}x the previous pages per second")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
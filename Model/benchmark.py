@@ -0,0 +1,508 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark harness for the Chatbot, DocumentQA and LawSimplify services.
+
+Runs all three FastAPI apps in-process on uvicorn with Gemini replaced by a
+deterministic stub (fixed latency plus a token rate) and web search/scraping
+replaced by local stubs, so it needs no API key and no network. It drives
+concurrent workloads over HTTP and reports throughput, p50/p95/p99 latency and
+peak RSS:
+
+  chat      multi-turn conversations, users in parallel, turns in sequence
+  upload    generated multi-page PDFs uploaded concurrently, then one question each
+  simplify  /simplify/batch calls over whole contracts (with duplicate and invalid clauses)
+
+Usage: python benchmark.py --workload all --llm-latency 0.5 --token-rate 200
+       python benchmark.py --workload upload --uploads 8 --pdf-pages 40 --json results.json
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import types
+import atexit
+import random
+import shutil
+import socket
+import logging
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Offline configuration: no real key, no on-disk state
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+os.environ["CHAT_STORE_BACKEND"] = "memory"
+# Every chat turn should reach the model rather than the response cache
+os.environ["CHAT_RESPONSE_CACHE_ENABLED"] = "false"
+# Embeddings only from a locally cached model, never the model hub
+os.environ["HF_HUB_OFFLINE"] = "1"
+os.environ.pop("LAWSIMPLIFY_CACHE_DIR", None)
+os.environ.pop("DOCQA_EXTRACTION_CACHE_DIR", None)
+# DocumentQA persists documents; keep them in a throwaway directory so runs never
+# dedupe against earlier runs' uploads or fill the real store
+STATE_DIR = tempfile.mkdtemp(prefix="nyai-benchmark-")
+atexit.register(shutil.rmtree, STATE_DIR, True)
+os.environ["DOCQA_STORE_PATH"] = os.path.join(STATE_DIR, "documents.db")
+os.environ["DOCQA_TEXT_DIR"] = os.path.join(STATE_DIR, "document_texts")
+
+import requests
+import uvicorn
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# --- Stub LLM ---
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+        self.usage_metadata = None
+
+
+class FakeGenerativeModel:
+    """Stands in for genai.GenerativeModel: deterministic answers paced by latency and token rate"""
+    latency = 0.5        # seconds before the first token
+    token_rate = 200.0   # tokens per second after that
+    answer_words = 150
+
+    def __init__(self, model_name="", generation_config=None, **kwargs):
+        self.json_mode = "json" in str((generation_config or {}).get("response_mime_type", ""))
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        text = self._json_answer(prompt) if self.json_mode else self._text_answer(prompt)
+        if stream:
+            return self._stream(text)
+        time.sleep(self.latency + (len(text) // 4 + 1) / self.token_rate)
+        return FakeResponse(text)
+
+    def _stream(self, text):
+        time.sleep(self.latency)
+        words = text.split(" ")
+        for i in range(0, len(words), 8):
+            piece = " ".join(words[i:i + 8]) + " "
+            time.sleep((len(piece) // 4 + 1) / self.token_rate)
+            yield FakeResponse(piece)
+
+    def _text_answer(self, prompt):
+        if "title" in prompt:
+            return "Benchmark Conversation Title"
+        if "running summary" in prompt:
+            return "The user asked about Indian contract and tenancy law; NyAI explained the basics."
+        body = " ".join(f"point{i}" for i in range(self.answer_words))
+        return f"Under Indian law, {body}. I am an AI and not a legal professional."
+
+    def _json_answer(self, prompt):
+        data = {
+            "simplified_explanation": "The parties must do what the clause says.",
+            "real_life_example": "A tenant pays rent on the 5th of every month.",
+            "answer": "The document states the lease term is eleven months.",
+            "confidence": "high",
+            "relevant_sections": ["Section 1"],
+            "follow_up_questions": ["What is the notice period?"],
+            "document_type": "agreement",
+            "summary": "A residential lease agreement.",
+            "key_topics": ["rent", "term"],
+            "entities": ["Landlord", "Tenant"],
+            "language_complexity": "moderate",
+        }
+        # /simplify/batch numbers its clauses; answer every id
+        for clause_id in re.findall(r'"id": "(\d+)"', prompt):
+            data[clause_id] = {
+                "simplified_explanation": f"Clause {clause_id} in plain words.",
+                "real_life_example": "A landlord returns the deposit within 30 days."
+            }
+        return json.dumps(data)
+
+
+def install_fake_llm():
+    import llm_client
+    llm_client.genai = types.SimpleNamespace(
+        configure=lambda api_key=None, **kwargs: None,
+        GenerativeModel=FakeGenerativeModel
+    )
+
+
+# --- Stub search / scrape ---
+
+class FakeHTTPResponse:
+    headers = {"content-type": "text/html; charset=utf-8"}
+    encoding = "utf-8"
+    status_code = 200
+
+    def __init__(self, body):
+        self._body = body
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self._body), chunk_size):
+            yield self._body[i:i + chunk_size]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def legal_page(url):
+    nav = "".join(f"<li><a href='/act/{i}'>Act {i}</a></li>" for i in range(200))
+    sections = "".join(
+        f"<h3>Section {i}</h3><p>The party shall indemnify the other party against any liability "
+        f"arising under this agreement, as held by the court in case {i} ({url}).</p>"
+        for i in range(150)
+    )
+    return (
+        f"<html><head><script>var x = 1;</script></head><body><nav><ul>{nav}</ul></nav>"
+        f"<main><article>{sections}</article></main><footer>{nav}</footer></body></html>"
+    ).encode("utf-8")
+
+
+def install_fake_web(lawsimplify, search_latency, scrape_latency):
+    def fake_search(query, num_results=3, lang="en"):
+        time.sleep(search_latency)
+        key = abs(hash(query)) % 10 ** 8
+        return [f"https://legal.example/{key}/{i}" for i in range(num_results)]
+
+    def fake_get(url, timeout=None, stream=False, **kwargs):
+        time.sleep(scrape_latency)
+        return FakeHTTPResponse(legal_page(url))
+
+    lawsimplify.google_search = fake_search
+    lawsimplify.http_session.get = fake_get
+
+
+# --- Test data ---
+
+def make_pdf(pages, seed, lines_per_page=40):
+    """Build a simple multi-page text PDF without any PDF library"""
+    rng = random.Random(seed)
+    words = ["tenant", "landlord", "agreement", "shall", "rent", "deposit", "notice", "term",
+             "liability", "clause", "premises", "party", "terminate", "month", "payment"]
+
+    def escape(text):
+        return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in below
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for page in range(pages):
+        lines = [f"Document {seed} page {page + 1}"] + [
+            " ".join(rng.choice(words) for _ in range(12)) for _ in range(lines_per_page)
+        ]
+        content = "BT /F1 10 Tf 40 760 Td 14 TL " + " ".join(f"({escape(line)}) Tj T*" for line in lines) + " ET"
+        stream = content.encode("latin-1")
+        content_number = len(objects) + 2
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_number} 0 R >>".encode("latin-1")
+        )
+        kids.append(f"{len(objects)} 0 R")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {pages} >>".encode("latin-1")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+CLAUSES = [
+    "The Tenant shall pay the monthly rent on or before the fifth day of each calendar month to the Landlord.",
+    "Either party may terminate this agreement by giving the other party one month's written notice.",
+    "The Lessee hereby agrees to indemnify the Lessor against any liability arising from misuse of the premises.",
+    "This agreement shall be governed by the laws of India and the courts at Ahmedabad shall have jurisdiction.",
+    "The security deposit shall be refunded by the Landlord within thirty days of the end of the term.",
+]
+FIRST_QUESTIONS = ["What is contract law?", "How do I file an FIR?", "What are my rights as a tenant?"]
+
+
+# --- Servers and measurement ---
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(app):
+    # The services configure INFO logging on import; keep the report readable
+    logging.getLogger().setLevel(logging.WARNING)
+    port = free_port()
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", workers=1)
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, f"http://127.0.0.1:{port}"
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100 * len(ordered))))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class Recorder:
+    """Thread-safe latency and error collection for one workload"""
+
+    def __init__(self, name):
+        self.name = name
+        self.latencies = []
+        self.errors = 0
+        self.start = time.perf_counter()
+        self.end = None
+        self._lock = threading.Lock()
+
+    def measure(self, func, *args):
+        t0 = time.perf_counter()
+        try:
+            result = func(*args)
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            print(f"   {self.name} request failed: {e}")
+            return None
+        with self._lock:
+            self.latencies.append(time.perf_counter() - t0)
+        return result
+
+    def finish(self):
+        self.end = time.perf_counter()
+
+    def summary(self):
+        wall = (self.end or time.perf_counter()) - self.start
+        done = len(self.latencies)
+        return {
+            "workload": self.name,
+            "requests": done,
+            "errors": self.errors,
+            "wall_s": round(wall, 3),
+            "throughput_rps": round(done / wall, 2) if wall else 0.0,
+            "p50_ms": round(percentile(self.latencies, 50) * 1000, 1),
+            "p95_ms": round(percentile(self.latencies, 95) * 1000, 1),
+            "p99_ms": round(percentile(self.latencies, 99) * 1000, 1),
+        }
+
+
+def live_worker_peak_rss():
+    """Peak RSS in bytes (VmHWM) of each live extraction/OCR worker process.
+
+    RUSAGE_CHILDREN only covers reaped children, and the shared process pool
+    keeps its workers alive until exit, so they are read from /proc while
+    still running. Empty where /proc is unavailable.
+    """
+    pdf_extraction = sys.modules.get("pdf_extraction")
+    pool = getattr(pdf_extraction, "_process_pool", None)
+    peaks = []
+    for pid in list(getattr(pool, "_processes", None) or {}):
+        try:
+            with open(f"/proc/{pid}/status", encoding="ascii") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        peaks.append(int(line.split()[1]) * 1024)  # Reported in kB
+                        break
+        except (OSError, ValueError):
+            continue
+    return peaks
+
+
+def peak_rss_mb():
+    """Call before the process pool shuts down, so its workers can still be measured"""
+    if resource is None:
+        return None
+    scale = 1 if sys.platform == "darwin" else 1024  # ru_maxrss is bytes on macOS, KiB on Linux
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    reaped = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+    largest_child = max([reaped] + live_worker_peak_rss())
+    return {"self_mb": round(own / 2 ** 20, 1), "largest_child_mb": round(largest_child / 2 ** 20, 1)}
+
+
+# --- Workloads ---
+
+def run_chat(base_url, args):
+    recorder = Recorder("chat")
+
+    def post(payload):
+        response = requests.post(f"{base_url}/chat", json=payload, timeout=300)
+        response.raise_for_status()
+        return response.json()
+
+    def conversation(user):
+        user_id = f"bench_user_{user}"
+        conversation_id = None
+        for turn in range(args.chat_turns):
+            message = FIRST_QUESTIONS[user % len(FIRST_QUESTIONS)] if turn == 0 else \
+                f"Follow-up {turn} from user {user}: what happens if the tenant pays late?"
+            result = recorder.measure(post, {"message": message, "user_id": user_id, "conversation_id": conversation_id})
+            if result is None:
+                return
+            conversation_id = result["conversation_id"]
+
+    with ThreadPoolExecutor(max_workers=args.chat_users) as pool:
+        list(pool.map(conversation, range(args.chat_users)))
+    recorder.finish()
+    return [recorder.summary()]
+
+
+def run_upload(base_url, args):
+    pdfs = [make_pdf(args.pdf_pages, seed) for seed in range(args.uploads)]
+    uploads = Recorder("upload")
+
+    def upload(index):
+        response = requests.post(
+            f"{base_url}/upload/file",
+            files={"file": (f"lease_{index}.pdf", pdfs[index], "application/pdf")},
+            timeout=600
+        )
+        response.raise_for_status()
+        return response.json()["document_id"]
+
+    with ThreadPoolExecutor(max_workers=args.uploads) as pool:
+        document_ids = [d for d in pool.map(lambda i: uploads.measure(upload, i), range(args.uploads)) if d]
+    uploads.finish()
+
+    questions = Recorder("question")
+
+    def ask(document_id):
+        response = requests.post(
+            f"{base_url}/question",
+            json={"document_id": document_id, "question": "What is the notice period for termination?"},
+            timeout=300
+        )
+        response.raise_for_status()
+
+    with ThreadPoolExecutor(max_workers=max(1, len(document_ids))) as pool:
+        list(pool.map(lambda d: questions.measure(ask, d), document_ids))
+    questions.finish()
+    return [uploads.summary(), questions.summary()]
+
+
+def run_simplify(base_url, args):
+    recorder = Recorder("simplify_batch")
+    first_result = Recorder("simplify_batch_first_line")
+
+    def batch(index):
+        clauses = []
+        for i in range(args.clauses):
+            if i % 10 == 9:
+                clauses.append("hello world")  # rejected locally
+            elif i % 7 == 6:
+                clauses.append(clauses[0])     # duplicate
+            else:
+                clauses.append(f"{CLAUSES[i % len(CLAUSES)]} (contract {index}, clause {i})")
+        t0 = time.perf_counter()
+        with requests.post(f"{base_url}/simplify/batch", json={"clauses": clauses}, stream=True, timeout=600) as response:
+            response.raise_for_status()
+            first = True
+            lines = 0
+            for line in response.iter_lines():
+                if line and first:
+                    first_result.latencies.append(time.perf_counter() - t0)
+                    first = False
+                lines += bool(line)
+        if lines != args.clauses + 1:
+            raise RuntimeError(f"expected {args.clauses + 1} lines, got {lines}")
+
+    with ThreadPoolExecutor(max_workers=args.batches) as pool:
+        list(pool.map(lambda i: recorder.measure(batch, i), range(args.batches)))
+    recorder.finish()
+    first_result.finish()
+    return [recorder.summary(), first_result.summary()]
+
+
+def print_report(results, rss):
+    header = f"{'workload':<28}{'reqs':>6}{'errs':>6}{'wall s':>9}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    print("\n" + header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['workload']:<28}{r['requests']:>6}{r['errors']:>6}{r['wall_s']:>9.2f}{r['throughput_rps']:>9.2f}"
+              f"{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}")
+    if rss:
+        print(f"\nPeak RSS: {rss['self_mb']} MB (server + client), largest worker process {rss['largest_child_mb']} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark with stub Gemini, search and scraping")
+    parser.add_argument("--workload", choices=["all", "chat", "upload", "simplify"], default="all")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Stub model latency before the first token (s)")
+    parser.add_argument("--token-rate", type=float, default=200.0, help="Stub model output tokens per second")
+    parser.add_argument("--search-latency", type=float, default=0.2, help="Stub web search latency (s)")
+    parser.add_argument("--scrape-latency", type=float, default=0.3, help="Stub page fetch latency (s)")
+    parser.add_argument("--chat-users", type=int, default=20)
+    parser.add_argument("--chat-turns", type=int, default=4)
+    parser.add_argument("--uploads", type=int, default=4)
+    parser.add_argument("--pdf-pages", type=int, default=30)
+    parser.add_argument("--batches", type=int, default=4)
+    parser.add_argument("--clauses", type=int, default=40)
+    parser.add_argument("--json", help="Also write results to this JSON file")
+    args = parser.parse_args()
+
+    FakeGenerativeModel.latency = args.llm_latency
+    FakeGenerativeModel.token_rate = args.token_rate
+    install_fake_llm()
+
+    workloads = ["chat", "upload", "simplify"] if args.workload == "all" else [args.workload]
+    servers = []
+    results = []
+
+    print("🚀 Offline Benchmark")
+    print("=" * 40)
+    try:
+        if "chat" in workloads:
+            import Chatbot
+            server, base_url = start_server(Chatbot.app)
+            servers.append(server)
+            print(f"💬 chat: {args.chat_users} users x {args.chat_turns} turns")
+            results += run_chat(base_url, args)
+
+        if "upload" in workloads:
+            import DocumentQA
+            server, base_url = start_server(DocumentQA.app)
+            servers.append(server)
+            print(f"📄 upload: {args.uploads} PDFs x {args.pdf_pages} pages")
+            results += run_upload(base_url, args)
+
+        if "simplify" in workloads:
+            import LawSimplify
+            install_fake_web(LawSimplify, args.search_latency, args.scrape_latency)
+            server, base_url = start_server(LawSimplify.app)
+            servers.append(server)
+            print(f"⚖️  simplify: {args.batches} batches x {args.clauses} clauses")
+            results += run_simplify(base_url, args)
+    finally:
+        for server in servers:
+            server.should_exit = True
+
+    rss = peak_rss_mb()
+    print_report(results, rss)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"settings": vars(args), "results": results, "peak_rss": rss}, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+    return 1 if any(r["errors"] for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
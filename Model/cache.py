@@ -0,0 +1,282 @@
+import os
+import sys
+import json
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class LRUCache:
+    """Thread-safe least-recently-used cache bounded by item count."""
+
+    def __init__(self, max_items: int = 256):
+        self.max_items = max(1, max_items)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def items(self):
+        """Snapshot of (key, value) pairs, least recently used first"""
+        with self._lock:
+            return list(self._data.items())
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._data
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+
+def _estimate_size(value: Any) -> int:
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    try:
+        return len(json.dumps(value))
+    except (TypeError, ValueError):
+        return sys.getsizeof(value)
+
+
+# Default spill-file budget, as a multiple of the in-memory item limit
+DISK_ITEMS_FACTOR = 8
+# Seconds between sweeps that delete expired spill files nobody has read back
+SPILL_SWEEP_INTERVAL = 10 * 60
+_SPILL_EXPIRES_AT = re.compile(r'^\{"expires_at": (null|[0-9.eE+-]+)')
+
+
+class TTLCache:
+    """Thread-safe LRU cache with optional expiry, byte budget and on-disk spill.
+
+    Entries expire ``ttl`` seconds after being set (``None`` keeps them until
+    evicted). The cache holds at most ``max_items`` entries and ``max_bytes`` of
+    estimated value size. When ``spill_dir`` is set, entries evicted from memory
+    are written there as JSON and promoted back on the next hit, so values must
+    be JSON-serializable in that mode. With ``write_through`` every entry is
+    also written to ``spill_dir`` as soon as it is set, so the cache survives
+    process restarts. Spill files are bounded too: the oldest are deleted once
+    there are more than ``max_disk_items`` (by default ``DISK_ITEMS_FACTOR``
+    times ``max_items``) or they exceed ``max_disk_bytes``, and expired ones
+    are swept at startup and every ``SPILL_SWEEP_INTERVAL`` seconds.
+    """
+
+    def __init__(self, max_items: int = 1024, max_bytes: Optional[int] = None,
+                 ttl: Optional[float] = None, spill_dir: Optional[str] = None,
+                 write_through: bool = False, max_disk_items: Optional[int] = None,
+                 max_disk_bytes: Optional[int] = None):
+        self.max_items = max(1, max_items)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.spill_dir = spill_dir
+        self.write_through = write_through and bool(spill_dir)
+        self.max_disk_items = max(1, max_disk_items) if max_disk_items is not None \
+            else DISK_ITEMS_FACTOR * self.max_items
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # key -> (expires_at, size, value)
+        self._bytes = 0
+        self._disk = OrderedDict()  # spill path -> (file size, expires_at), oldest first
+        self._disk_bytes = 0
+        self._next_sweep = time.time() + SPILL_SWEEP_INTERVAL
+        self._lock = threading.RLock()
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+            self._scan_spill_dir()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and self._expired(entry[0]):
+                self._remove(key)
+                entry = None
+            if entry is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+
+            value = self._load_spilled(key)
+            if value is not None:
+                self.hits += 1
+                self._insert(key, value[1], value[0])
+                return value[1]
+
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any):
+        expires_at = time.time() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._insert(key, value, expires_at)
+            if self.write_through:
+                self._spill(key, value, expires_at)
+            if self._disk and time.time() >= self._next_sweep:
+                self._sweep_disk()
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            self._remove(key)
+            path = self._spill_path(key)
+            if path:
+                self._unlink_spilled(path)
+            return entry[2] if entry is not None else default
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+            for path in list(self._disk):
+                self._unlink_spilled(path)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                "items": len(self._data),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+            if self.spill_dir:
+                stats.update({"disk_items": len(self._disk), "disk_bytes": self._disk_bytes})
+            return stats
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and not self._expired(entry[0])
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def _expired(self, expires_at: Optional[float]) -> bool:
+        return expires_at is not None and expires_at <= time.time()
+
+    def _insert(self, key: Hashable, value: Any, expires_at: Optional[float]):
+        self._remove(key)
+        size = _estimate_size(value)
+        self._data[key] = (expires_at, size, value)
+        self._bytes += size
+        while len(self._data) > self.max_items or (
+            self.max_bytes is not None and self._bytes > self.max_bytes and len(self._data) > 1
+        ):
+            old_key, (old_expires, _, old_value) = next(iter(self._data.items()))
+            self._remove(old_key)
+            if self.write_through:
+                # Disk mirrors memory, so evicted entries leave both
+                self._unlink_spilled(self._spill_path(old_key))
+            elif not self._expired(old_expires):
+                self._spill(old_key, old_value, old_expires)
+
+    def _remove(self, key: Hashable):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def _spill_path(self, key: Hashable) -> Optional[str]:
+        if not self.spill_dir:
+            return None
+        digest = hashlib.sha256(repr(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.spill_dir, f"{digest}.json")
+
+    def _spill(self, key: Hashable, value: Any, expires_at: Optional[float]):
+        path = self._spill_path(key)
+        if not path:
+            return
+        try:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"expires_at": expires_at, "value": value}, f)
+            os.replace(tmp_path, path)
+            size = os.path.getsize(path)
+        except (OSError, TypeError, ValueError):
+            return
+        self._disk_bytes -= self._disk.pop(path, (0, None))[0]
+        self._disk[path] = (size, expires_at)
+        self._disk_bytes += size
+        self._trim_disk()
+
+    def _load_spilled(self, key: Hashable):
+        path = self._spill_path(key)
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                payload = json.load(f)
+            if not self.write_through or self._expired(payload.get("expires_at")):
+                self._unlink_spilled(path)
+        except (OSError, ValueError):
+            return None
+        if self._expired(payload.get("expires_at")):
+            return None
+        return payload.get("expires_at"), payload.get("value")
+
+    def _unlink_spilled(self, path: str):
+        self._disk_bytes -= self._disk.pop(path, (0, None))[0]
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+    def _trim_disk(self):
+        """Delete the oldest spill files until the disk budget is met"""
+        while self._disk and (
+            len(self._disk) > self.max_disk_items
+            or (self.max_disk_bytes is not None and self._disk_bytes > self.max_disk_bytes)
+        ):
+            self._unlink_spilled(next(iter(self._disk)))
+
+    def _sweep_disk(self):
+        """Delete spill files whose entries have expired"""
+        for path, (_, expires_at) in list(self._disk.items()):
+            if self._expired(expires_at):
+                self._unlink_spilled(path)
+        self._next_sweep = time.time() + SPILL_SWEEP_INTERVAL
+
+    def _scan_spill_dir(self):
+        """Account for spill files left by earlier processes, oldest first, dropping expired ones"""
+        files = []
+        for entry in os.scandir(self.spill_dir):
+            try:
+                if entry.name.endswith(".tmp"):
+                    os.unlink(entry.path)  # Interrupted write
+                elif entry.name.endswith(".json"):
+                    stat = entry.stat()
+                    with open(entry.path, "r", encoding="utf-8") as f:
+                        match = _SPILL_EXPIRES_AT.match(f.read(64))
+                    files.append((stat.st_mtime, entry.path, stat.st_size,
+                                  json.loads(match.group(1)) if match else None))
+            except (OSError, ValueError):
+                continue
+        for _, path, size, expires_at in sorted(files, key=lambda item: item[0]):
+            self._disk[path] = (size, expires_at)
+            self._disk_bytes += size
+        self._sweep_disk()
+        self._trim_disk()
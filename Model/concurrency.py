@@ -0,0 +1,40 @@
+import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Iterable
+
+# Bounded pool for blocking work (Gemini calls, HTTP, search, PDF parsing, OCR)
+# so async endpoints never stall the uvicorn event loop.
+BLOCKING_POOL_SIZE = int(os.getenv("BLOCKING_POOL_SIZE", "32"))
+
+_executor = ThreadPoolExecutor(max_workers=BLOCKING_POOL_SIZE, thread_name_prefix="blocking")
+
+
+async def run_blocking(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a blocking callable on the shared pool and await its result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+
+async def iterate_blocking(iterable: Iterable[Any]) -> AsyncIterator[Any]:
+    """Consume a blocking iterator (e.g. a streamed model response) without blocking the loop
+
+    If the consumer stops early (break, error or cancellation) the iterator is
+    closed on the pool once any in-flight ``next`` has returned.
+    """
+    iterator = await run_blocking(iter, iterable)
+    sentinel = object()
+    pending = None
+    try:
+        while True:
+            pending = _executor.submit(next, iterator, sentinel)
+            item = await asyncio.wrap_future(pending)
+            if item is sentinel:
+                break
+            yield item
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None and pending is not None:
+            # A generator cannot be closed while another thread is running it
+            pending.add_done_callback(lambda _: _executor.submit(close))
@@ -0,0 +1,283 @@
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, Any, Optional
+
+# Backend selection: "sqlite" (default, survives restarts) or "memory"
+CHAT_STORE_BACKEND = os.getenv("CHAT_STORE_BACKEND", "sqlite").lower()
+CHAT_STORE_PATH = os.getenv(
+    "CHAT_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "chat_history.db")
+)
+
+
+class ConversationStore(ABC):
+    """Storage backend for chat conversations.
+
+    Histories are exchanged as plain dicts shaped like ``ConversationHistory``:
+    ``{"active_conversation": str | None, "conversations": {id: {...}}}`` where each
+    conversation has ``title``, ``messages``, ``created_at``, ``updated_at`` and the
+    rolling ``summary`` / ``summarized_count`` of turns folded out of the context window.
+    Granular methods let callers persist a single change without rewriting the
+    whole history.
+    """
+
+    @abstractmethod
+    def load_user(self, user_id: str) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def save_user(self, user_id: str, history: Dict[str, Any]):
+        raise NotImplementedError
+
+    @abstractmethod
+    def create_conversation(self, user_id: str, conversation_id: str, conversation: Dict[str, Any]):
+        raise NotImplementedError
+
+    @abstractmethod
+    def append_message(self, user_id: str, conversation_id: str, message: Dict[str, Any]):
+        raise NotImplementedError
+
+    @abstractmethod
+    def update_conversation(self, user_id: str, conversation_id: str, **fields):
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_conversation(self, user_id: str, conversation_id: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def set_active_conversation(self, user_id: str, conversation_id: Optional[str]):
+        raise NotImplementedError
+
+
+class InMemoryConversationStore(ConversationStore):
+    """Process-local backend, useful for development and tests."""
+
+    def __init__(self):
+        self._users: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.RLock()
+
+    def _user(self, user_id: str) -> Dict[str, Any]:
+        return self._users.setdefault(user_id, {"active_conversation": None, "conversations": {}})
+
+    def load_user(self, user_id: str) -> Dict[str, Any]:
+        with self._lock:
+            user = self._user(user_id)
+            return {
+                "active_conversation": user["active_conversation"],
+                "conversations": {
+                    conv_id: dict(conv, messages=list(conv["messages"]))
+                    for conv_id, conv in user["conversations"].items()
+                }
+            }
+
+    def save_user(self, user_id: str, history: Dict[str, Any]):
+        with self._lock:
+            self._users[user_id] = {
+                "active_conversation": history.get("active_conversation"),
+                "conversations": {
+                    conv_id: dict(conv, messages=list(conv.get("messages", [])))
+                    for conv_id, conv in history.get("conversations", {}).items()
+                }
+            }
+
+    def create_conversation(self, user_id: str, conversation_id: str, conversation: Dict[str, Any]):
+        with self._lock:
+            self._user(user_id)["conversations"][conversation_id] = dict(
+                conversation, messages=list(conversation.get("messages", []))
+            )
+
+    def append_message(self, user_id: str, conversation_id: str, message: Dict[str, Any]):
+        with self._lock:
+            conversation = self._user(user_id)["conversations"][conversation_id]
+            conversation["messages"].append(dict(message))
+            conversation["updated_at"] = message["timestamp"]
+
+    def update_conversation(self, user_id: str, conversation_id: str, **fields):
+        with self._lock:
+            conversation = self._user(user_id)["conversations"].get(conversation_id)
+            if conversation is not None:
+                conversation.update(fields)
+
+    def delete_conversation(self, user_id: str, conversation_id: str):
+        with self._lock:
+            user = self._user(user_id)
+            user["conversations"].pop(conversation_id, None)
+            if user["active_conversation"] == conversation_id:
+                user["active_conversation"] = None
+
+    def set_active_conversation(self, user_id: str, conversation_id: Optional[str]):
+        with self._lock:
+            self._user(user_id)["active_conversation"] = conversation_id
+
+
+class SQLiteConversationStore(ConversationStore):
+    """SQLite backend in WAL mode; each message is its own row."""
+
+    # Conversation columns callers may change through update_conversation
+    UPDATABLE_FIELDS = ("title", "updated_at", "summary", "summarized_count")
+
+    def __init__(self, path: str = CHAT_STORE_PATH):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS users (
+                user_id TEXT PRIMARY KEY,
+                active_conversation TEXT
+            );
+            CREATE TABLE IF NOT EXISTS conversations (
+                user_id TEXT NOT NULL,
+                conversation_id TEXT NOT NULL,
+                title TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                summary TEXT NOT NULL DEFAULT '',
+                summarized_count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, conversation_id)
+            );
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL,
+                conversation_id TEXT NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                timestamp REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_messages_conversation
+                ON messages (user_id, conversation_id, id);
+        """)
+        self._migrate()
+
+    def _migrate(self):
+        """Add columns introduced after the first schema to existing databases"""
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(conversations)")}
+        if "summary" not in columns:
+            self._conn.execute("ALTER TABLE conversations ADD COLUMN summary TEXT NOT NULL DEFAULT ''")
+        if "summarized_count" not in columns:
+            self._conn.execute("ALTER TABLE conversations ADD COLUMN summarized_count INTEGER NOT NULL DEFAULT 0")
+
+    def load_user(self, user_id: str) -> Dict[str, Any]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT active_conversation FROM users WHERE user_id = ?", (user_id,)
+            ).fetchone()
+            conversations = {}
+            for conv_id, title, created_at, updated_at, summary, summarized_count in self._conn.execute(
+                "SELECT conversation_id, title, created_at, updated_at, summary, summarized_count "
+                "FROM conversations WHERE user_id = ?",
+                (user_id,)
+            ):
+                conversations[conv_id] = {
+                    "title": title,
+                    "messages": [],
+                    "created_at": created_at,
+                    "updated_at": updated_at,
+                    "summary": summary,
+                    "summarized_count": summarized_count
+                }
+            for conv_id, role, content, timestamp in self._conn.execute(
+                "SELECT conversation_id, role, content, timestamp FROM messages WHERE user_id = ? ORDER BY id",
+                (user_id,)
+            ):
+                if conv_id in conversations:
+                    conversations[conv_id]["messages"].append(
+                        {"role": role, "content": content, "timestamp": timestamp}
+                    )
+            return {
+                "active_conversation": row[0] if row else None,
+                "conversations": conversations
+            }
+
+    def save_user(self, user_id: str, history: Dict[str, Any]):
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.execute("DELETE FROM messages WHERE user_id = ?", (user_id,))
+            self._conn.execute("DELETE FROM conversations WHERE user_id = ?", (user_id,))
+            for conv_id, conversation in history.get("conversations", {}).items():
+                self._insert_conversation(user_id, conv_id, conversation)
+            self._upsert_active(user_id, history.get("active_conversation"))
+
+    def create_conversation(self, user_id: str, conversation_id: str, conversation: Dict[str, Any]):
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._insert_conversation(user_id, conversation_id, conversation)
+
+    def append_message(self, user_id: str, conversation_id: str, message: Dict[str, Any]):
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                "INSERT INTO messages (user_id, conversation_id, role, content, timestamp) VALUES (?, ?, ?, ?, ?)",
+                (user_id, conversation_id, message["role"], message["content"], message["timestamp"])
+            )
+            self._conn.execute(
+                "UPDATE conversations SET updated_at = ? WHERE user_id = ? AND conversation_id = ?",
+                (message["timestamp"], user_id, conversation_id)
+            )
+
+    def update_conversation(self, user_id: str, conversation_id: str, **fields):
+        columns = [name for name in self.UPDATABLE_FIELDS if name in fields]
+        if not columns:
+            return
+        assignments = ", ".join(f"{name} = ?" for name in columns)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE conversations SET {assignments} WHERE user_id = ? AND conversation_id = ?",
+                [fields[name] for name in columns] + [user_id, conversation_id]
+            )
+
+    def delete_conversation(self, user_id: str, conversation_id: str):
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                "DELETE FROM messages WHERE user_id = ? AND conversation_id = ?", (user_id, conversation_id)
+            )
+            self._conn.execute(
+                "DELETE FROM conversations WHERE user_id = ? AND conversation_id = ?", (user_id, conversation_id)
+            )
+            self._conn.execute(
+                "UPDATE users SET active_conversation = NULL WHERE user_id = ? AND active_conversation = ?",
+                (user_id, conversation_id)
+            )
+
+    def set_active_conversation(self, user_id: str, conversation_id: Optional[str]):
+        with self._lock:
+            self._upsert_active(user_id, conversation_id)
+
+    def _insert_conversation(self, user_id: str, conversation_id: str, conversation: Dict[str, Any]):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO conversations "
+            "(user_id, conversation_id, title, created_at, updated_at, summary, summarized_count) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                user_id, conversation_id, conversation["title"], conversation["created_at"],
+                conversation["updated_at"], conversation.get("summary", ""), conversation.get("summarized_count", 0)
+            )
+        )
+        self._conn.executemany(
+            "INSERT INTO messages (user_id, conversation_id, role, content, timestamp) VALUES (?, ?, ?, ?, ?)",
+            [
+                (user_id, conversation_id, m["role"], m["content"], m["timestamp"])
+                for m in conversation.get("messages", [])
+            ]
+        )
+
+    def _upsert_active(self, user_id: str, conversation_id: Optional[str]):
+        self._conn.execute(
+            "INSERT INTO users (user_id, active_conversation) VALUES (?, ?) "
+            "ON CONFLICT(user_id) DO UPDATE SET active_conversation = excluded.active_conversation",
+            (user_id, conversation_id)
+        )
+
+
+def create_conversation_store(backend: str = CHAT_STORE_BACKEND) -> ConversationStore:
+    """Build the configured conversation store backend"""
+    if backend == "memory":
+        return InMemoryConversationStore()
+    if backend == "sqlite":
+        return SQLiteConversationStore()
+    raise ValueError(f"Unknown CHAT_STORE_BACKEND: {backend}")
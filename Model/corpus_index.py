@@ -0,0 +1,337 @@
+import os
+import re
+import html
+import math
+import heapq
+import logging
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+
+from document_index import DocumentIndex, np, faiss, embed_texts, term_counts, MAX_CONTEXT_CHARS
+
+logger = logging.getLogger(__name__)
+
+# Selections up to this many chunks are searched exactly; larger ones go through the HNSW graph
+CORPUS_EXACT_SEARCH_ROWS = int(os.getenv("DOCQA_CORPUS_EXACT_SEARCH_ROWS", "4096"))
+CORPUS_HNSW_NEIGHBORS = int(os.getenv("DOCQA_CORPUS_HNSW_NEIGHBORS", "32"))
+# Candidates fetched per requested result before fusion, filtering and per-document capping
+CORPUS_OVERFETCH = 4
+BM25_K1 = 1.5
+BM25_B = 0.75
+# Reciprocal rank fusion constant; larger values flatten the advantage of top ranks
+RRF_K = 60
+# Rough per-chunk and per-posting memory overhead of the Python structures, for memory_bytes
+_CHUNK_OVERHEAD_BYTES = 400
+_POSTING_BYTES = 100
+SNIPPET_CHARS = int(os.getenv("DOCQA_SNIPPET_CHARS", "300"))
+
+
+class CorpusIndex:
+    """Shared retrieval index over all loaded documents of one user.
+
+    Chunks and embeddings are taken from each document's DocumentIndex, so
+    adding a document never re-embeds it. Keyword search is BM25 over an
+    inverted index and vector search goes through a FAISS HNSW graph once
+    the corpus outgrows exact search, so neither scans the whole corpus; in
+    hybrid mode the two rankings are merged by reciprocal rank fusion.
+    Searches are restricted to a set of documents: small selections are
+    scored exactly over their own rows, large ones through the graph with
+    over-fetching. Removed documents are tombstoned; the graph is rebuilt
+    once they make up half of it, and rows are compacted (renumbering chunks
+    and postings, and dropping the graph) once they make up half of all rows.
+    """
+
+    def __init__(self):
+        self.chunks: List[Optional[Dict[str, Any]]] = []  # row -> chunk, None once removed
+        self._doc_rows: Dict[str, List[int]] = {}
+        self._doc_vectors: Dict[str, Any] = {}
+        self._postings: Dict[str, Dict[int, int]] = {}  # term -> row -> term frequency
+        self._row_lengths: Dict[int, int] = {}  # live row -> length in terms
+        self._total_length = 0
+        self._graph = None
+        self._graph_rows: List[int] = []  # graph id -> row
+        self._removed_rows = 0  # tombstoned rows still in the graph
+        self._tombstones = 0  # None entries in chunks
+        self._doc_bytes: Dict[str, int] = {}
+        self.memory_bytes = 0  # estimate, used to bound the memory of all corpora
+        self._lock = threading.RLock()
+
+    def __contains__(self, document_id: str) -> bool:
+        with self._lock:
+            return document_id in self._doc_rows
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._doc_rows)
+
+    def add_document(self, document_id: str, doc_index: DocumentIndex):
+        """Add a document's chunks and vectors; a document already present is left as is"""
+        chunks, vectors = doc_index.snapshot()
+        with self._lock:
+            if document_id in self._doc_rows:
+                return
+            rows = []
+            size = 0
+            for chunk in chunks:
+                row = len(self.chunks)
+                self.chunks.append(dict(chunk, document_id=document_id))
+                rows.append(row)
+                terms = term_counts(chunk["text"])
+                for term, count in terms.items():
+                    self._postings.setdefault(term, {})[row] = count
+                self._row_lengths[row] = sum(terms.values())
+                self._total_length += self._row_lengths[row]
+                size += len(chunk["text"]) + _CHUNK_OVERHEAD_BYTES + len(terms) * _POSTING_BYTES
+            self._doc_rows[document_id] = rows
+            if vectors is not None and len(vectors) == len(rows):
+                self._doc_vectors[document_id] = vectors
+                # Vectors are held per document and again in the graph
+                size += vectors.nbytes * (2 if faiss is not None else 1)
+                if self._graph is not None and vectors.shape[1] == self._graph.d:
+                    self._graph.add(vectors)
+                    self._graph_rows.extend(rows)
+            self._doc_bytes[document_id] = size
+            self.memory_bytes += size
+
+    def remove_document(self, document_id: str):
+        with self._lock:
+            rows = self._doc_rows.pop(document_id, None)
+            if rows is None:
+                return
+            self._doc_vectors.pop(document_id, None)
+            self.memory_bytes -= self._doc_bytes.pop(document_id, 0)
+            for row in rows:
+                for term in term_counts(self.chunks[row]["text"]):
+                    postings = self._postings.get(term)
+                    if postings is not None:
+                        postings.pop(row, None)
+                        if not postings:
+                            del self._postings[term]
+                self._total_length -= self._row_lengths.pop(row, 0)
+                self.chunks[row] = None
+            self._removed_rows += len(rows)
+            self._tombstones += len(rows)
+            if self._tombstones * 2 > len(self.chunks):
+                self._compact()
+            elif self._graph is not None and self._removed_rows * 2 > len(self._graph_rows):
+                self._graph = None
+
+    def _compact(self):
+        """Renumber live rows densely, dropping tombstones from chunks and postings (caller holds the lock)"""
+        new_rows = {}
+        chunks = []
+        for row, chunk in enumerate(self.chunks):
+            if chunk is not None:
+                new_rows[row] = len(chunks)
+                chunks.append(chunk)
+        self.chunks = chunks
+        self._doc_rows = {d: [new_rows[row] for row in rows] for d, rows in self._doc_rows.items()}
+        self._postings = {
+            term: {new_rows[row]: count for row, count in postings.items()}
+            for term, postings in self._postings.items()
+        }
+        self._row_lengths = {new_rows[row]: length for row, length in self._row_lengths.items()}
+        self._tombstones = 0
+        # Graph ids map to the old rows; the graph is rebuilt on the next large vector search
+        self._graph = None
+        self._graph_rows = []
+        self._removed_rows = 0
+
+    def search(self, query: str, k: int, document_ids: Iterable[str],
+               per_document: Optional[int] = None, mode: str = "hybrid") -> List[Dict[str, Any]]:
+        """Up to k chunks from document_ids most relevant to the query, best first.
+
+        mode is "hybrid", "keyword" or "vector"; vector ranking falls back to
+        keyword when embeddings are unavailable. Each result carries the fused
+        score plus keyword_score/vector_score (None if not ranked that way).
+        per_document caps how many chunks one document contributes while
+        others still have candidates, so comparisons see every side.
+        """
+        document_ids = list(dict.fromkeys(document_ids))
+        with self._lock:
+            selected = [d for d in document_ids if d in self._doc_rows]
+            if not selected:
+                return []
+            use_vectors = all(d in self._doc_vectors for d in selected)
+        # Embed outside the lock; rows are only ranked and read under one hold of it,
+        # so a compaction cannot renumber them in between
+        query_vector = embed_texts([query]) if mode in ("hybrid", "vector") and use_vectors else None
+        fetch = k * CORPUS_OVERFETCH
+
+        with self._lock:
+            selected = [d for d in document_ids if d in self._doc_rows]
+            if not selected:
+                return []
+            rankings = {}
+            if mode in ("hybrid", "keyword"):
+                rankings["keyword_score"] = self._keyword_search(query, fetch, set(selected))
+            if query_vector is not None and all(d in self._doc_vectors for d in selected):
+                rankings["vector_score"] = self._vector_search(query_vector[0], fetch, selected)
+            if not rankings:
+                rankings["keyword_score"] = self._keyword_search(query, fetch, set(selected))
+
+            fused = fuse_rankings(rankings)
+            results = []
+            for row, score, scores in fused:
+                if self.chunks[row] is None:
+                    continue
+                result = dict(self.chunks[row], score=round(score, 4), keyword_score=None, vector_score=None)
+                result.update({name: round(s, 4) for name, s in scores.items() if s is not None})
+                results.append(result)
+        return cap_per_document(results, k, per_document) if per_document else results[:k]
+
+    def _vector_search(self, query_vector, k: int, selected: List[str]) -> List:
+        with self._lock:
+            selected_rows = sum(len(self._doc_rows[d]) for d in selected)
+            if faiss is None or selected_rows <= CORPUS_EXACT_SEARCH_ROWS:
+                rows = [row for d in selected for row in self._doc_rows[d]]
+                similarities = np.vstack([self._doc_vectors[d] for d in selected]) @ query_vector
+                top = np.argsort(-similarities)[:k]
+                return [(rows[i], float(similarities[i])) for i in top]
+
+            graph = self._ensure_graph()
+            allowed = set(selected)
+            fetch = k * CORPUS_OVERFETCH
+            while True:
+                graph.hnsw.efSearch = max(64, fetch)
+                scores, ids = graph.search(query_vector.reshape(1, -1), min(fetch, graph.ntotal))
+                ranked = []
+                for graph_id, score in zip(ids[0], scores[0]):
+                    if graph_id == -1:
+                        continue
+                    row = self._graph_rows[graph_id]
+                    chunk = self.chunks[row]
+                    if chunk is not None and chunk["document_id"] in allowed:
+                        ranked.append((row, float(score)))
+                if len(ranked) >= k or fetch >= graph.ntotal:
+                    return ranked[:k]
+                fetch *= CORPUS_OVERFETCH
+
+    def _ensure_graph(self):
+        """Build the HNSW graph over all live vectors (caller holds the lock)"""
+        if self._graph is None:
+            document_ids = list(self._doc_vectors)
+            dim = self._doc_vectors[document_ids[0]].shape[1]
+            graph = faiss.IndexHNSWFlat(dim, CORPUS_HNSW_NEIGHBORS, faiss.METRIC_INNER_PRODUCT)
+            graph_rows = []
+            for document_id in document_ids:
+                vectors = self._doc_vectors[document_id]
+                if vectors.shape[1] == dim:
+                    graph.add(vectors)
+                    graph_rows.extend(self._doc_rows[document_id])
+            self._graph = graph
+            self._graph_rows = graph_rows
+            self._removed_rows = 0
+            logger.info(f"Corpus graph built over {len(graph_rows)} chunks from {len(document_ids)} documents")
+        return self._graph
+
+    def _keyword_search(self, query: str, k: int, allowed: set) -> List:
+        """BM25 over the postings of the query terms only"""
+        scores = Counter()
+        with self._lock:
+            live_rows = len(self._row_lengths)
+            if not live_rows:
+                return []
+            average_length = self._total_length / live_rows or 1.0
+            for term in term_counts(query):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (live_rows - len(postings) + 0.5) / (len(postings) + 0.5))
+                for row, frequency in postings.items():
+                    if self.chunks[row]["document_id"] not in allowed:
+                        continue
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self._row_lengths[row] / average_length)
+                    scores[row] += idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: (item[1], -item[0]))
+
+
+def fuse_rankings(rankings: Dict[str, List]) -> List:
+    """Merge named best-first [(row, score)] lists into [(row, score, {name: score})].
+
+    A single ranking keeps its own scores; several are combined by reciprocal
+    rank fusion, which needs no calibration between BM25 and cosine scales.
+    """
+    per_row: Dict[int, Dict[str, Optional[float]]] = {}
+    fused = Counter()
+    for name, ranked in rankings.items():
+        for rank, (row, score) in enumerate(ranked):
+            per_row.setdefault(row, dict.fromkeys(rankings))[name] = score
+            fused[row] += score if len(rankings) == 1 else 1.0 / (RRF_K + rank + 1)
+    return [(row, score, per_row[row]) for row, score in
+            sorted(fused.items(), key=lambda item: (-item[1], item[0]))]
+
+
+def highlight_passage(chunk: Dict[str, Any], query: str, max_chars: int = SNIPPET_CHARS) -> Dict[str, Any]:
+    """Snippet of a chunk around its query-term matches, with offsets and HTML-escaped <mark> highlights.
+
+    start/end and matches are document character offsets; page_start/page_end
+    are the snippet's offsets within its page.
+    """
+    text = chunk["text"]
+    terms = sorted(term_counts(query), key=len, reverse=True)
+    matches = []
+    if terms:
+        pattern = re.compile(r"\b(?:" + "|".join(re.escape(term) for term in terms) + r")\b", re.IGNORECASE)
+        matches = [(m.start(), m.end()) for m in pattern.finditer(text)]
+
+    # Window starting shortly before the first match
+    begin = max(0, matches[0][0] - max_chars // 4) if matches else 0
+    if begin:
+        space = text.find(" ", begin)
+        begin = space + 1 if 0 <= space < matches[0][0] else begin
+    end = min(len(text), begin + max_chars)
+    if end < len(text):
+        space = text.rfind(" ", begin, end)
+        end = space if space > begin else end
+
+    parts = []
+    cursor = begin
+    in_window = [(s, e) for s, e in matches if s >= begin and e <= end]
+    for s, e in in_window:
+        parts.append(html.escape(text[cursor:s]) + "<mark>" + html.escape(text[s:e]) + "</mark>")
+        cursor = e
+    parts.append(html.escape(text[cursor:end]))
+
+    offset = chunk["start"]
+    page_offset = chunk.get("page_offset", 0)
+    return {
+        "snippet": text[begin:end],
+        "highlighted": ("…" if begin else "") + "".join(parts) + ("…" if end < len(text) else ""),
+        "start": offset + begin,
+        "end": offset + end,
+        "page": chunk.get("page", 1),
+        "page_start": offset + begin - page_offset,
+        "page_end": offset + end - page_offset,
+        "matches": [[offset + s, offset + e] for s, e in in_window]
+    }
+
+
+def cap_per_document(results: List[Dict[str, Any]], k: int, per_document: int) -> List[Dict[str, Any]]:
+    """Best-first selection of k results with at most per_document from one document, topped up if short"""
+    chosen = []
+    taken = Counter()
+    for result in results:
+        if taken[result["document_id"]] < per_document:
+            chosen.append(result)
+            taken[result["document_id"]] += 1
+            if len(chosen) == k:
+                return chosen
+    leftovers = [result for result in results if result not in chosen]
+    return (chosen + leftovers)[:k]
+
+
+def build_corpus_context(chunks: List[Dict[str, Any]], filenames: Dict[str, str],
+                         max_chars: int = MAX_CONTEXT_CHARS) -> str:
+    """Render retrieved chunks as numbered sources (document name and page), capped at max_chars"""
+    parts = []
+    remaining = max_chars
+    for source, chunk in enumerate(chunks, start=1):
+        if remaining <= 0:
+            break
+        body = chunk["text"][:remaining]
+        name = filenames.get(chunk["document_id"], chunk["document_id"])
+        parts.append(f"[Source {source}: {name}, page {chunk.get('page', 1)}]\n{body}")
+        remaining -= len(body)
+    return "\n\n".join(parts)
@@ -0,0 +1,253 @@
+import os
+import re
+import logging
+import threading
+from collections import Counter
+from typing import Dict, Any, List, Tuple
+
+# Optional retrieval libs (same stack as Notebook/Project_Documentqa.ipynb)
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+try:
+    import faiss
+except Exception:
+    faiss = None
+
+try:
+    from sentence_transformers import SentenceTransformer
+except Exception:
+    SentenceTransformer = None
+
+from pdf_extraction import page_spans
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL_NAME = os.getenv("DOCQA_EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+CHUNK_SIZE = int(os.getenv("DOCQA_CHUNK_SIZE", "1200"))        # characters per chunk
+CHUNK_OVERLAP = int(os.getenv("DOCQA_CHUNK_OVERLAP", "200"))   # characters shared by neighbours
+TOP_K = int(os.getenv("DOCQA_TOP_K", "4"))
+# Hard ceiling on document text sent to the model, whatever the document size
+MAX_CONTEXT_CHARS = int(os.getenv("DOCQA_MAX_CONTEXT_CHARS", str(TOP_K * CHUNK_SIZE)))
+
+_WORD_RE = re.compile(r"\w+")
+
+_embedding_model = None
+_embedding_load_failed = False
+_embedding_lock = threading.Lock()
+
+
+def get_embedding_model():
+    """Load the sentence-transformers model once, on first use; a failed load is not retried"""
+    global _embedding_model, _embedding_load_failed
+    if SentenceTransformer is None or np is None or _embedding_load_failed:
+        return None
+    if _embedding_model is None:
+        with _embedding_lock:
+            if _embedding_model is None and not _embedding_load_failed:
+                try:
+                    _embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+                    logger.info(f"Embedding model loaded: {EMBEDDING_MODEL_NAME}")
+                except Exception as e:
+                    # Retrying would repeat model-hub network calls on every chunk batch and search
+                    _embedding_load_failed = True
+                    logger.error(f"Embedding model load failed, using keyword retrieval: {str(e)}")
+    return _embedding_model
+
+
+def embed_texts(texts: List[str]):
+    """Embed texts as normalized float32 vectors, or None if embeddings are unavailable"""
+    model = get_embedding_model()
+    if model is None or not texts:
+        return None
+    vectors = model.encode(texts, convert_to_numpy=True, normalize_embeddings=True, show_progress_bar=False)
+    return np.asarray(vectors, dtype="float32")
+
+
+def chunk_text(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[Dict[str, Any]]:
+    """Split text into overlapping chunks, preferring to break on paragraph or word boundaries"""
+    text = text or ""
+    overlap = max(0, min(overlap, chunk_size // 2))
+    chunks = []
+    start = 0
+    length = len(text)
+
+    while start < length:
+        end = min(start + chunk_size, length)
+        if end < length:
+            # Back off to a natural boundary in the last fifth of the window
+            floor = start + int(chunk_size * 0.8)
+            boundary = text.rfind("\n", floor, end)
+            if boundary == -1:
+                boundary = text.rfind(" ", floor, end)
+            if boundary != -1:
+                end = boundary
+
+        raw = text[start:end]
+        piece = raw.strip()
+        if piece:
+            # Offsets of the stripped text, so they can be used to highlight it in place
+            lead = len(raw) - len(raw.lstrip())
+            chunks.append({
+                "chunk_id": len(chunks),
+                "start": start + lead,
+                "end": start + lead + len(piece),
+                "text": piece
+            })
+
+        if end >= length:
+            break
+        start = max(end - overlap, start + 1)
+
+    return chunks
+
+
+def term_counts(text: str) -> Counter:
+    """Lowercased word counts used for keyword retrieval"""
+    return Counter(word.lower() for word in _WORD_RE.findall(text))
+
+
+class DocumentIndex:
+    """Chunk-level retrieval index for one document.
+
+    Uses FAISS inner-product search over normalized embeddings when the
+    embedding stack is installed, and falls back to term-overlap scoring
+    otherwise so /question keeps working with a bounded prompt. Pages can be
+    added incrementally, so a document is searchable while it is still being
+    ingested. Chunks never span pages and carry their page number and
+    document-level character offsets.
+    """
+
+    def __init__(self):
+        self.chunks: List[Dict[str, Any]] = []
+        self._embeddings = None
+        self._faiss_index = None
+        self._use_vectors = True
+        self._chunk_terms: List[Counter] = []
+        self._lock = threading.RLock()
+
+    @classmethod
+    def build(cls, text: str) -> "DocumentIndex":
+        index = cls()
+        index.add_pages([
+            (text[span["start"]:span["end"]], span["start"], span["page"])
+            for span in page_spans(text)
+        ])
+        return index
+
+    @classmethod
+    def restore(cls, chunks: List[Dict[str, Any]], embeddings=None) -> "DocumentIndex":
+        """Index from a previous snapshot's chunks and embeddings, without re-embedding"""
+        index = cls()
+        index.chunks = list(chunks)
+        if embeddings is not None and len(embeddings) == len(index.chunks) and len(index.chunks):
+            index._embeddings = embeddings
+            if faiss is not None:
+                index._faiss_index = faiss.IndexFlatIP(embeddings.shape[1])
+                index._faiss_index.add(embeddings)
+        elif index.chunks:
+            index._use_vectors = False
+        return index
+
+    @property
+    def mode(self) -> str:
+        return "vector" if self._embeddings is not None else "keyword"
+
+    def snapshot(self) -> Tuple[List[Dict[str, Any]], Any]:
+        """Consistent (chunks, embeddings) pair; embeddings has one row per chunk, or is None in keyword mode"""
+        with self._lock:
+            return list(self.chunks), self._embeddings
+
+    def add_pages(self, pages: List[Tuple[str, int, int]]):
+        """Chunk and index (page_text, offset, page_number) tuples, embedding new chunks in one batch"""
+        new_chunks = []
+        for page_text, offset, page in pages:
+            for chunk in chunk_text(page_text):
+                new_chunks.append(dict(
+                    chunk,
+                    start=chunk["start"] + offset,
+                    end=chunk["end"] + offset,
+                    page=page,
+                    page_offset=offset
+                ))
+        if not new_chunks:
+            return
+
+        vectors = None
+        if self._use_vectors:
+            try:
+                vectors = embed_texts([chunk["text"] for chunk in new_chunks])
+            except Exception as e:
+                logger.error(f"Chunk embedding failed, using keyword retrieval: {str(e)}")
+
+        with self._lock:
+            for chunk in new_chunks:
+                chunk["chunk_id"] = len(self.chunks)
+                self.chunks.append(chunk)
+
+            if vectors is None:
+                # Mixing embedded and unembedded chunks would hide part of the document
+                self._use_vectors = False
+                self._embeddings = None
+                self._faiss_index = None
+                return
+
+            if self._embeddings is None:
+                self._embeddings = vectors
+                if faiss is not None:
+                    self._faiss_index = faiss.IndexFlatIP(vectors.shape[1])
+            else:
+                self._embeddings = np.vstack([self._embeddings, vectors])
+            if self._faiss_index is not None:
+                self._faiss_index.add(vectors)
+
+    def search(self, query: str, k: int = TOP_K) -> List[Dict[str, Any]]:
+        """Return up to k chunks most relevant to the query, best first"""
+        with self._lock:
+            if not self.chunks:
+                return []
+            k = max(1, min(k, len(self.chunks)))
+            embeddings = self._embeddings
+            faiss_index = self._faiss_index
+
+        if embeddings is not None:
+            query_vector = embed_texts([query])
+            if query_vector is not None:
+                with self._lock:
+                    if faiss_index is not None:
+                        scores, ids = faiss_index.search(query_vector, k)
+                        ranked = [(int(i), float(s)) for i, s in zip(ids[0], scores[0]) if i != -1]
+                    else:
+                        similarities = embeddings @ query_vector[0]
+                        order = np.argsort(-similarities)[:k]
+                        ranked = [(int(i), float(similarities[i])) for i in order]
+                    return [dict(self.chunks[i], score=round(score, 4)) for i, score in ranked]
+
+        return self._keyword_search(query, k)
+
+    def _keyword_search(self, query: str, k: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            for chunk in self.chunks[len(self._chunk_terms):]:
+                self._chunk_terms.append(term_counts(chunk["text"]))
+            query_terms = term_counts(query)
+            scored = []
+            for i, terms in enumerate(self._chunk_terms):
+                score = sum(min(count, terms.get(term, 0)) for term, count in query_terms.items())
+                scored.append((score, -i))
+            scored.sort(reverse=True)
+            return [dict(self.chunks[-neg_i], score=float(score)) for score, neg_i in scored[:k]]
+
+
+def build_context(chunks: List[Dict[str, Any]], max_chars: int = MAX_CONTEXT_CHARS) -> str:
+    """Render retrieved chunks for the prompt, labelled by chunk id and capped at max_chars"""
+    parts = []
+    remaining = max_chars
+    for chunk in chunks:
+        if remaining <= 0:
+            break
+        body = chunk["text"][:remaining]
+        parts.append(f"[Chunk {chunk['chunk_id']}, page {chunk.get('page', 1)}]\n{body}")
+        remaining -= len(body)
+    return "\n\n".join(parts)
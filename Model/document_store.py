@@ -0,0 +1,341 @@
+import os
+import json
+import mmap
+import time
+import zlib
+import hashlib
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from cache import LRUCache
+from document_index import DocumentIndex, np, get_embedding_model, EMBEDDING_MODEL_NAME
+
+_MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+DOCQA_STORE_PATH = os.getenv("DOCQA_STORE_PATH", os.path.join(_MODEL_DIR, "documents.db"))
+DOCQA_TEXT_DIR = os.getenv("DOCQA_TEXT_DIR", os.path.join(_MODEL_DIR, "document_texts"))
+# Documents not accessed for this many seconds are evicted (0 disables expiry)
+DOCQA_DOCUMENT_TTL = float(os.getenv("DOCQA_DOCUMENT_TTL", str(7 * 24 * 60 * 60)))
+# Least recently used documents beyond this count are evicted
+DOCQA_MAX_DOCUMENTS = int(os.getenv("DOCQA_MAX_DOCUMENTS", "1000"))
+# Documents kept in memory with their retrieval index
+DOCQA_HOT_DOCUMENTS = int(os.getenv("DOCQA_HOT_DOCUMENTS", "32"))
+# Access times are batched in memory and written at most this often (and before eviction)
+DOCQA_ACCESS_FLUSH_SECONDS = float(os.getenv("DOCQA_ACCESS_FLUSH_SECONDS", "60"))
+
+# Row columns; everything else in a document dict (analysis, pages) lives in the metadata JSON
+_COLUMNS = (
+    "user_id", "filename", "content_type", "content_hash", "uploaded_at", "status", "word_count",
+    "char_count", "chunk_count", "pages_total", "pages_processed", "document_type", "error"
+)
+_COUNT_COLUMNS = ("word_count", "char_count", "chunk_count", "pages_processed")
+# Keys never persisted: in-memory objects and the text body (stored compressed on disk)
+_TRANSIENT_KEYS = ("index", "text_content")
+
+
+class DocumentStore:
+    """Persistent, memory-bounded store for uploaded documents.
+
+    Metadata lives in SQLite (WAL mode) with indexes for hash lookups,
+    listing and eviction; extracted text is zlib-compressed on disk and
+    memory-mapped when read. Only the most recently used documents stay in
+    memory, together with their retrieval index, whose chunks and embeddings
+    are stored next to the text so it is restored without re-embedding. Documents still being ingested are pinned in
+    memory until they are stored again as ready or failed. Documents expire
+    after ``ttl`` seconds without access and the least recently used are
+    evicted beyond ``max_documents``. Reads never write: access times are
+    batched and flushed periodically and before eviction. Locks are per
+    document; the shared SQLite connection is only held for single statements.
+    """
+
+    def __init__(self, path: str = DOCQA_STORE_PATH, text_dir: str = DOCQA_TEXT_DIR,
+                 ttl: float = DOCQA_DOCUMENT_TTL, max_documents: int = DOCQA_MAX_DOCUMENTS,
+                 hot_documents: int = DOCQA_HOT_DOCUMENTS):
+        self.path = path
+        self.text_dir = text_dir
+        self.ttl = ttl
+        self.max_documents = max(1, max_documents)
+        os.makedirs(text_dir, exist_ok=True)
+
+        self._hot = LRUCache(max_items=hot_documents)
+        self._pinned: Dict[str, Dict[str, Any]] = {}
+        self._doc_locks: Dict[str, threading.RLock] = {}
+        self._locks_guard = threading.Lock()
+        self._db_lock = threading.RLock()
+        self._accessed: Dict[str, float] = {}  # document_id -> last access not yet written
+        self._accessed_lock = threading.Lock()
+        self._accessed_flushed_at = time.time()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS documents (
+                document_id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL DEFAULT 'anonymous',
+                filename TEXT NOT NULL,
+                content_type TEXT NOT NULL,
+                content_hash TEXT,
+                uploaded_at TEXT NOT NULL,
+                last_accessed REAL NOT NULL,
+                status TEXT NOT NULL,
+                word_count INTEGER NOT NULL DEFAULT 0,
+                char_count INTEGER NOT NULL DEFAULT 0,
+                chunk_count INTEGER NOT NULL DEFAULT 0,
+                pages_total INTEGER,
+                pages_processed INTEGER NOT NULL DEFAULT 0,
+                document_type TEXT,
+                error TEXT,
+                metadata TEXT NOT NULL DEFAULT '{}'
+            );
+            CREATE INDEX IF NOT EXISTS idx_documents_hash ON documents (content_hash);
+            CREATE INDEX IF NOT EXISTS idx_documents_uploaded ON documents (uploaded_at);
+            CREATE INDEX IF NOT EXISTS idx_documents_accessed ON documents (last_accessed);
+        """)
+        self._migrate()
+
+    def _migrate(self):
+        """Add columns introduced after the first schema to existing databases"""
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(documents)")}
+        if "user_id" not in columns:
+            self._conn.execute("ALTER TABLE documents ADD COLUMN user_id TEXT NOT NULL DEFAULT 'anonymous'")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_user ON documents (user_id, uploaded_at)")
+
+    def fail_interrupted(self):
+        """Mark documents left processing by a previous run as failed (ingestion does not survive a restart).
+
+        Call once from the serving process at startup, never from the constructor:
+        spawned worker processes re-import the app module and build their own store.
+        """
+        self._execute(
+            "UPDATE documents SET status = 'failed', error = 'Processing interrupted by a restart' "
+            "WHERE status = 'processing'"
+        )
+
+    def _execute(self, sql: str, params: Tuple = ()) -> List[Tuple]:
+        with self._db_lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _lock_for(self, doc_id: str) -> threading.RLock:
+        with self._locks_guard:
+            lock = self._doc_locks.get(doc_id)
+            if lock is None:
+                lock = self._doc_locks[doc_id] = threading.RLock()
+            return lock
+
+    def _text_path(self, doc_id: str) -> str:
+        # Hashed so caller-supplied ids can never escape text_dir
+        return os.path.join(self.text_dir, hashlib.sha256(doc_id.encode("utf-8")).hexdigest() + ".z")
+
+    def _index_path(self, doc_id: str) -> str:
+        return os.path.join(self.text_dir, hashlib.sha256(doc_id.encode("utf-8")).hexdigest() + ".idx")
+
+    def store_document(self, doc_id: str, doc_data: Dict[str, Any]):
+        """Insert or replace a document; its text_content, if any, is moved to compressed storage"""
+        with self._lock_for(doc_id):
+            text = doc_data.get("text_content")
+            if text:
+                self._write_text(doc_id, text)
+            doc_data.pop("text_content", None)
+
+            columns = dict(doc_data, document_type=(doc_data.get("analysis") or {}).get("document_type"))
+            values = [columns.get(name) for name in _COLUMNS]
+            for name in _COUNT_COLUMNS:
+                values[_COLUMNS.index(name)] = columns.get(name) or 0
+            metadata = {k: v for k, v in doc_data.items() if k not in _COLUMNS and k not in _TRANSIENT_KEYS}
+            self._execute(
+                f"INSERT OR REPLACE INTO documents (document_id, last_accessed, metadata, {', '.join(_COLUMNS)}) "
+                f"VALUES (?, ?, ?, {', '.join('?' * len(_COLUMNS))})",
+                (doc_id, time.time(), json.dumps(metadata), *values)
+            )
+
+            if doc_data.get("status") == "ready" and doc_data.get("index") is not None:
+                self.save_index(doc_id, doc_data["index"])
+
+            if doc_data.get("status") == "processing":
+                self._pinned[doc_id] = doc_data
+            else:
+                self._pinned.pop(doc_id, None)
+                self._hot.set(doc_id, doc_data)
+        self.evict()
+
+    def get_document(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        """Document metadata dict (without text; see load_text), or None"""
+        pinned = self._pinned.get(doc_id)
+        if pinned is not None:
+            return pinned
+        with self._lock_for(doc_id):
+            document = self._hot.get(doc_id)
+            if document is None:
+                rows = self._execute(
+                    f"SELECT {', '.join(_COLUMNS)}, metadata FROM documents WHERE document_id = ?", (doc_id,)
+                )
+                if not rows:
+                    return None
+                document = self._row_to_document(rows[0])
+                self._hot.set(doc_id, document)
+        self._touch(doc_id)
+        return document
+
+    def load_text(self, doc_id: str) -> str:
+        """Read and decompress a document's text through a memory map"""
+        with self._lock_for(doc_id):
+            path = self._text_path(doc_id)
+            if not os.path.exists(path) or os.path.getsize(path) == 0:
+                return ""
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return zlib.decompress(mapped).decode("utf-8")
+
+    def save_index(self, doc_id: str, doc_index: DocumentIndex):
+        """Write a document's chunks (compressed) and embeddings (raw float32) next to its text"""
+        chunks, vectors = doc_index.snapshot()
+        body = zlib.compress(json.dumps(chunks).encode("utf-8"), 6)
+        header = {
+            "chunks_bytes": len(body),
+            "model": EMBEDDING_MODEL_NAME if vectors is not None else None,
+            "shape": list(vectors.shape) if vectors is not None else None
+        }
+        path = self._index_path(doc_id)
+        tmp_path = f"{path}.tmp"
+        with self._lock_for(doc_id):
+            with open(tmp_path, "wb") as f:
+                f.write(json.dumps(header).encode("utf-8") + b"\n")
+                f.write(body)
+                if vectors is not None:
+                    f.write(np.ascontiguousarray(vectors, dtype="float32").tobytes())
+            os.replace(tmp_path, path)
+
+    def load_index(self, doc_id: str) -> Optional[DocumentIndex]:
+        """The stored retrieval index, or None if missing or built with another embedding setup"""
+        with self._lock_for(doc_id):
+            path = self._index_path(doc_id)
+            if not os.path.exists(path):
+                return None
+            with open(path, "rb") as f:
+                header = json.loads(f.readline())
+                chunks = json.loads(zlib.decompress(f.read(header["chunks_bytes"])))
+                vector_bytes = f.read()
+        vectors = None
+        if header["shape"] is not None:
+            if np is None or header["model"] != EMBEDDING_MODEL_NAME:
+                return None
+            vectors = np.frombuffer(vector_bytes, dtype="float32").reshape(header["shape"]).copy()
+        elif chunks and get_embedding_model() is not None:
+            return None  # Keyword-only index while embeddings are now available
+        return DocumentIndex.restore(chunks, vectors)
+
+    def find_by_content_hash(self, content_hash: str) -> Optional[str]:
+        """Id of a ready document with identical file bytes (any user), if any"""
+        rows = self._execute(
+            "SELECT document_id FROM documents WHERE content_hash = ? AND status = 'ready' "
+            "ORDER BY last_accessed DESC LIMIT 1",
+            (content_hash,)
+        )
+        return rows[0][0] if rows else None
+
+    def delete_document(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        document = self.get_document(doc_id)
+        if document is None:
+            return None
+        self._remove(doc_id)
+        return document
+
+    def list_documents(self, user_id: str, offset: int = 0, limit: int = 50) -> Tuple[List[Dict[str, Any]], int]:
+        """One page of a user's document summaries, newest first, and their total count; never reads text"""
+        rows = self._execute(
+            "SELECT document_id, filename, uploaded_at, word_count, document_type, status "
+            "FROM documents WHERE user_id = ? ORDER BY uploaded_at DESC LIMIT ? OFFSET ?",
+            (user_id, limit, offset)
+        )
+        total = self._execute("SELECT COUNT(*) FROM documents WHERE user_id = ?", (user_id,))[0][0]
+        documents = [
+            {
+                "document_id": doc_id,
+                "filename": filename,
+                "uploaded_at": uploaded_at,
+                "word_count": word_count,
+                "document_type": document_type or "unknown",
+                "status": status
+            }
+            for doc_id, filename, uploaded_at, word_count, document_type, status in rows
+        ]
+        return documents, total
+
+    def ready_documents(self, user_id: str) -> List[Tuple[str, str]]:
+        """(document_id, filename) of every ready document of a user, newest first"""
+        return self._execute(
+            "SELECT document_id, filename FROM documents WHERE user_id = ? AND status = 'ready' "
+            "ORDER BY uploaded_at DESC",
+            (user_id,)
+        )
+
+    def _touch(self, doc_id: str):
+        now = time.time()
+        with self._accessed_lock:
+            self._accessed[doc_id] = now
+            due = now - self._accessed_flushed_at >= DOCQA_ACCESS_FLUSH_SECONDS
+        if due:
+            self.flush_access_times()
+
+    def flush_access_times(self):
+        """Write batched access times in one transaction"""
+        with self._accessed_lock:
+            accessed, self._accessed = self._accessed, {}
+            self._accessed_flushed_at = time.time()
+        if not accessed:
+            return
+        with self._db_lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "UPDATE documents SET last_accessed = MAX(last_accessed, ?) WHERE document_id = ?",
+                    [(accessed_at, doc_id) for doc_id, accessed_at in accessed.items()]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def evict(self):
+        """Drop expired documents, then the least recently used beyond max_documents"""
+        self.flush_access_times()
+        expired = []
+        if self.ttl:
+            expired = self._execute(
+                "SELECT document_id FROM documents WHERE last_accessed < ? AND status != 'processing'",
+                (time.time() - self.ttl,)
+            )
+        overflow = self._execute(
+            "SELECT document_id FROM documents WHERE status != 'processing' "
+            "ORDER BY last_accessed DESC LIMIT -1 OFFSET ?",
+            (self.max_documents,)
+        )
+        for (doc_id,) in set(expired) | set(overflow):
+            self._remove(doc_id)
+
+    def _remove(self, doc_id: str):
+        with self._lock_for(doc_id):
+            self._execute("DELETE FROM documents WHERE document_id = ?", (doc_id,))
+            self._hot.pop(doc_id)
+            self._pinned.pop(doc_id, None)
+            for path in (self._text_path(doc_id), self._index_path(doc_id)):
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+        with self._locks_guard:
+            self._doc_locks.pop(doc_id, None)
+
+    def _write_text(self, doc_id: str, text: str):
+        path = self._text_path(doc_id)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(zlib.compress(text.encode("utf-8"), 6))
+        os.replace(tmp_path, path)
+
+    def _row_to_document(self, row: Tuple) -> Dict[str, Any]:
+        document = json.loads(row[-1] or "{}")
+        document.update(zip(_COLUMNS, row[:-1]))
+        document.pop("document_type", None)
+        document.setdefault("analysis", {})
+        document["index"] = None
+        return document
@@ -0,0 +1,236 @@
+import os
+import re
+import codecs
+from html.parser import HTMLParser
+from typing import Iterable, Iterator, List, Optional
+
+try:
+    # Faster C parser, used when installed
+    from lxml import etree as lxml_etree
+except Exception:
+    lxml_etree = None
+
+# "auto" picks lxml when available, otherwise the stdlib html.parser
+HTML_PARSER_BACKEND = os.getenv("LAWSIMPLIFY_HTML_PARSER", "auto").lower()
+
+MAX_TEXT_CHARS = 3500
+# Main/article text shorter than this is not trusted as the page body
+MIN_MAIN_CHARS = 400
+# Stop parsing pages without main/article once this many body characters are collected
+MAX_BODY_CHARS = MAX_TEXT_CHARS * 3
+# Never read more than this much HTML
+MAX_HTML_CHARS = 2 * 1024 * 1024
+FEED_CHUNK_CHARS = 16 * 1024
+# Bytes scanned for a <meta> charset declaration, as browsers do
+CHARSET_SNIFF_BYTES = 1024
+_META_CHARSET = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([a-zA-Z0-9_.:-]+)""", re.IGNORECASE)
+
+# Not "head": html.parser never closes an implicit <head>, which would hide the
+# whole body of pages that omit </head>. Its only text-bearing children are skipped.
+SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "title", "iframe", "canvas"}
+# <form> is not boilerplate: ASP.NET WebForms pages wrap the whole body in one
+BOILERPLATE_TAGS = {"nav", "header", "footer", "aside", "menu", "button", "select"}
+MAIN_TAGS = {"main", "article"}
+BLOCK_TAGS = {
+    "p", "div", "br", "li", "ul", "ol", "tr", "td", "th", "table", "section", "blockquote",
+    "h1", "h2", "h3", "h4", "h5", "h6", "pre", "dd", "dt", "hr"
+} | MAIN_TAGS
+
+
+class _TextCollector:
+    """Parser-agnostic text accumulator fed with start/end/data events.
+
+    Drops scripts, styles and navigation boilerplate, keeps main/article text
+    separately from other body text, and flags ``done`` once there is enough
+    main-content text so the caller can stop parsing early. Data events are
+    buffered raw until the enclosing block ends, since parsers split text runs
+    at entities and feed boundaries; whitespace is collapsed per block.
+    """
+
+    def __init__(self, limit: int = MAX_TEXT_CHARS):
+        self.limit = limit
+        self.skip_depth = 0
+        self.boilerplate_depth = 0
+        self.main_depth = 0
+        self.main_header_depth = 0
+        self.main_seen = False
+        self.block: List[str] = []
+        self.main_parts: List[str] = []
+        self.body_parts: List[str] = []
+        self.main_chars = 0
+        self.body_chars = 0
+        self.done = False
+
+    def start(self, tag: str):
+        # Close the previous block first, so it keeps the main/body state it was written in
+        if tag in BLOCK_TAGS:
+            self._newline()
+        if tag in SKIP_TAGS:
+            self.skip_depth += 1
+        elif tag == "header" and self.main_depth and not self.boilerplate_depth:
+            # An article's own header holds its title, not site navigation
+            self.main_header_depth += 1
+        elif tag in BOILERPLATE_TAGS:
+            self.boilerplate_depth += 1
+        elif tag in MAIN_TAGS:
+            self.main_depth += 1
+            self.main_seen = True
+
+    def end(self, tag: str):
+        if tag in BLOCK_TAGS:
+            self._newline()
+        if tag in SKIP_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+        elif tag == "header" and self.main_header_depth:
+            self.main_header_depth -= 1
+        elif tag in BOILERPLATE_TAGS:
+            self.boilerplate_depth = max(0, self.boilerplate_depth - 1)
+        elif tag in MAIN_TAGS:
+            self.main_depth = max(0, self.main_depth - 1)
+            # The main body has closed; later content is usually related links and footers
+            if self.main_depth == 0 and self.main_chars >= MIN_MAIN_CHARS:
+                self.done = True
+
+    def data(self, data: str):
+        if self.skip_depth or self.boilerplate_depth:
+            return
+        self.block.append(data)
+        size = len(" ".join(data.split()))
+        if not size:
+            return
+        self.body_chars += size + 1
+        if self.main_depth:
+            self.main_chars += size + 1
+            if self.main_chars >= self.limit:
+                self.done = True
+        elif not self.main_seen and self.body_chars >= MAX_BODY_CHARS:
+            self.done = True
+
+    def _newline(self):
+        """End the current block: collapse its whitespace and keep it as one line"""
+        text = " ".join("".join(self.block).split())
+        self.block = []
+        if not text:
+            return
+        self.body_parts.append(text)
+        if self.main_depth:
+            self.main_parts.append(text)
+
+    def text(self) -> str:
+        self._newline()
+        parts = self.main_parts if self.main_chars >= MIN_MAIN_CHARS else self.body_parts
+        return "\n".join(parts)[:self.limit]
+
+
+class _StdlibParser(HTMLParser):
+    def __init__(self, collector: _TextCollector):
+        super().__init__(convert_charrefs=True)
+        self.collector = collector
+
+    def handle_starttag(self, tag, attrs):
+        self.collector.start(tag)
+        if tag == "br":
+            self.collector.end(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in BLOCK_TAGS:
+            self.collector._newline()
+
+    def handle_endtag(self, tag):
+        self.collector.end(tag)
+
+    def handle_data(self, data):
+        self.collector.data(data)
+
+
+class _LxmlTarget:
+    def __init__(self, collector: _TextCollector):
+        self.collector = collector
+
+    def start(self, tag, attrib):
+        self.collector.start(str(tag).lower())
+
+    def end(self, tag):
+        self.collector.end(str(tag).lower())
+
+    def data(self, data):
+        self.collector.data(data)
+
+    def comment(self, text):
+        pass
+
+    def close(self):
+        return None
+
+
+def resolve_backend(backend: Optional[str] = None) -> str:
+    backend = (backend or HTML_PARSER_BACKEND).lower()
+    if backend == "auto":
+        return "lxml" if lxml_etree is not None else "html.parser"
+    if backend == "lxml" and lxml_etree is None:
+        return "html.parser"
+    return backend
+
+
+def extract_main_text(chunks: Iterable[str], limit: int = MAX_TEXT_CHARS, backend: Optional[str] = None) -> str:
+    """Extract readable text from streamed HTML, stopping once enough main content is collected.
+
+    Prefers text inside <main>/<article> over navigation and footer
+    boilerplate, and falls back to the rest of the body when a page has no
+    substantial main element.
+    """
+    collector = _TextCollector(limit)
+    if resolve_backend(backend) == "lxml":
+        parser = lxml_etree.HTMLParser(target=_LxmlTarget(collector), recover=True, no_network=True)
+    else:
+        parser = _StdlibParser(collector)
+
+    consumed = 0
+    for chunk in chunks:
+        if not chunk:
+            continue
+        parser.feed(chunk)
+        consumed += len(chunk)
+        if collector.done or consumed >= MAX_HTML_CHARS:
+            break
+    try:
+        parser.close()
+    except Exception:
+        pass
+    return collector.text()
+
+
+def html_to_text(html: str, limit: int = MAX_TEXT_CHARS, backend: Optional[str] = None) -> str:
+    """Extract readable text from an HTML string (see extract_main_text)"""
+    chunks = (html[i:i + FEED_CHUNK_CHARS] for i in range(0, len(html), FEED_CHUNK_CHARS))
+    return extract_main_text(chunks, limit, backend)
+
+
+def sniff_charset(head: bytes) -> Optional[str]:
+    """Encoding from a byte-order mark or a <meta> charset declaration at the start of a page"""
+    if head.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    match = _META_CHARSET.search(head[:CHARSET_SNIFF_BYTES])
+    if not match:
+        return None
+    try:
+        return codecs.lookup(match.group(1).decode("ascii")).name
+    except LookupError:
+        return None
+
+
+def iter_response_text(response, encoding: Optional[str] = None, chunk_size: int = FEED_CHUNK_CHARS) -> Iterator[str]:
+    """Incrementally decode a streamed requests response.
+
+    Without an encoding, one declared in the page's first bytes is used, else UTF-8.
+    """
+    decoder = None
+    for block in response.iter_content(chunk_size=chunk_size):
+        if decoder is None:
+            decoder = codecs.getincrementaldecoder(encoding or sniff_charset(block) or "utf-8")(errors="replace")
+        text = decoder.decode(block)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True) if decoder is not None else ""
+    if tail:
+        yield tail
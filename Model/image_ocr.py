@@ -0,0 +1,192 @@
+import os
+import io
+import logging
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional
+
+try:
+    from PIL import Image, ImageOps, ImageSequence
+except Exception:
+    Image = ImageOps = ImageSequence = None
+
+try:
+    import pytesseract
+except Exception:
+    pytesseract = None
+
+from metrics import time_stage
+from pdf_extraction import get_process_pool, PDF_WORKERS, PAGE_SEPARATOR
+
+logger = logging.getLogger(__name__)
+
+# Resolution images are resampled to before OCR; Tesseract is tuned for about 300 DPI
+OCR_TARGET_DPI = int(os.getenv("DOCQA_OCR_TARGET_DPI", "300"))
+# Assumed page height when an image carries no usable DPI (phone photos report 72)
+OCR_ASSUMED_PAGE_INCHES = float(os.getenv("DOCQA_OCR_ASSUMED_PAGE_INCHES", "11"))
+# Preprocessed pages taller than this are split into strips at blank rows
+OCR_TILE_HEIGHT = int(os.getenv("DOCQA_OCR_TILE_HEIGHT", "1200"))
+OCR_MAX_FRAMES = int(os.getenv("DOCQA_OCR_MAX_FRAMES", "50"))
+# OCR tasks in flight across all requests, so one large upload cannot take every worker
+OCR_CONCURRENCY = int(os.getenv("DOCQA_OCR_CONCURRENCY", str(PDF_WORKERS)))
+OCR_LANG = os.getenv("DOCQA_OCR_LANG", "eng")
+
+# Images the DPI estimate cannot be trusted below, and the resampling range
+_MIN_TRUSTED_DPI = 100
+_MIN_SCALE, _MAX_SCALE = 0.25, 2.0
+# Rows whose mean brightness (0-255) is at least this count as blank when choosing cuts
+_BLANK_ROW_LEVEL = 250
+
+_ocr_slots = threading.BoundedSemaphore(max(1, OCR_CONCURRENCY))
+
+
+def image_ocr_available() -> bool:
+    return bool(pytesseract and Image)
+
+
+def _source_dpi(image) -> float:
+    dpi = image.info.get("dpi")
+    try:
+        value = float(dpi[0]) if dpi else 0.0
+    except (TypeError, ValueError, IndexError):
+        value = 0.0
+    if value >= _MIN_TRUSTED_DPI:
+        return value
+    return max(image.size) / OCR_ASSUMED_PAGE_INCHES
+
+
+def otsu_threshold(histogram: List[int]) -> int:
+    """Grey level that best separates ink from paper in a 256-bin histogram"""
+    total = sum(histogram)
+    if not total:
+        return 127
+    weighted_total = sum(level * count for level, count in enumerate(histogram))
+    background = weighted_background = 0
+    best_level, best_variance = 127, -1.0
+    for level, count in enumerate(histogram):
+        background += count
+        if background == 0:
+            continue
+        foreground = total - background
+        if foreground == 0:
+            break
+        weighted_background += level * count
+        mean_background = weighted_background / background
+        mean_foreground = (weighted_total - weighted_background) / foreground
+        variance = background * foreground * (mean_background - mean_foreground) ** 2
+        if variance > best_variance:
+            best_level, best_variance = level, variance
+    return best_level
+
+
+def preprocess_image(image):
+    """Upright, greyscale, resampled to OCR_TARGET_DPI and binarized with Otsu's threshold"""
+    image = ImageOps.exif_transpose(image)
+    gray = ImageOps.autocontrast(image.convert("L"), cutoff=1)
+
+    scale = min(_MAX_SCALE, max(_MIN_SCALE, OCR_TARGET_DPI / _source_dpi(image)))
+    if abs(scale - 1) > 0.1:
+        size = (max(1, round(gray.width * scale)), max(1, round(gray.height * scale)))
+        gray = gray.resize(size, Image.LANCZOS)
+
+    threshold = otsu_threshold(gray.histogram())
+    return gray.point([255 if level > threshold else 0 for level in range(256)], "1")
+
+
+def split_tiles(image, tile_height: int = OCR_TILE_HEIGHT) -> List[Any]:
+    """Split a binarized page into full-width strips, cutting at the blankest row near each boundary.
+
+    Cutting between text lines keeps every line whole, so strips can be
+    OCR-ed independently and their text concatenated in order.
+    """
+    if image.height <= tile_height * 1.5:
+        return [image]
+    tiles = []
+    top = 0
+    search = tile_height // 4
+    while image.height - top > tile_height * 1.5:
+        band_top = top + tile_height - search
+        band = image.crop((0, band_top, image.width, band_top + 2 * search)).convert("L")
+        # Box-filtering to one column gives each row's mean brightness
+        profile = list(band.resize((1, band.height), Image.BOX).getdata())
+        brightest = max(profile)
+        # Among the blankest rows, prefer the one closest to the nominal boundary
+        candidates = [i for i, level in enumerate(profile) if level >= min(brightest, _BLANK_ROW_LEVEL)]
+        cut = band_top + min(candidates, key=lambda i: abs(i - search))
+        tiles.append(image.crop((0, top, image.width, cut)))
+        top = cut
+    tiles.append(image.crop((0, top, image.width, image.height)))
+    return tiles
+
+
+def _ocr_tile(png: bytes, lang: str) -> str:
+    """OCR one encoded tile (runs in a worker process)"""
+    # Parallelism comes from the pool; keep each Tesseract to one thread
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+    with Image.open(io.BytesIO(png)) as tile:
+        return pytesseract.image_to_string(tile, lang=lang).strip()
+
+
+def _encode(tile) -> bytes:
+    buffer = io.BytesIO()
+    tile.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _submit_tile(pool, tile):
+    _ocr_slots.acquire()
+    try:
+        future = pool.submit(_ocr_tile, _encode(tile), OCR_LANG)
+    except Exception:
+        _ocr_slots.release()
+        raise
+    future.add_done_callback(lambda _: _ocr_slots.release())
+    return future
+
+
+def _frames(image, max_frames: int):
+    """Distinct frames of a (possibly multi-frame) image, preprocessed, in order"""
+    seen = set()
+    for index, frame in enumerate(ImageSequence.Iterator(image)):
+        if index >= max_frames:
+            logger.warning(f"Image has more than {max_frames} frames; the rest are not OCR-ed")
+            break
+        page = preprocess_image(frame.convert("RGB") if frame.mode in ("P", "PA", "RGBA") else frame.copy())
+        # Animated GIFs repeat frames; OCR each distinct one once
+        digest = hashlib.sha1(page.tobytes()).digest()
+        if digest in seen:
+            continue
+        seen.add(digest)
+        yield page
+
+
+def ocr_image_pages(file_path: str, max_frames: int = OCR_MAX_FRAMES,
+                    parallel: Optional[bool] = None) -> List[Dict[str, Any]]:
+    """OCR every frame (GIF/TIFF page) of an image file as ``{"page": n, "text": str, "ocr": True}``.
+
+    Frames are preprocessed in the calling thread, split into strips, and the
+    strips of all frames are OCR-ed in the shared process pool, at most
+    OCR_CONCURRENCY at a time across requests. parallel=False OCRs inline.
+    """
+    inline = not (PDF_WORKERS > 1 if parallel is None else parallel)
+    with time_stage("ocr"), Image.open(file_path) as image:
+        pool = None if inline else get_process_pool()
+        pages = []
+        for page in _frames(image, max_frames):
+            tiles = split_tiles(page)
+            if inline:
+                pages.append([_ocr_tile(_encode(tile), OCR_LANG) for tile in tiles])
+            else:
+                pages.append([_submit_tile(pool, tile) for tile in tiles])
+        if not inline:
+            pages = [[future.result() for future in futures] for futures in pages]
+
+    return [
+        {"page": number, "text": "\n".join(text for text in texts if text), "ocr": True}
+        for number, texts in enumerate(pages, start=1)
+    ]
+
+
+def ocr_image(file_path: str, **kwargs) -> str:
+    """Text of all frames of an image, pages joined with PAGE_SEPARATOR"""
+    return PAGE_SEPARATOR.join(page["text"] for page in ocr_image_pages(file_path, **kwargs))
@@ -0,0 +1,161 @@
+import os
+import json
+import time
+import random
+import logging
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import google.generativeai as genai
+except Exception:
+    genai = None
+
+try:
+    from google.api_core import exceptions as google_exceptions
+except Exception:
+    google_exceptions = None
+
+from concurrency import BLOCKING_POOL_SIZE
+from metrics import observe_llm_call, llm_retries_total
+
+logger = logging.getLogger(__name__)
+
+# Uniform settings for every Gemini call made by the services
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))            # seconds per request
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))         # retries after the first attempt
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))   # seconds, doubled per retry
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+# Concurrent model calls per process, across all models
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", str(BLOCKING_POOL_SIZE)))
+
+_configured = False
+_models: Dict[Tuple[str, str], "LLMModel"] = {}
+_models_lock = threading.Lock()
+_call_slots = threading.BoundedSemaphore(max(1, LLM_MAX_CONCURRENCY))
+
+
+def configure_llm(api_key: Optional[str]) -> bool:
+    """Configure the Gemini SDK once per process; returns whether models are available"""
+    global _configured
+    if genai is None or not api_key:
+        return False
+    if not _configured:
+        genai.configure(api_key=api_key)
+        _configured = True
+    return True
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    if google_exceptions is not None:
+        return isinstance(error, (
+            google_exceptions.TooManyRequests,
+            google_exceptions.ResourceExhausted,
+            google_exceptions.ServiceUnavailable,
+            google_exceptions.InternalServerError,
+            google_exceptions.DeadlineExceeded,
+        ))
+    return False
+
+
+def _backoff_delay(attempt: int) -> float:
+    # Full jitter keeps retries from many requests from arriving in lockstep
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+
+
+class _SlotHoldingStream:
+    """Streamed response that holds a concurrency slot until it is exhausted or closed.
+
+    Iterates like the SDK response and forwards other attributes to it.
+    Dropping it unfinished also frees the slot.
+    """
+
+    def __init__(self, response):
+        self._response = response
+        self._iterator = iter(response)
+        self._released = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._iterator)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        if not self._released:
+            self._released = True
+            _call_slots.release()
+
+    def __del__(self):
+        self.close()
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+
+class LLMModel:
+    """Shared ``genai.GenerativeModel`` with a timeout, retries and a process-wide concurrency limit.
+
+    ``generate_content`` is a drop-in replacement for the SDK method. Retries
+    only cover transient errors (rate limits, unavailability, timeouts); for
+    ``stream=True`` they cover opening the stream, not chunks that fail later.
+    A streamed call keeps its concurrency slot until the returned iterator is
+    exhausted or closed.
+    """
+
+    def __init__(self, model_name: str, generation_config: Optional[Dict[str, Any]] = None):
+        self.model_name = model_name
+        self.generation_config = generation_config
+        kwargs = {"model_name": model_name}
+        if generation_config:
+            kwargs["generation_config"] = generation_config
+        self._model = genai.GenerativeModel(**kwargs)
+
+    def generate_content(self, prompt, stream: bool = False, **kwargs):
+        kwargs.setdefault("request_options", {"timeout": LLM_TIMEOUT})
+        attempt = 0
+        start = time.perf_counter()
+        while True:
+            _call_slots.acquire()
+            try:
+                response = self._model.generate_content(prompt, stream=stream, **kwargs)
+            except BaseException as e:
+                _call_slots.release()
+                if not isinstance(e, Exception):
+                    raise
+                if attempt >= LLM_MAX_RETRIES or not _is_retryable(e):
+                    observe_llm_call(self.model_name, prompt, None, time.perf_counter() - start, outcome="error")
+                    raise
+                delay = _backoff_delay(attempt)
+                attempt += 1
+                llm_retries_total.inc(model=self.model_name)
+                logger.warning(f"{self.model_name} call failed ({str(e)}), retry {attempt} in {delay:.2f}s")
+                time.sleep(delay)
+                continue
+            if stream:
+                response = _SlotHoldingStream(response)
+            else:
+                _call_slots.release()
+            # Streamed responses are still arriving, so only the prompt size is recorded
+            observe_llm_call(self.model_name, prompt, None if stream else response, time.perf_counter() - start)
+            return response
+
+
+def get_model(model_name: str, generation_config: Optional[Dict[str, Any]] = None) -> Optional[LLMModel]:
+    """Return the cached model for (model_name, generation_config), or None if Gemini is not configured"""
+    if not _configured:
+        return None
+    key = (model_name, json.dumps(generation_config or {}, sort_keys=True))
+    model = _models.get(key)
+    if model is None:
+        with _models_lock:
+            model = _models.get(key)
+            if model is None:
+                model = _models[key] = LLMModel(model_name, generation_config)
+    return model
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Concurrency load test for the NyAI chatbot service.
+
+Runs Chatbot.py in-process on a single uvicorn worker with Gemini replaced by a
+fake model that sleeps for a fixed latency, then fires N concurrent /chat
+requests. With blocking work offloaded from the event loop, N calls should
+finish in roughly the time of one, and /health should stay fast under load.
+
+Usage: python load_test.py --requests 20 --latency 1.0
+"""
+
+import os
+import sys
+import time
+import socket
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Offline configuration: no real key, no on-disk history, and no response cache
+# (the questions differ only slightly, so cache hits would skip the model call)
+os.environ.setdefault("GOOGLE_API_KEY", "load-test")
+os.environ["CHAT_STORE_BACKEND"] = "memory"
+os.environ["CHAT_RESPONSE_CACHE_ENABLED"] = "false"
+
+import requests
+import uvicorn
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    """Stands in for genai.GenerativeModel: sleeps, then returns a canned answer"""
+    latency = 1.0
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        time.sleep(self.latency)
+        return FakeResponse("Fake Title" if "title" in prompt else "This is a fake legal answer.")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(app, port):
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", workers=1)
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def send_chat(base_url, index):
+    start = time.perf_counter()
+    response = requests.post(
+        f"{base_url}/chat",
+        json={"message": f"What is contract law? ({index})", "user_id": f"load_user_{index}"},
+        timeout=120
+    )
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent /chat load test with a fake Gemini backend")
+    parser.add_argument("--requests", type=int, default=20, help="Number of concurrent /chat calls")
+    parser.add_argument("--latency", type=float, default=1.0, help="Fake model latency per call (seconds)")
+    args = parser.parse_args()
+
+    import llm_client
+    FakeGenerativeModel.latency = args.latency
+    llm_client.genai.GenerativeModel = FakeGenerativeModel
+    import Chatbot
+
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = start_server(Chatbot.app, port)
+
+    print("🚀 Chatbot Concurrency Load Test")
+    print("=" * 40)
+
+    try:
+        # A new conversation makes two model calls (title + answer)
+        single = send_chat(base_url, "baseline")
+        print(f"⏱️  Single /chat: {single:.2f}s")
+
+        health_times = []
+        with ThreadPoolExecutor(max_workers=args.requests) as pool:
+            start = time.perf_counter()
+            futures = [pool.submit(send_chat, base_url, i) for i in range(args.requests)]
+            while not all(f.done() for f in futures):
+                t0 = time.perf_counter()
+                requests.get(f"{base_url}/health", timeout=30)
+                health_times.append(time.perf_counter() - t0)
+                time.sleep(0.1)
+            latencies = [f.result() for f in futures]
+            total = time.perf_counter() - start
+
+        print(f"⏱️  {args.requests} concurrent /chat: {total:.2f}s wall, max {max(latencies):.2f}s per call")
+        if health_times:
+            print(f"⏱️  /health under load: max {max(health_times) * 1000:.0f}ms over {len(health_times)} probes")
+
+        ratio = total / single
+        print("\n" + "=" * 40)
+        if ratio < 2:
+            print(f"✅ PASS: concurrent batch took {ratio:.1f}x a single call")
+            return 0
+        print(f"❌ FAIL: concurrent batch took {ratio:.1f}x a single call (event loop is being blocked)")
+        return 1
+    finally:
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    sys.exit(main())
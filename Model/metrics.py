@@ -0,0 +1,240 @@
+import time
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
+# Prometheus text exposition without extra dependencies. Each service runs in
+# its own process, so series carry no service label; the scraper adds job/instance.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+SIZE_BUCKETS = (100, 500, 1000, 2000, 5000, 10000, 20000, 50000, 100000, 250000)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[Any, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[Any, ...], Any] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[Any, ...]:
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for key, value in sorted(self._values.items(), key=lambda item: tuple(map(str, item[0]))):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_number(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * len(self.buckets), 0.0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items(), key=lambda item: tuple(map(str, item[0]))):
+                for bound, count in zip(self.buckets, counts):
+                    le = f'le="{_format_number(bound)}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {count}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {_format_number(round(total, 6))}")
+                lines.append(f"{self.name}_count{labels} {counts[-1]}")
+        return lines
+
+
+REGISTRY: List[_Metric] = []
+
+http_requests_total = Counter(
+    "http_requests_total", "HTTP requests handled", ("method", "route", "status")
+)
+http_request_duration_seconds = Histogram(
+    "http_request_duration_seconds", "Time until the response starts", ("method", "route")
+)
+http_requests_in_flight = Gauge("http_requests_in_flight", "HTTP requests currently being handled")
+http_requests_in_flight.set(0)
+stage_duration_seconds = Histogram(
+    "stage_duration_seconds", "Time spent in one pipeline stage of a request", ("stage",)
+)
+llm_request_duration_seconds = Histogram(
+    "llm_request_duration_seconds", "Model call latency including retries", ("model", "outcome")
+)
+llm_retries_total = Counter("llm_retries_total", "Model calls retried after a transient error", ("model",))
+llm_prompt_chars = Histogram("llm_prompt_chars", "Prompt size in characters", ("model",), SIZE_BUCKETS)
+llm_prompt_tokens = Histogram("llm_prompt_tokens", "Prompt size in tokens", ("model",), SIZE_BUCKETS)
+llm_response_chars = Histogram("llm_response_chars", "Response size in characters", ("model",), SIZE_BUCKETS)
+llm_response_tokens = Histogram("llm_response_tokens", "Response size in tokens", ("model",), SIZE_BUCKETS)
+
+# Cache name -> stats() callable returning hits/misses/hit_ratio/items
+_caches: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token)"""
+    return len(text) // 4 + 1
+
+
+@contextmanager
+def time_stage(stage: str) -> Iterator[None]:
+    """Record how long the enclosed block takes as one pipeline stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_duration_seconds.observe(time.perf_counter() - start, stage=stage)
+
+
+def timed_iter(iterable: Iterable, stage: str) -> Iterator:
+    """Yield from iterable, recording the time to produce each item as the given stage"""
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            stage_duration_seconds.observe(time.perf_counter() - start, stage=stage)
+        yield item
+
+
+def register_cache(name: str, cache):
+    """Expose a cache's stats() (hits, misses, hit_ratio, items) on /metrics"""
+    _caches[name] = cache.stats
+
+
+def observe_llm_call(model: str, prompt: Any, response: Any, seconds: float, outcome: str = "ok"):
+    """Record latency and prompt/response sizes of one model call; response may be None"""
+    llm_request_duration_seconds.observe(seconds, model=model, outcome=outcome)
+    prompt_text = prompt if isinstance(prompt, str) else str(prompt)
+    usage = getattr(response, "usage_metadata", None)
+    prompt_tokens = getattr(usage, "prompt_token_count", None) or estimate_tokens(prompt_text)
+    llm_prompt_chars.observe(len(prompt_text), model=model)
+    llm_prompt_tokens.observe(prompt_tokens, model=model)
+    if response is None:
+        return
+    try:
+        response_text = response.text or ""
+    except Exception:
+        # Blocked or non-text responses have no text accessor value
+        response_text = ""
+    response_tokens = getattr(usage, "candidates_token_count", None) or estimate_tokens(response_text)
+    llm_response_chars.observe(len(response_text), model=model)
+    llm_response_tokens.observe(response_tokens, model=model)
+
+
+def _render_caches() -> List[str]:
+    series = {
+        "cache_hits_total": ("counter", "Cache lookups that hit", "hits"),
+        "cache_misses_total": ("counter", "Cache lookups that missed", "misses"),
+        "cache_hit_ratio": ("gauge", "Share of cache lookups that hit", "hit_ratio"),
+        "cache_items": ("gauge", "Entries currently held in memory", "items"),
+    }
+    stats = {}
+    for name, get_stats in list(_caches.items()):
+        try:
+            stats[name] = get_stats()
+        except Exception:
+            continue
+    lines = []
+    for metric, (kind, help_text, field) in series.items():
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {kind}"]
+        for name, values in sorted(stats.items()):
+            if field in values:
+                lines.append(f'{metric}{{cache="{_escape(name)}"}} {_format_number(values[field])}')
+    return lines
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    lines.extend(_render_caches())
+    return "\n".join(lines) + "\n"
+
+
+def install_metrics(app):
+    """Add request metrics middleware and a GET /metrics endpoint to a FastAPI app"""
+    from fastapi import Request
+    from fastapi.responses import PlainTextResponse
+
+    @app.middleware("http")
+    async def record_request_metrics(request: Request, call_next):
+        http_requests_in_flight.inc()
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            http_requests_in_flight.dec()
+            # Templated route path keeps label cardinality bounded
+            route = getattr(request.scope.get("route"), "path", "unmatched")
+            http_request_duration_seconds.observe(time.perf_counter() - start, method=request.method, route=route)
+            http_requests_total.inc(method=request.method, route=route, status=status)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics_endpoint():
+        return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
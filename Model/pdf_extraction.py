@@ -0,0 +1,163 @@
+import os
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Iterator, List, Tuple
+
+from metrics import time_stage
+
+# Optional PDF / OCR libs
+try:
+    import PyPDF2
+except Exception:
+    PyPDF2 = None
+
+try:
+    import pytesseract
+except Exception:
+    pytesseract = None
+
+try:
+    # pdf2image (needs poppler) rasterizes scanned pages for OCR
+    from pdf2image import convert_from_path
+except Exception:
+    convert_from_path = None
+
+logger = logging.getLogger(__name__)
+
+PDF_WORKERS = int(os.getenv("DOCQA_PDF_WORKERS", str(os.cpu_count() or 2)))
+# PDFs with fewer pages are extracted inline; the pool start-up is not worth it
+PARALLEL_MIN_PAGES = int(os.getenv("DOCQA_PDF_PARALLEL_MIN_PAGES", "8"))
+# Pages whose text layer has fewer characters than this are treated as scanned
+OCR_MIN_TEXT_CHARS = int(os.getenv("DOCQA_OCR_MIN_TEXT_CHARS", "20"))
+OCR_DPI = int(os.getenv("DOCQA_OCR_DPI", "300"))
+# Pages per extraction task; smaller batches report ingestion progress sooner
+PAGE_BATCH_SIZE = int(os.getenv("DOCQA_PDF_PAGE_BATCH_SIZE", "8"))
+
+# Pages are joined with a form feed (as pdftotext does) so page offsets can be
+# recovered from the extracted text alone
+PAGE_SEPARATOR = "\f"
+
+_process_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Shared process pool for CPU-bound extraction work, created on first use"""
+    global _process_pool
+    if _process_pool is None:
+        with _pool_lock:
+            if _process_pool is None:
+                # spawn: the server process runs threads, which fork does not play well with
+                _process_pool = ProcessPoolExecutor(
+                    max_workers=PDF_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+    return _process_pool
+
+
+def ocr_available() -> bool:
+    return bool(pytesseract and convert_from_path)
+
+
+def _extract_page_range(file_path: str, start: int, end: int) -> List[Tuple[int, str]]:
+    """Extract the text layer of pages [start, end) (runs in a worker process)"""
+    reader = PyPDF2.PdfReader(file_path)
+    pages = []
+    for index in range(start, end):
+        try:
+            text = reader.pages[index].extract_text() or ""
+        except Exception as e:
+            logger.warning(f"PDF page {index + 1} text extraction failed: {str(e)}")
+            text = ""
+        pages.append((index, text.strip()))
+    return pages
+
+
+def _ocr_page(file_path: str, index: int, dpi: int = OCR_DPI) -> Tuple[int, str]:
+    """Rasterize one page and OCR it (runs in a worker process)"""
+    images = convert_from_path(file_path, dpi=dpi, first_page=index + 1, last_page=index + 1)
+    if not images:
+        return index, ""
+    return index, pytesseract.image_to_string(images[0]).strip()
+
+
+def count_pdf_pages(file_path: str) -> int:
+    return len(PyPDF2.PdfReader(file_path).pages)
+
+
+def _ocr_missing_text(file_path: str, extracted: List[Tuple[int, str]], use_pool: bool) -> Dict[int, str]:
+    """OCR pages whose text layer is (nearly) empty; returns page index -> OCR text for improved pages"""
+    ocr_pages = [index for index, text in extracted if len(text) < OCR_MIN_TEXT_CHARS]
+    if not ocr_pages:
+        return {}
+    if not ocr_available():
+        logger.warning(f"{len(ocr_pages)} PDF pages have no text layer and OCR is not available")
+        return {}
+
+    logger.info(f"OCR fallback for {len(ocr_pages)} PDF pages")
+    with time_stage("ocr"):
+        if use_pool or len(ocr_pages) > 1:
+            pool = get_process_pool()
+            futures = [pool.submit(_ocr_page, file_path, index) for index in ocr_pages]
+            results = [future.result() for future in futures]
+        else:
+            results = [_ocr_page(file_path, index) for index in ocr_pages]
+
+    texts = dict(extracted)
+    return {index: text for index, text in results if len(text) > len(texts[index])}
+
+
+def iter_pdf_pages(file_path: str, batch_size: int = PAGE_BATCH_SIZE) -> Iterator[Dict[str, Any]]:
+    """Yield PDF pages in order as they are extracted, OCR-ing pages without a usable text layer.
+
+    Large PDFs are split into page batches that are all submitted to the
+    process pool up front; batches are yielded in page order as each one
+    completes, with its scanned pages OCR-ed in parallel. Pages are
+    ``{"page": n, "text": str, "ocr": bool}`` with 1-based page numbers.
+    """
+    page_count = count_pdf_pages(file_path)
+    parallel = page_count >= PARALLEL_MIN_PAGES and PDF_WORKERS > 1
+
+    if parallel:
+        pool = get_process_pool()
+        size = max(1, min(batch_size, -(-page_count // PDF_WORKERS)))
+        futures = [
+            pool.submit(_extract_page_range, file_path, start, min(start + size, page_count))
+            for start in range(0, page_count, size)
+        ]
+        batches = (future.result() for future in futures)
+    else:
+        batches = (
+            _extract_page_range(file_path, start, min(start + batch_size, page_count))
+            for start in range(0, page_count, batch_size)
+        )
+
+    for extracted in batches:
+        ocr_texts = _ocr_missing_text(file_path, extracted, parallel)
+        for index, text in extracted:
+            yield {
+                "page": index + 1,
+                "text": ocr_texts.get(index, text),
+                "ocr": index in ocr_texts
+            }
+
+
+def extract_pdf_pages(file_path: str) -> List[Dict[str, Any]]:
+    """Extract every page of a PDF in parallel, with OCR fallback for scanned pages"""
+    return list(iter_pdf_pages(file_path))
+
+
+def join_pages(pages: List[Dict[str, Any]]) -> str:
+    return PAGE_SEPARATOR.join(page["text"] for page in pages)
+
+
+def page_spans(text: str) -> List[Dict[str, int]]:
+    """Character offsets of each page in text joined with PAGE_SEPARATOR"""
+    spans = []
+    start = 0
+    for number, page_text in enumerate(text.split(PAGE_SEPARATOR), start=1):
+        spans.append({"page": number, "start": start, "end": start + len(page_text)})
+        start += len(page_text) + len(PAGE_SEPARATOR)
+    return spans
@@ -0,0 +1,141 @@
+import re
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def normalize_question(text: str) -> str:
+    """Lowercase and drop punctuation/extra whitespace so trivially different questions match"""
+    return " ".join(_WORD_RE.findall((text or "").lower()))
+
+
+def numeric_tokens(key: str) -> tuple:
+    """Tokens of a normalized question that contain digits (sections, articles, years, amounts)"""
+    return tuple(sorted(token for token in key.split() if any(c.isdigit() for c in token)))
+
+
+class SemanticCache:
+    """Thread-safe answer cache keyed by question meaning.
+
+    A lookup hits when the question normalizes to a cached one, or when the
+    cosine similarity of its embedding to a cached question's is at least
+    ``threshold`` and both questions carry the same numeric tokens (embeddings
+    barely separate "section 302" from "section 304"). ``embed`` takes a list of texts and returns normalized
+    vectors (or None when embeddings are unavailable, in which case only
+    normalized exact matches hit). Entries expire after ``ttl`` seconds and the
+    least recently used are evicted beyond ``max_items``.
+    """
+
+    def __init__(self, embed: Optional[Callable] = None, threshold: float = 0.92,
+                 ttl: Optional[float] = None, max_items: int = 1024):
+        self.embed = embed
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_items = max(1, max_items)
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # normalized question -> (expires_at, vector, answer)
+        self._matrix = None
+        self._matrix_keys = None
+        self._lock = threading.RLock()
+
+    def _embed_one(self, text: str):
+        if self.embed is None or np is None:
+            return None
+        try:
+            vectors = self.embed([text])
+        except Exception:
+            return None
+        return None if vectors is None else vectors[0]
+
+    def lookup(self, question: str) -> Optional[str]:
+        key = normalize_question(question)
+        if not key:
+            return None
+        with self._lock:
+            self._purge_expired()
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            has_vectors = any(e[1] is not None for e in self._entries.values())
+
+        vector = self._embed_one(key) if has_vectors else None
+        with self._lock:
+            if vector is not None:
+                match = self._nearest(vector, numeric_tokens(key))
+                if match is not None:
+                    self._entries.move_to_end(match)
+                    self.hits += 1
+                    self.semantic_hits += 1
+                    return self._entries[match][2]
+            self.misses += 1
+            return None
+
+    def store(self, question: str, answer: str):
+        key = normalize_question(question)
+        if not key or not answer:
+            return
+        vector = self._embed_one(key)
+        expires_at = time.time() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expires_at, vector, answer)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "items": len(self._entries),
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def _purge_expired(self):
+        now = time.time()
+        expired = [key for key, entry in self._entries.items() if entry[0] is not None and entry[0] <= now]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+    def _nearest(self, vector, numbers: tuple = ()) -> Optional[str]:
+        """Most similar cached key above threshold whose numeric tokens equal numbers (caller holds the lock)"""
+        if self._matrix is None:
+            keys = [key for key, entry in self._entries.items() if entry[1] is not None]
+            if not keys:
+                return None
+            self._matrix = np.vstack([self._entries[key][1] for key in keys])
+            self._matrix_keys = keys
+        similarities = self._matrix @ vector
+        for best in np.argsort(-similarities):
+            if float(similarities[best]) < self.threshold:
+                return None
+            key = self._matrix_keys[best]
+            if key in self._entries and numeric_tokens(key) == numbers:
+                return key
+        return None